@@ -0,0 +1,146 @@
+"""
+Time to first token vs. full-response latency, through LLMClient against a local
+OpenAI-compatible stub server that streams a canned reply at a fixed token rate.
+
+    uv run python benchmarks/bench_llm_stream.py [tokens] [first_token_ms] [token_ms]
+
+The stub (StubServer) can also back manual runs of the CLI:
+OPENWORKER_LLM_BASE_URL=http://127.0.0.1:<port>/v1
+"""
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from openworker.core.llm import LLMClient
+
+
+class StubServer:
+    """
+    Answers POST /v1/chat/completions with `tokens` words, after first_token_ms and then one
+    every token_ms, streamed as SSE when the request asks for it. When the request offers tools
+    and has no tool result yet, the reply is a call to the first tool instead. The next
+    `errors` requests are answered with a 503, to exercise retries.
+    """
+    def __init__(self, tokens: int = 200, first_token_ms: float = 300, token_ms: float = 10):
+        self.tokens, self.first_token, self.token = tokens, first_token_ms / 1000, token_ms / 1000
+        self.errors = 0
+        self.requests = 0
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                stub.handle(self, body)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/v1"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def _deltas(self, body: dict):
+        tools = body.get("tools")
+        if tools and not any(m.get("role") == "tool" for m in body["messages"]):
+            name = tools[0]["function"]["name"]
+            yield {"tool_calls": [{"index": 0, "id": "call_0", "type": "function",
+                                   "function": {"name": name, "arguments": ""}}]}
+            for part in ('{"path": ', '"/tmp/stub.txt"', "}"):
+                yield {"tool_calls": [{"index": 0, "function": {"arguments": part}}]}
+            return
+        for i in range(self.tokens):
+            yield {"content": f"word{i} "}
+
+    def handle(self, request: BaseHTTPRequestHandler, body: dict):
+        self.requests += 1
+        if self.errors > 0:
+            self.errors -= 1
+            data = b'{"error": {"message": "overloaded"}}'
+            request.send_response(503)
+            request.send_header("Content-Type", "application/json")
+            request.send_header("Content-Length", str(len(data)))
+            request.end_headers()
+            request.wfile.write(data)
+            return
+        base = {"id": "stub", "object": "chat.completion.chunk", "created": int(time.time()), "model": body["model"]}
+        time.sleep(self.first_token)
+        deltas = list(self._deltas(body))
+        finish = "tool_calls" if "tool_calls" in deltas[0] else "stop"
+        if not body.get("stream"):
+            time.sleep(self.token * (len(deltas) - 1))
+            message = {"role": "assistant", "content": "".join(d.get("content", "") for d in deltas) or None}
+            if finish == "tool_calls":
+                call = deltas[0]["tool_calls"][0]
+                call["function"]["arguments"] = "".join(d["tool_calls"][0]["function"]["arguments"] for d in deltas)
+                message["tool_calls"] = [{k: v for k, v in call.items() if k != "index"}]
+            data = json.dumps({**base, "object": "chat.completion",
+                               "choices": [{"index": 0, "message": message, "finish_reason": finish}]}).encode()
+            request.send_response(200)
+            request.send_header("Content-Type", "application/json")
+            request.send_header("Content-Length", str(len(data)))
+            request.end_headers()
+            request.wfile.write(data)
+            return
+
+        request.send_response(200)
+        request.send_header("Content-Type", "text/event-stream")
+        request.send_header("Transfer-Encoding", "chunked")
+        request.end_headers()
+
+        def send(payload: str):
+            data = f"data: {payload}\n\n".encode()
+            request.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            request.wfile.flush()
+
+        for i, delta in enumerate(deltas):
+            if i:
+                time.sleep(self.token)
+            send(json.dumps({**base, "choices": [{"index": 0, "delta": delta, "finish_reason": None}]}))
+        send(json.dumps({**base, "choices": [{"index": 0, "delta": {}, "finish_reason": finish}]}))
+        send("[DONE]")
+        request.wfile.write(b"0\r\n\r\n")
+
+    def close(self):
+        self.server.shutdown()
+
+
+def main():
+    args = [float(a) for a in sys.argv[1:]]
+    tokens, first_token_ms, token_ms = (args + [200, 300, 10][len(args):])[:3]
+    stub = StubServer(int(tokens), first_token_ms, token_ms)
+    llm = LLMClient(model="stub", base_url=stub.url, api_key="stub")
+    messages = [{"role": "user", "content": "hello"}]
+    try:
+        start = time.perf_counter()
+        llm.chat(messages)
+        elapsed = time.perf_counter() - start
+        print(f"{'blocking chat':<16} first token {elapsed:6.3f}s  total {elapsed:6.3f}s")
+
+        stream = llm.stream(messages)
+        count = sum(1 for _ in stream)
+        print(f"{'stream':<16} first token {stream.ttft:6.3f}s  total {stream.elapsed:6.3f}s  ({count} deltas)")
+
+        tools = [{"type": "function", "function": {"name": "read_file", "parameters": {"type": "object"}}}]
+        stream = llm.stream(messages, tools=tools)
+        for _ in stream:
+            pass
+        call = stream.message.tool_calls[0]
+        print(f"{'stream, tool':<16} first token {stream.ttft:6.3f}s  total {stream.elapsed:6.3f}s  "
+              f"-> {call.function.name}({call.function.arguments})")
+
+        stub.errors, before = 2, stub.requests
+        stream = llm.stream(messages)
+        for _ in stream:
+            pass
+        print(f"{'stream, 2x 503':<16} first token {stream.ttft:6.3f}s  total {stream.elapsed:6.3f}s  "
+              f"({stub.requests - before} requests)")
+    finally:
+        stub.close()
+
+
+if __name__ == "__main__":
+    main()
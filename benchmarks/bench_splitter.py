@@ -0,0 +1,44 @@
+"""
+Throughput of RecursiveTextSplitter on multi-MB inputs.
+
+    uv run python benchmarks/bench_splitter.py [size_mb ...]
+"""
+import random
+import sys
+import time
+
+from openworker.rag.splitters import RecursiveTextSplitter, regex_token_spans
+
+
+def make_text(size: int, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    words = ["lorem", "ipsum", "dolor", "sit", "amet", "consectetur", "adipiscing", "elit", "sed", "do"]
+    parts, total = [], 0
+    while total < size:
+        sentence = " ".join(rng.choice(words) for _ in range(rng.randint(5, 25))) + ". "
+        if rng.random() < 0.1:
+            sentence += "\n\n" if rng.random() < 0.5 else "\n"
+        parts.append(sentence)
+        total += len(sentence)
+    return "".join(parts)[:size]
+
+
+def bench(name: str, splitter: RecursiveTextSplitter, text: str):
+    start = time.perf_counter()
+    count = sum(1 for _ in splitter.iter_spans(text))
+    elapsed = time.perf_counter() - start
+    mb = len(text) / 1e6
+    print(f"{name:<28} {mb:6.1f} MB  {count:7d} chunks  {elapsed:6.3f}s  {mb / elapsed:7.1f} MB/s")
+
+
+def main():
+    sizes = [float(a) for a in sys.argv[1:]] or [1, 8, 32]
+    for size_mb in sizes:
+        text = make_text(int(size_mb * 1e6))
+        bench("chars, prose", RecursiveTextSplitter(1000, 100), text)
+        bench("chars, no separators", RecursiveTextSplitter(1000, 100), "x" * len(text))
+        bench("tokens (words), prose", RecursiveTextSplitter(200, 20, tokenizer=regex_token_spans), text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Recall and latency of the vector backends on synthetic clustered embeddings.
+Recall@k is measured against an exact float32 search restricted to the same root.
+The Chroma row is one collection filtered by root_path, not a per-root shard.
+
+    uv run python benchmarks/bench_vectors.py [num_vectors ...]
+"""
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from openworker.rag.store import ChromaBackend
+from openworker.rag.vector_index import LocalVectorIndex
+
+DIM = 384        # all-MiniLM-L6-v2
+QUERIES = 200
+K = 10
+ROOTS = ["/docs/a", "/docs/b", "/docs/c"]
+
+
+def make_data(n: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(max(16, n // 500), DIM))
+    vectors = centers[rng.integers(0, len(centers), n)] + 0.6 * rng.normal(size=(n, DIM))
+    vectors = (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+    roots = rng.integers(0, len(ROOTS), n)
+    picks = rng.integers(0, n, QUERIES)
+    queries = vectors[picks] + 0.1 * rng.normal(size=(QUERIES, DIM)).astype(np.float32)
+    queries = (queries / np.linalg.norm(queries, axis=1, keepdims=True)).astype(np.float32)
+    return vectors, roots, queries
+
+
+def exact(vectors, roots, queries, root_id):
+    truth = []
+    for q in queries:
+        scores = vectors @ q
+        scores[roots != root_id] = -np.inf
+        truth.append(set(np.argsort(-scores)[:K].tolist()))
+    return truth
+
+
+def disk_usage(path: Path) -> float:
+    return sum(f.stat().st_size for f in path.rglob("*") if f.is_file()) / 1e6
+
+
+def bench(name: str, backend, path: Path, vectors, roots, queries, truth, batch: int = 5000):
+    ids = [str(i) for i in range(len(vectors))]
+    metas = [{"root_path": ROOTS[r]} for r in roots]
+    start = time.perf_counter()
+    for i in range(0, len(ids), batch):
+        backend.upsert(ids[i:i + batch], [""] * len(ids[i:i + batch]), vectors[i:i + batch], metas[i:i + batch])
+    build = time.perf_counter() - start
+
+    latencies, recalls = [], []
+    for q, expected in zip(queries, truth):
+        start = time.perf_counter()
+        hits = backend.query(q, K, roots=[ROOTS[0]])
+        latencies.append(time.perf_counter() - start)
+        recalls.append(len(expected & {int(h.id) for h in hits}) / K)
+    lat = np.array(latencies) * 1000
+    print(f"{name:<26} build {build:6.1f}s  recall@{K} {np.mean(recalls):.3f}  "
+          f"p50 {np.percentile(lat, 50):6.2f}ms  p95 {np.percentile(lat, 95):6.2f}ms  disk {disk_usage(path):7.1f} MB")
+
+
+def main():
+    sizes = [int(a) for a in sys.argv[1:]] or [20_000, 100_000]
+    for n in sizes:
+        print(f"--- {n} vectors, {DIM} dims, {QUERIES} queries restricted to 1 of {len(ROOTS)} roots")
+        vectors, roots, queries = make_data(n)
+        truth = exact(vectors, roots, queries, 0)
+        configs = [
+            ("chroma (float32, HNSW)", lambda p: ChromaBackend(str(p))),
+            ("int8 brute", lambda p: LocalVectorIndex(p, "int8", rescore=False, ivf_min_rows=10 ** 12)),
+            ("int8 brute + rescore", lambda p: LocalVectorIndex(p, "int8", rescore=True, ivf_min_rows=10 ** 12)),
+            ("int8 IVF + rescore", lambda p: LocalVectorIndex(p, "int8", rescore=True, ivf_min_rows=0)),
+            ("float16 brute", lambda p: LocalVectorIndex(p, "float16", rescore=False, ivf_min_rows=10 ** 12)),
+            ("float16 IVF", lambda p: LocalVectorIndex(p, "float16", rescore=False, ivf_min_rows=0)),
+        ]
+        for name, factory in configs:
+            path = Path(tempfile.mkdtemp(prefix="openworker-bench-"))
+            try:
+                bench(name, factory(path), path, vectors, roots, queries, truth)
+            finally:
+                shutil.rmtree(path, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
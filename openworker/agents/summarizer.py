@@ -1,5 +1,6 @@
 from openworker.core.llm import LLMClient
 from openworker.prompts.action_summary import ACTION_SUMMARY_PROMPT
+from openworker.prompts.history_summary import HISTORY_SUMMARY_PROMPT
 from openworker.agents.base_agent import BaseAgent
 import json
 
@@ -7,14 +8,14 @@ class SummarizerAgent(BaseAgent):
     def __init__(self):
         self.llm = LLMClient(model="z-ai/glm-4.5-air:free") 
 
-    def summarize_plan(self, tool_name: str, args: dict) -> str:
+    async def summarize_plan(self, tool_name: str, args: dict) -> str:
         """
         Uses LLM to summarize what a tool call will do.
         """
         user_content = f"Tool: {tool_name}\nArguments: {json.dumps(args, indent=2)}"
         
         try:
-            message = self.llm.chat(
+            message = await self.llm.achat(
                 messages=[
                     {"role": "system", "content": ACTION_SUMMARY_PROMPT},
                     {"role": "user", "content": user_content}
@@ -23,3 +24,23 @@ class SummarizerAgent(BaseAgent):
             return message.content.strip()
         except Exception as e:
             return f"Execute tool '{tool_name}' with args: {str(args)}"
+
+    async def summarize_conversation(self, summary: str, messages: list) -> str:
+        """
+        Uses LLM to fold messages that are leaving the conversation into the running summary.
+        """
+        lines = []
+        for m in messages:
+            for call in m.get("tool_calls") or []:
+                lines.append(f"{m['role']} called {call['function']['name']}({call['function']['arguments'][:500]})")
+            if m.get("content"):
+                lines.append(f"{m['role']}: {m['content'][:2000]}")
+        user_content = f"Current summary:\n{summary or '(empty)'}\n\nMessages:\n" + "\n".join(lines)
+
+        message = await self.llm.achat(
+            messages=[
+                {"role": "system", "content": HISTORY_SUMMARY_PROMPT},
+                {"role": "user", "content": user_content}
+            ]
+        )
+        return (message.content or "").strip() or summary
@@ -3,6 +3,7 @@ import typer
 import json
 from rich.console import Console
 from rich.markdown import Markdown
+from rich.live import Live
 from mcp import StdioServerParameters
 from mcp.client.stdio import stdio_client
 from mcp.client.session import ClientSession
@@ -43,6 +44,39 @@ async def async_confirm(question: str) -> bool:
         if active_status:
             active_status.start()
 
+class StreamRenderer:
+    """
+    Renders the model's streamed text as Markdown while it arrives.
+    The spinner stays up until the first token and comes back while tools run.
+    """
+    def __init__(self, status):
+        self.status = status
+        self.live = None
+        self.text = ""
+        self.streamed = False
+
+    def on_delta(self, delta):
+        if delta.tool_index is not None:
+            # Text before tool calls is done, the tools run next
+            self.close()
+            return
+        if not delta.content:
+            return
+        if self.live is None:
+            self.status.stop()
+            self.text = ""
+            self.live = Live(Markdown(""), console=console, refresh_per_second=15, vertical_overflow="visible")
+            self.live.start()
+        self.text += delta.content
+        self.streamed = True
+        self.live.update(Markdown(self.text))
+
+    def close(self):
+        if self.live is not None:
+            self.live.stop()
+            self.live = None
+            self.status.start()
+
 async def interactive_loop():
     console.print("[bold green]Starting Openworker...[/bold green]")
     
@@ -173,16 +207,21 @@ async def interactive_loop():
             if cmd_handler.handle_command(user_input, chat):
                 continue
 
-            # Show a spinner while thinking
+            # Show a spinner while thinking, then the answer as it streams in
             with console.status("[bold green]Thinking...[/bold green]") as status:
                 SPINNER_STATE.append(status)
+                renderer = StreamRenderer(status)
                 try:
-                    response = await chat.chat(user_input)
+                    response = await chat.chat(user_input, on_delta=renderer.on_delta)
                 finally:
+                    renderer.close()
                     if SPINNER_STATE:
                         SPINNER_STATE.pop()
             
-            console.print(Markdown(response))
+            if not renderer.streamed:
+                console.print(Markdown(response or ""))
+            if chat.last_timings:
+                console.print(f"[dim]{chat.last_timings}[/dim]")
 
 @app.command()
 def start():
@@ -1,7 +1,10 @@
 from openworker.agents.react import ReactAgent
 import os
 import json
-from typing import List, Dict, Any, Optional, Callable
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import List, Dict, Any, Optional, Callable, Tuple
 from openai import OpenAI
 from dotenv import load_dotenv
 from openworker.agents.react import ReactAgent
@@ -15,27 +18,61 @@ from openworker.utils.logger import trace_step, get_logger
 
 from openworker.tools.executor import ToolExecutor
 
-from openworker.core.llm import LLMClient
+from openworker.core.llm import LLMClient, AssistantMessage, ChatDelta
+from openworker.core.history import ConversationHistory, estimate_tools_tokens
+from openworker.config import TOOL_CONCURRENCY, HISTORY_SUMMARY
+
+
+@dataclass
+class TurnTimings:
+    """Latency of one chat() turn, in seconds, and the size of its prompts."""
+    ttft: Optional[float] = None    # first LLM step: request to first streamed delta
+    generation: float = 0.0         # all LLM steps: request to last delta
+    total: float = 0.0              # the whole turn, tool calls included
+    steps: List[Tuple[Optional[float], float]] = field(default_factory=list)  # (ttft, elapsed) per LLM step
+    prompt_tokens: List[int] = field(default_factory=list)  # per LLM step, as reported by the server or estimated
+
+    def __str__(self) -> str:
+        ttft = f"{self.ttft:.2f}s" if self.ttft is not None else "-"
+        prompt = f", prompt {max(self.prompt_tokens)} tokens" if self.prompt_tokens else ""
+        return (f"first token {ttft}, generation {self.generation:.2f}s over {len(self.steps)} "
+                f"LLM step(s), total {self.total:.2f}s{prompt}")
+
 
 class ChatSession(ReactAgent):
-    def __init__(self, tool_executor: ToolExecutor, allowed_folders: List[str] = None):
+    def __init__(self, tool_executor: ToolExecutor, allowed_folders: List[str] = None,
+                 max_concurrent_tools: int = TOOL_CONCURRENCY):
         """
         Args:
             tool_executor: Initialized ToolExecutor.
             allowed_folders: List of paths the agent can access.
+            max_concurrent_tools: Read-only tool calls of one turn that may run at once.
         """
         self.tool_executor = tool_executor
+        self.max_concurrent_tools = max(1, max_concurrent_tools)
         self.llm = LLMClient()
+        self.last_timings: Optional[TurnTimings] = None
+        self._summarizer = None
         
         self.allowed_folders = allowed_folders or []
+        # Kept under a token budget before every LLM step
+        self.memory = ConversationHistory("", summarizer=self._summarize if HISTORY_SUMMARY else None)
         self._set_system_prompt()
 
+    @property
+    def history(self) -> List[Dict[str, Any]]:
+        return self.memory.messages
+
     def _set_system_prompt(self):
         folder_ctx = "\nYou have access to files in these folders:\n" + "\n".join(f"- {p}" for p in self.allowed_folders)
         content = SYSTEM_PROMPT + folder_ctx
-        self.history: List[Dict[str, Any]] = [
-            {"role": "system", "content": content}
-        ]
+        self.memory.reset(content)
+
+    async def _summarize(self, summary: str, messages: List[Dict[str, Any]]) -> str:
+        if self._summarizer is None:
+            from openworker.agents.summarizer import SummarizerAgent
+            self._summarizer = SummarizerAgent()
+        return await self._summarizer.summarize_conversation(summary, messages)
 
     # Logic not very sound, it will remove all the dialogues, but works for now
     def update_folders(self, folders: List[str]):
@@ -47,46 +84,86 @@ class ChatSession(ReactAgent):
         await self.tool_executor.initialize()
 
     @trace_step("LLM Inference")
-    async def _step_llm(self, history: List[Dict[str, Any]]) -> Any:
-        # Run blocking LLM call in executor to avoid blocking the loop
-        import asyncio
-        loop = asyncio.get_event_loop()
-        
-        tools = self.tool_executor.get_tools_definitions() if self.tool_executor.get_tools_definitions() else None
-        
-        return await loop.run_in_executor(
-            None,
-            lambda: self.llm.chat(messages=history, tools=tools)
-        )
+    async def _step_llm(self, history: ConversationHistory, timings: TurnTimings,
+                        on_delta: Optional[Callable[[ChatDelta], None]] = None) -> AssistantMessage:
+        tools = self.tool_executor.get_tools_definitions() or None
+        estimate = await history.fit(reserve=estimate_tools_tokens(tools))
+        stream = await self.llm.astream(messages=history.messages, tools=tools)
+        async for delta in stream:
+            if on_delta:
+                on_delta(delta)
+
+        usage = stream.usage
+        if usage and usage.prompt_tokens:
+            history.calibrate(usage.prompt_tokens)
+        timings.prompt_tokens.append(usage.prompt_tokens if usage and usage.prompt_tokens else estimate)
+        timings.steps.append((stream.ttft, stream.elapsed))
+        if timings.ttft is None:
+            timings.ttft = stream.ttft
+        timings.generation += stream.elapsed
+        return stream.message
 
     @trace_step("Tool Execution")
     async def _step_tool(self, tool_call: Any) -> str:
         return await self.tool_executor.execute_tool(tool_call)
 
-    async def chat(self, user_input: str) -> str:
+    async def _run_tools(self, tool_calls: List[Any]) -> List[str]:
+        """
+        Runs a turn's tool calls and returns their results in call order.
+        Consecutive read-only calls run concurrently (up to max_concurrent_tools); any other
+        call waits for the calls before it and runs alone, so confirmations never overlap and
+        a read issued after a write sees the write.
+        """
+        semaphore = asyncio.Semaphore(self.max_concurrent_tools)
+
+        async def run(tool_call):
+            async with semaphore:
+                return await self._step_tool(tool_call)
+
+        results: List[str] = []
+        batch: List[Any] = []
+        for tool_call in tool_calls:
+            if self.tool_executor.is_concurrent_safe(tool_call):
+                batch.append(tool_call)
+                continue
+            results.extend(await asyncio.gather(*(run(c) for c in batch)))
+            batch = []
+            results.append(await self._step_tool(tool_call))
+        results.extend(await asyncio.gather(*(run(c) for c in batch)))
+        return results
+
+    async def chat(self, user_input: str, on_delta: Optional[Callable[[ChatDelta], None]] = None) -> str:
+        """
+        Runs one turn: LLM steps and tool calls until the model answers.
+        on_delta receives the model's streamed output as it arrives; timings end up in last_timings.
+        """
         # Note: Input logging is now handled by the Trace on methods or can be kept explicit if preferred for top-level.
         # But for AOP purity, let's rely on the decorator for the steps.
         # However, the user input itself isn't a "step" function call unless we wrap it.
         # Let's keep one explicit log for User Input as it's the trigger.
         get_logger().log_input(user_input)
         
-        self.history.append({"role": "user", "content": user_input})
+        self.memory.append({"role": "user", "content": user_input})
+        timings = TurnTimings()
+        started = time.perf_counter()
         
         while True:
             # 1. LLM Step
-            message = await self._step_llm(self.history)
-            self.history.append(message)
+            message = await self._step_llm(self.memory, timings, on_delta)
+            self.memory.append(message.to_dict())
             
             # Log LLM Response
             if not message.tool_calls:
+                timings.total = time.perf_counter() - started
+                self.last_timings = timings
                 get_logger().log_response(message.content)
+                get_logger().logger.info(f"TURN TIMINGS: {timings}")
                 return message.content
             
             # 2. Tool Step
-            for tool_call in message.tool_calls:
-                content = await self._step_tool(tool_call)
-                
-                self.history.append({
+            results = await self._run_tools(message.tool_calls)
+            for tool_call, content in zip(message.tool_calls, results):
+                self.memory.append({
                     "role": "tool",
                     "tool_call_id": tool_call.id,
                     "content": content
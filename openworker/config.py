@@ -13,6 +13,11 @@ OPENWORKER_HOME.mkdir(parents=True, exist_ok=True)
 
 # Specific paths
 CHROMA_PATH = OPENWORKER_HOME / "chroma"
+LEXICAL_PATH = OPENWORKER_HOME / "lexical.db"
+EMBED_CACHE_PATH = OPENWORKER_HOME / "embeddings.db"
+TEXT_CACHE_PATH = OPENWORKER_HOME / "text_cache"
+VECTORS_PATH = OPENWORKER_HOME / "vectors"
+ARTIFACTS_PATH = OPENWORKER_HOME / "artifacts"
 DB_PATH = OPENWORKER_HOME / "openworker.db"
 CONFIG_PATH = OPENWORKER_HOME / "mcp_config.json"
 ENV_PATH = OPENWORKER_HOME / ".env"
@@ -27,4 +32,51 @@ def get_default_config() -> dict:
                 "env": {}
             }
         }
-    }
\ No newline at end of file
+    }
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+# Document parsing pool (see openworker/utils/parse_pool.py)
+PARSE_WORKERS = _env_int("OPENWORKER_PARSE_WORKERS", max(1, (os.cpu_count() or 2) - 1))
+PARSE_TIMEOUT = _env_int("OPENWORKER_PARSE_TIMEOUT", 120)        # seconds per file
+PARSE_MEMORY_MB = _env_int("OPENWORKER_PARSE_MEMORY_MB", 2048)   # address space cap per worker, 0 = unlimited
+
+# Embedding cache (see openworker/rag/embed_cache.py)
+EMBED_CACHE_MAX_MB = _env_int("OPENWORKER_EMBED_CACHE_MB", 1024)
+
+# Extracted text cache (see openworker/utils/text_cache.py)
+TEXT_CACHE_MAX_MB = _env_int("OPENWORKER_TEXT_CACHE_MB", 512)
+
+# Extraction caps (see openworker/utils/readers.py), 0 = unlimited
+READ_MAX_CHARS = _env_int("OPENWORKER_READ_MAX_CHARS", 20_000)        # per read_file call
+READ_MAX_PAGES = _env_int("OPENWORKER_READ_MAX_PAGES", 50)            # PDF pages per read_file call
+INDEX_MAX_CHARS = _env_int("OPENWORKER_INDEX_MAX_CHARS", 20_000_000)  # per file when indexing
+
+# list_files directory snapshot lifetime in seconds (see openworker/utils/walker.py), 0 = off
+LIST_SNAPSHOT_TTL = _env_int("OPENWORKER_LIST_SNAPSHOT_TTL", 30)
+
+# Vector storage (see openworker/rag/store.py and openworker/rag/vector_index.py)
+VECTOR_BACKEND = os.environ.get("OPENWORKER_VECTOR_BACKEND", "chroma")  # "chroma" or "local"
+VECTOR_DTYPE = os.environ.get("OPENWORKER_VECTOR_DTYPE", "int8")        # "int8" or "float16", local backend
+VECTOR_RESCORE = _env_int("OPENWORKER_VECTOR_RESCORE", 0)               # keep float32 copies to rescore top hits
+SHARD_WORKERS = _env_int("OPENWORKER_SHARD_WORKERS", 4)                  # shards searched in parallel per query
+
+# Read-only tool calls run at once per model turn (see openworker/client.py)
+TOOL_CONCURRENCY = _env_int("OPENWORKER_TOOL_CONCURRENCY", 16)
+
+# LLM requests (see openworker/core/llm.py)
+LLM_TIMEOUT = _env_int("OPENWORKER_LLM_TIMEOUT", 120)        # seconds per request
+LLM_MAX_RETRIES = _env_int("OPENWORKER_LLM_MAX_RETRIES", 3)  # on 429, 5xx and connection errors
+LLM_CONCURRENCY = _env_int("OPENWORKER_LLM_CONCURRENCY", 4)  # requests in flight per model and process
+
+# Conversation history (see openworker/core/history.py), 0 = unlimited
+HISTORY_TOKEN_BUDGET = _env_int("OPENWORKER_HISTORY_TOKENS", 100_000)  # estimated prompt tokens
+HISTORY_SUMMARY = _env_int("OPENWORKER_HISTORY_SUMMARY", 0)            # fold dropped turns into an LLM summary
+
+# Oversized tool results (see openworker/tools/artifacts.py)
+ARTIFACT_THRESHOLD = _env_int("OPENWORKER_ARTIFACT_THRESHOLD", 12_000)  # characters, 0 = never spill
+ARTIFACT_MAX_MB = _env_int("OPENWORKER_ARTIFACT_MB", 256)
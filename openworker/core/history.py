@@ -0,0 +1,171 @@
+"""
+Token-budgeted conversation history for ChatSession.
+Each message's token count is estimated once, when it is added or changed, so the prompt size
+is a running sum, scaled by how the server-reported size of the last prompt compared to its
+estimate. When a prompt would go over the budget, old tool outputs are elided first (they are
+the bulk of long sessions and the model can call the tool again); if that is not enough, the
+oldest turns are dropped, optionally folded into a running summary first.
+"""
+import json
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from openworker.config import HISTORY_TOKEN_BUDGET
+from openworker.tools.artifacts import spilled_handle
+
+logger = logging.getLogger(__name__)
+
+CHARS_PER_TOKEN = 4      # rough average for English text and code
+MESSAGE_OVERHEAD = 4     # role and separators, per message
+ELIDED_PREVIEW = 300     # characters of an elided tool output that are kept
+SCALE_RANGE = (0.25, 4.0)  # bounds on the calibrated tokens-per-estimate ratio
+
+Message = Dict[str, Any]
+# (previous summary, messages being dropped) -> new summary
+Summarizer = Callable[[str, List[Message]], Awaitable[str]]
+
+
+def estimate_tokens(message: Message) -> int:
+    size = len(message.get("content") or "")
+    for call in message.get("tool_calls") or []:
+        size += len(call["function"]["name"]) + len(call["function"]["arguments"])
+    return MESSAGE_OVERHEAD + -(-size // CHARS_PER_TOKEN)
+
+
+def estimate_tools_tokens(tools: Optional[List[Dict[str, Any]]]) -> int:
+    """Tool definitions are sent with every request and count against the prompt too."""
+    return -(-len(json.dumps(tools)) // CHARS_PER_TOKEN) if tools else 0
+
+
+class ConversationHistory:
+    def __init__(self, system_prompt: str, budget: int = HISTORY_TOKEN_BUDGET, summarizer: Summarizer = None):
+        self.budget = budget
+        self.summarizer = summarizer
+        self.summary = ""
+        self.messages: List[Message] = []
+        self._tokens: List[int] = []  # per message, parallel to messages
+        self.scale = 1.0      # server-reported prompt tokens per estimated token
+        self._fitted = 0      # estimate of the prompt as of the last fit()
+        self.reset(system_prompt)
+
+    def reset(self, system_prompt: str):
+        self.summary = ""
+        self.messages, self._tokens = [], []
+        self.append({"role": "system", "content": system_prompt})
+
+    def append(self, message: Message):
+        self.messages.append(message)
+        self._tokens.append(estimate_tokens(message))
+
+    def _replace(self, i: int, message: Message):
+        self.messages[i] = message
+        self._tokens[i] = estimate_tokens(message)
+
+    def tokens(self) -> int:
+        return sum(self._tokens)
+
+    def __len__(self) -> int:
+        return len(self.messages)
+
+    def _turn_starts(self) -> List[int]:
+        return [i for i, m in enumerate(self.messages) if m["role"] == "user"]
+
+    def _current_turn(self) -> int:
+        starts = self._turn_starts()
+        return starts[-1] if starts else len(self.messages)
+
+    def _latest_step(self) -> int:
+        """Index of the last assistant message: the tool results after it are new to the model."""
+        return max((i for i, m in enumerate(self.messages) if m["role"] == "assistant"), default=len(self.messages))
+
+    def _elide_tool_outputs(self, target: int, protected_from: int) -> int:
+        """Shortens tool outputs before protected_from, oldest first, until the total is under target."""
+        total = self.tokens()
+        for i in range(protected_from):
+            if total <= target:
+                break
+            message = self.messages[i]
+            content = message.get("content") or ""
+            # Short outputs, including already elided ones, are not worth it
+            if message["role"] != "tool" or len(content) <= ELIDED_PREVIEW * 2:
+                continue
+            before = self._tokens[i]
+            handle = spilled_handle(content)
+            # A spilled result is still on disk, point at it rather than at the tool
+            hint = (f'the full result is stored as artifact "{handle}", read it with read_artifact' if handle
+                    else "call the tool again if you need them")
+            self._replace(i, {**message, "content": (
+                f"{content[:ELIDED_PREVIEW]}\n[Elided {len(content) - ELIDED_PREVIEW} more characters of "
+                f"this older tool result to save context; {hint}]")})
+            total += self._tokens[i] - before
+        return total
+
+    async def _drop_turns(self, target: int, keep_from: int) -> int:
+        """Drops whole turns between the system prompt(s) and keep_from, oldest first, until under target."""
+        first = 2 if self.summary else 1  # system prompt, then the running summary
+        total = self.tokens()
+        end = first
+        for start in self._turn_starts():
+            if start < first:
+                continue
+            if total <= target or start >= keep_from:
+                break
+            end = start
+            total = sum(self._tokens[:first]) + sum(self._tokens[start:])
+        # Turns run up to the next user message, so tool calls and their results go together
+        if total > target and keep_from > end:
+            end = keep_from
+        dropped = self.messages[first:end]
+        if not dropped:
+            return self.tokens()
+
+        if self.summarizer is not None:
+            try:
+                summary = await self.summarizer(self.summary, dropped)
+            except Exception as e:
+                logger.warning(f"History summary failed, dropping {len(dropped)} messages without one: {e}")
+                summary = self.summary
+        else:
+            summary = ""
+        kept_messages, kept_tokens = self.messages[end:], self._tokens[end:]
+        self.messages, self._tokens = self.messages[:1], self._tokens[:1]
+        self.summary = summary
+        if summary:
+            self.append({"role": "system", "content": f"Summary of the earlier conversation:\n{summary}"})
+        self.messages.extend(kept_messages)
+        self._tokens.extend(kept_tokens)
+        logger.info(f"History: dropped {len(dropped)} old messages" + (", folded into the summary" if summary else ""))
+        return self.tokens()
+
+    async def fit(self, reserve: int = 0) -> int:
+        """
+        Compacts the history so that it plus reserve tokens (e.g. tool definitions) fits the budget.
+        Only turns before the current one are dropped, and the newest tool results are never
+        elided since the model has not seen them yet. Returns the estimated prompt size.
+        """
+        # Compare in estimated tokens, so the per-message counts never need rescaling
+        target = int(self.budget / self.scale) - reserve
+        total = self.tokens()
+        if not self.budget or total <= target:
+            return self._fit_result(total + reserve)
+
+        total = self._elide_tool_outputs(target, self._current_turn())
+        if total > target:
+            total = await self._drop_turns(target, self._current_turn())
+        if total > target:
+            # Last resort: earlier tool results of the current turn
+            total = self._elide_tool_outputs(target, self._latest_step())
+        if total > target:
+            logger.warning(f"History: the current turn alone is ~{round(total * self.scale)} tokens, "
+                           f"over the {self.budget - round(reserve * self.scale)} token budget")
+        return self._fit_result(total + reserve)
+
+    def _fit_result(self, estimate: int) -> int:
+        self._fitted = estimate
+        return round(estimate * self.scale)
+
+    def calibrate(self, prompt_tokens: int):
+        """Takes the server-reported size of the prompt built by the last fit()."""
+        if prompt_tokens and self._fitted:
+            low, high = SCALE_RANGE
+            self.scale = min(high, max(low, prompt_tokens / self._fitted))
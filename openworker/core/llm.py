@@ -1,26 +1,370 @@
+import asyncio
+import logging
 import os
-from typing import List, Dict, Any, Optional
-from openai import OpenAI
+import random
+import threading
+import time
+import weakref
+from dataclasses import dataclass, field
+from typing import List, Dict, Any, AsyncIterator, Callable, Iterable, Iterator, Optional, Tuple
+from openai import APIConnectionError, APIStatusError, AsyncOpenAI, OpenAI
 from openai.types.chat import ChatCompletionMessage
+from openworker.config import LLM_CONCURRENCY, LLM_MAX_RETRIES, LLM_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUS = {408, 409, 429}  # and every 5xx
+BACKOFF_BASE = 0.5              # seconds, doubled per attempt
+BACKOFF_MAX = 8.0
+
+
+@dataclass
+class FunctionCall:
+    name: str = ""
+    arguments: str = ""
+
+
+@dataclass
+class ToolCall:
+    """Same shape as the SDK's tool calls (id, type, function.name, function.arguments)."""
+    id: str = ""
+    function: FunctionCall = field(default_factory=FunctionCall)
+    type: str = "function"
+
+
+@dataclass
+class AssistantMessage:
+    """An assistant message assembled from a stream."""
+    content: Optional[str] = None
+    tool_calls: List[ToolCall] = field(default_factory=list)
+
+    def to_dict(self) -> Dict[str, Any]:
+        message: Dict[str, Any] = {"role": "assistant", "content": self.content}
+        if self.tool_calls:
+            message["tool_calls"] = [
+                {"id": c.id, "type": c.type, "function": {"name": c.function.name, "arguments": c.function.arguments}}
+                for c in self.tool_calls
+            ]
+        return message
+
+
+@dataclass
+class ChatDelta:
+    """One streamed increment: text, or a fragment of the tool call at tool_index."""
+    content: str = ""
+    tool_index: Optional[int] = None
+    tool_name: str = ""
+    arguments: str = ""
+
+
+class StreamAssembler:
+    """Turns completion chunks into ChatDeltas and builds the final message as they arrive."""
+    def __init__(self):
+        self.content: List[str] = []
+        self.tool_calls: Dict[int, ToolCall] = {}
+        self.usage = None  # token counts, when the server sends them (usually with the last chunk)
+
+    def add(self, chunk: Any) -> List[ChatDelta]:
+        deltas = []
+        if getattr(chunk, "usage", None):
+            self.usage = chunk.usage
+        for choice in getattr(chunk, "choices", None) or []:
+            delta = choice.delta
+            if delta is None:
+                continue
+            if delta.content:
+                self.content.append(delta.content)
+                deltas.append(ChatDelta(content=delta.content))
+            for part in delta.tool_calls or []:
+                # The first fragment of a call carries its id and name, later ones append to the arguments
+                call = self.tool_calls.setdefault(part.index, ToolCall())
+                if part.id:
+                    call.id = part.id
+                name = part.function.name if part.function else None
+                arguments = part.function.arguments if part.function else None
+                # Some servers repeat the full name in every fragment, keep the first one
+                if name and not call.function.name:
+                    call.function.name = name
+                if arguments:
+                    call.function.arguments += arguments
+                deltas.append(ChatDelta(tool_index=part.index, tool_name=name or "", arguments=arguments or ""))
+        return deltas
+
+    def message(self) -> AssistantMessage:
+        calls = [self.tool_calls[i] for i in sorted(self.tool_calls)]
+        return AssistantMessage("".join(self.content) if self.content else None, calls)
+
+
+class ChatStream:
+    """
+    Iterates the ChatDeltas of one completion. Once exhausted, message holds the assembled
+    reply, ttft the seconds until the first delta and elapsed the seconds until the last.
+    The request's concurrency slot is held until the iteration ends or close() is called
+    (or, as a last resort, until the stream is garbage collected).
+    """
+    def __init__(self, chunks: Iterable[Any], started: float, release: Callable[[], None] = None):
+        self._chunks = chunks
+        self._assembler = StreamAssembler()
+        self._release = release
+        self.started = started
+        self.ttft: Optional[float] = None
+        self.elapsed: Optional[float] = None
+
+    def _deltas(self, chunk: Any) -> List[ChatDelta]:
+        deltas = self._assembler.add(chunk)
+        if deltas and self.ttft is None:
+            self.ttft = time.perf_counter() - self.started
+        return deltas
+
+    def _done(self):
+        release, self._release = getattr(self, "_release", None), None
+        if release is not None:
+            release()
+
+    def close(self):
+        """Ends the request without reading (the rest of) it."""
+        if self._release is None:
+            return
+        close = getattr(self._chunks, "close", None)
+        if close is not None:
+            close()
+        self._done()
+
+    def __del__(self):
+        self._done()
+
+    def __iter__(self) -> Iterator[ChatDelta]:
+        try:
+            for chunk in self._chunks:
+                yield from self._deltas(chunk)
+            self.elapsed = time.perf_counter() - self.started
+        finally:
+            # Hands the connection back to the pool if the caller stopped early
+            close = getattr(self._chunks, "close", None)
+            if close is not None:
+                close()
+            self._done()
+
+    @property
+    def message(self) -> AssistantMessage:
+        return self._assembler.message()
+
+    @property
+    def usage(self):
+        return self._assembler.usage
+
+
+class AsyncChatStream(ChatStream):
+    """ChatStream over an async completion stream: use `async for`, and aclose() to stop early."""
+    def close(self):
+        """Releases the slot; the connection goes back to the pool when the stream is collected."""
+        self._done()
+
+    async def aclose(self):
+        if self._release is None:
+            return
+        close = getattr(self._chunks, "close", None)
+        if close is not None:
+            await close()
+        self._done()
+
+    async def __aiter__(self) -> AsyncIterator[ChatDelta]:
+        try:
+            async for chunk in self._chunks:
+                for delta in self._deltas(chunk):
+                    yield delta
+            self.elapsed = time.perf_counter() - self.started
+        finally:
+            close = getattr(self._chunks, "close", None)
+            if close is not None:
+                await close()
+            self._done()
+
+
+def _retryable(error: Exception) -> bool:
+    if isinstance(error, APIStatusError):
+        return error.status_code in RETRY_STATUS or error.status_code >= 500
+    return isinstance(error, APIConnectionError)  # includes timeouts
+
+
+def _backoff(attempt: int, error: Exception) -> float:
+    """Full-jitter exponential backoff, or the server's Retry-After when it sends one."""
+    response = getattr(error, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    try:
+        if retry_after is not None:
+            return min(float(retry_after), BACKOFF_MAX * 4) + random.uniform(0, BACKOFF_BASE)
+    except ValueError:
+        pass  # an HTTP date, fall back to our own schedule
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+
+class LLMPool:
+    """
+    Process-wide LLM plumbing shared by every LLMClient: one SDK client (and so one keep-alive
+    HTTP pool) per endpoint, async ones per event loop, a cap on requests in flight per model,
+    request timeouts and jittered retries on 429, 5xx and connection errors.
+    """
+    def __init__(self, timeout: float = LLM_TIMEOUT, max_retries: int = LLM_MAX_RETRIES,
+                 concurrency: int = LLM_CONCURRENCY):
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.concurrency = max(1, concurrency)
+        self._lock = threading.Lock()
+        self._clients: Dict[Tuple[str, str], OpenAI] = {}
+        self._limits: Dict[str, threading.BoundedSemaphore] = {}
+        # asyncio clients and semaphores only work on the loop they were first used on
+        self._loops: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Tuple[dict, dict]]" = weakref.WeakKeyDictionary()
+
+    def _options(self, base_url: str, api_key: str) -> Dict[str, Any]:
+        # The SDK's own retries are off, ours below also cover streams and respect the model limits
+        return {"api_key": api_key, "base_url": base_url, "timeout": self.timeout, "max_retries": 0}
+
+    def client(self, base_url: str, api_key: str) -> OpenAI:
+        with self._lock:
+            key = (base_url, api_key)
+            if key not in self._clients:
+                self._clients[key] = OpenAI(**self._options(base_url, api_key))
+            return self._clients[key]
+
+    def limit(self, model: str) -> threading.BoundedSemaphore:
+        with self._lock:
+            if model not in self._limits:
+                self._limits[model] = threading.BoundedSemaphore(self.concurrency)
+            return self._limits[model]
+
+    def _loop_state(self) -> Tuple[dict, dict]:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if loop not in self._loops:
+                self._loops[loop] = ({}, {})
+            return self._loops[loop]
+
+    def async_client(self, base_url: str, api_key: str) -> AsyncOpenAI:
+        clients, _ = self._loop_state()
+        key = (base_url, api_key)
+        if key not in clients:
+            clients[key] = AsyncOpenAI(**self._options(base_url, api_key))
+        return clients[key]
+
+    def async_limit(self, model: str) -> asyncio.Semaphore:
+        _, limits = self._loop_state()
+        if model not in limits:
+            limits[model] = asyncio.Semaphore(self.concurrency)
+        return limits[model]
+
+    def _should_retry(self, attempt: int, error: Exception, model: str) -> Optional[float]:
+        if attempt >= self.max_retries or not _retryable(error):
+            return None
+        delay = _backoff(attempt, error)
+        logger.info(f"LLM request to {model} failed ({error}), retry {attempt + 1}/{self.max_retries} in {delay:.1f}s")
+        return delay
+
+    def run(self, model: str, create: Callable[[], Any], keep_slot: bool = False) -> Any:
+        """
+        create() within model's concurrency limit, retried on transient errors.
+        With keep_slot the slot stays taken on success; release it with limit(model).release().
+        """
+        limit = self.limit(model)
+        attempt = 0
+        while True:
+            limit.acquire()
+            try:
+                result = create()
+            except Exception as e:
+                limit.release()
+                delay = self._should_retry(attempt, e, model)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                attempt += 1
+                continue
+            if not keep_slot:
+                limit.release()
+            return result
+
+    async def arun(self, model: str, create: Callable[[], Any], keep_slot: bool = False) -> Any:
+        """run() for coroutines: create() returns an awaitable."""
+        limit = self.async_limit(model)
+        attempt = 0
+        while True:
+            await limit.acquire()
+            try:
+                result = await create()
+            except Exception as e:
+                limit.release()
+                delay = self._should_retry(attempt, e, model)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            if not keep_slot:
+                limit.release()
+            return result
+
+
+# Singleton
+_pool = None
+_pool_lock = threading.Lock()
+def get_llm_pool():
+    global _pool
+    if _pool is None:
+        # Query rewriter threads and the event loop may ask at the same time
+        with _pool_lock:
+            if _pool is None:
+                _pool = LLMPool()
+    return _pool
+
 
 class LLMClient:
-    def __init__(self, model: str = "google/gemini-3-flash-preview"):
-        self.api_key = os.getenv("OPENROUTER_API_KEY") or os.getenv("OPENAI_API_KEY")
-        self.base_url = "https://openrouter.ai/api/v1" if os.getenv("OPENROUTER_API_KEY") else None
+    def __init__(self, model: str = "google/gemini-3-flash-preview", base_url: str = None, api_key: str = None,
+                 pool: LLMPool = None):
+        """
+        base_url/api_key default to OpenRouter or OpenAI from the environment.
+        OPENWORKER_LLM_BASE_URL points every client at another OpenAI-compatible server (e.g. a local stub).
+        Connections, concurrency limits and retries come from the shared LLMPool.
+        """
+        self.api_key = api_key or os.getenv("OPENROUTER_API_KEY") or os.getenv("OPENAI_API_KEY")
+        self.base_url = base_url or os.getenv("OPENWORKER_LLM_BASE_URL") or (
+            "https://openrouter.ai/api/v1" if os.getenv("OPENROUTER_API_KEY") else None)
         self.model = model
-        
-        self.client = OpenAI(
-            api_key=self.api_key,
-            base_url=self.base_url
-        )
+        self.pool = pool or get_llm_pool()
+
+    def _request(self, messages: List[Dict[str, Any]], tools: Optional[List[Dict[str, Any]]], **extra) -> Dict[str, Any]:
+        return {"model": self.model, "messages": messages, "tools": tools, **extra}
 
     def chat(self, messages: List[Dict[str, Any]], tools: List[Dict[str, Any]] = None) -> ChatCompletionMessage:
         """
         Synchronous chat completion.
         """
-        response = self.client.chat.completions.create(
-            model=self.model,
-            messages=messages,
-            tools=tools,
-        )
+        client = self.pool.client(self.base_url, self.api_key)
+        response = self.pool.run(self.model, lambda: client.chat.completions.create(**self._request(messages, tools)))
         return response.choices[0].message
+
+    def stream(self, messages: List[Dict[str, Any]], tools: List[Dict[str, Any]] = None) -> ChatStream:
+        """
+        Streaming chat completion: iterate the result for content and tool-call deltas.
+        The request holds one of the model's concurrency slots until the result is iterated to
+        the end or closed.
+        """
+        client = self.pool.client(self.base_url, self.api_key)
+        started = time.perf_counter()
+        chunks = self.pool.run(self.model, lambda: client.chat.completions.create(
+            **self._request(messages, tools, stream=True, stream_options={"include_usage": True})), keep_slot=True)
+        return ChatStream(chunks, started, release=self.pool.limit(self.model).release)
+
+    async def achat(self, messages: List[Dict[str, Any]], tools: List[Dict[str, Any]] = None) -> ChatCompletionMessage:
+        """chat() on the event loop."""
+        client = self.pool.async_client(self.base_url, self.api_key)
+        response = await self.pool.arun(self.model, lambda: client.chat.completions.create(
+            **self._request(messages, tools)))
+        return response.choices[0].message
+
+    async def astream(self, messages: List[Dict[str, Any]], tools: List[Dict[str, Any]] = None) -> AsyncChatStream:
+        """stream() on the event loop: iterate the result with `async for`, or aclose() it."""
+        client = self.pool.async_client(self.base_url, self.api_key)
+        started = time.perf_counter()
+        chunks = await self.pool.arun(self.model, lambda: client.chat.completions.create(
+            **self._request(messages, tools, stream=True, stream_options={"include_usage": True})), keep_slot=True)
+        return AsyncChatStream(chunks, started, release=self.pool.async_limit(self.model).release)
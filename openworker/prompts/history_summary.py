@@ -0,0 +1,6 @@
+HISTORY_SUMMARY_PROMPT = """
+You maintain a running summary of a conversation between a user and an AI assistant that works on the user's local files.
+You get the current summary (possibly empty) and the oldest messages, which are about to be removed from the conversation.
+Return an updated summary that keeps what later turns may need: the user's goals and preferences, decisions made,
+files read or written and the facts learned from them, and open questions. Be concise. Return ONLY the summary.
+"""
@@ -0,0 +1,101 @@
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+
+class ChunkCatalog:
+    """
+    Columnar, in-process view of the indexed chunks, addressed by lexical doc_id.
+    Roots and sources are interned, so a row is just a few ints: resolving a hit is an array
+    lookup, and filtering by authorized roots is a vectorized mask over root_ids (cached per set
+    of roots until the catalog changes). LexicalIndex keeps doc_ids dense by compacting them, so
+    the columns stay proportional to the number of live chunks.
+    """
+    def __init__(self, capacity: int = 1024):
+        self.chunk_ids = np.empty(capacity, dtype=object)
+        self.root_ids = np.full(capacity, -1, dtype=np.int32)    # -1 marks an empty row
+        self.source_ids = np.full(capacity, -1, dtype=np.int32)
+        self.chunk_nos = np.full(capacity, -1, dtype=np.int32)   # chunk offset within its source
+        self.lengths = np.zeros(capacity, dtype=np.float32)       # tokens, for BM25 length normalization
+        self.row_of: Dict[str, int] = {}
+
+        self.roots: List[str] = []
+        self.sources: List[str] = []
+        self._root_index: Dict[str, int] = {}
+        self._source_index: Dict[str, int] = {}
+        self._masks: Dict[frozenset, np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return len(self.row_of)
+
+    def _grow(self, row: int):
+        size = len(self.root_ids)
+        if row < size:
+            return
+        new_size = max(size * 2, row + 1)
+        chunk_ids = np.empty(new_size, dtype=object)
+        chunk_ids[:size] = self.chunk_ids
+        self.chunk_ids = chunk_ids
+        lengths = np.zeros(new_size, dtype=np.float32)
+        lengths[:size] = self.lengths
+        self.lengths = lengths
+        for name in ("root_ids", "source_ids", "chunk_nos"):
+            col = np.full(new_size, -1, dtype=np.int32)
+            col[:size] = getattr(self, name)
+            setattr(self, name, col)
+
+    def _intern(self, value: Optional[str], values: List[str], index: Dict[str, int]) -> int:
+        if value is None:
+            return -2
+        i = index.get(value)
+        if i is None:
+            i = index[value] = len(values)
+            values.append(value)
+        return i
+
+    def set(self, row: int, chunk_id: str, root_path: Optional[str], source: Optional[str], length: int = 0):
+        self._grow(row)
+        self.chunk_ids[row] = chunk_id
+        self.lengths[row] = length
+        self.root_ids[row] = self._intern(root_path, self.roots, self._root_index)
+        self.source_ids[row] = self._intern(source, self.sources, self._source_index)
+        suffix = chunk_id.rsplit("_", 1)[-1]
+        self.chunk_nos[row] = int(suffix) if suffix.isdigit() else -1
+        self.row_of[chunk_id] = row
+        self._masks.clear()
+
+    def remove(self, row: int):
+        if row >= len(self.root_ids) or self.root_ids[row] == -1:
+            return
+        self.row_of.pop(self.chunk_ids[row], None)
+        self.chunk_ids[row] = None
+        self.root_ids[row] = self.source_ids[row] = self.chunk_nos[row] = -1
+        self._masks.clear()
+
+    def clear(self):
+        self.__init__()
+
+    def alive(self, rows: np.ndarray) -> np.ndarray:
+        """Boolean mask over the given rows, True where they hold a chunk."""
+        keep = rows < len(self.root_ids)
+        keep[keep] = self.root_ids[rows[keep]] != -1
+        return keep
+
+    def root_mask(self, roots: Iterable[str]) -> np.ndarray:
+        """Boolean mask over rows, True where the chunk belongs to one of the given roots."""
+        key = frozenset(roots)
+        mask = self._masks.get(key)
+        if mask is None:
+            if len(self._masks) >= 16:
+                self._masks.clear()
+            ids = [self._root_index[r] for r in key if r in self._root_index]
+            mask = self._masks[key] = np.isin(self.root_ids, np.array(ids, dtype=np.int32))
+        return mask
+
+    def root(self, row: int) -> Optional[str]:
+        i = self.root_ids[row]
+        return self.roots[i] if i >= 0 else None
+
+    def source(self, row: int) -> Optional[str]:
+        i = self.source_ids[row]
+        return self.sources[i] if i >= 0 else None
@@ -0,0 +1,148 @@
+"""
+Content-addressed embedding cache.
+Vectors are keyed by sha1(model + chunk text), so a chunk is embedded once no matter how many
+files, roots or re-index runs it shows up in. Least recently used entries are evicted once the
+cache grows past its size budget.
+"""
+import hashlib
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import List, Sequence
+
+import numpy as np
+
+from openworker.config import EMBED_CACHE_PATH, EMBED_CACHE_MAX_MB
+
+
+@dataclass
+class EmbedCacheStats:
+    hits: int = 0
+    misses: int = 0
+    encode_time: float = 0.0  # seconds spent in the model on misses
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    @property
+    def saved_time(self) -> float:
+        """Estimated model time avoided by hits, based on the average cost of a miss."""
+        return self.hits * self.encode_time / self.misses if self.misses else 0.0
+
+    def __str__(self) -> str:
+        return (f"{self.hit_rate:.0%} hit rate ({self.hits} hits, {self.misses} misses), "
+                f"~{self.saved_time:.1f}s of embedding saved")
+
+
+class EmbeddingCache:
+    def __init__(self, path: str = None, max_mb: int = EMBED_CACHE_MAX_MB):
+        if path is None:
+            path = str(EMBED_CACHE_PATH)
+        self.max_bytes = max_mb * 1024 * 1024
+        self._lock = threading.Lock()
+        self._rows = None  # upper bound on the row count, so puts skip COUNT(*) until it nears the budget
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        with self.conn:
+            self.conn.execute('PRAGMA journal_mode=WAL')
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS embeddings (
+                    key TEXT PRIMARY KEY,
+                    vector BLOB,
+                    last_used REAL
+                )
+            ''')
+            self.conn.execute('CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings (last_used)')
+
+    @staticmethod
+    def key(model: str, text: str) -> str:
+        return hashlib.sha1(f"{model}\0{text}".encode("utf-8")).hexdigest()
+
+    def get_many(self, keys: Sequence[str]) -> dict:
+        found = {}
+        with self._lock:
+            for i in range(0, len(keys), 500):
+                part = list(keys[i:i + 500])
+                q = f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(part))})"
+                found.update(self.conn.execute(q, part))
+            if found:
+                with self.conn:
+                    self.conn.executemany('UPDATE embeddings SET last_used = ? WHERE key = ?',
+                                          [(time.time(), k) for k in found])
+        return {k: np.frombuffer(v, dtype=np.float32) for k, v in found.items()}
+
+    def put_many(self, items: dict):
+        if not items:
+            return
+        now = time.time()
+        with self._lock, self.conn:
+            self.conn.executemany('INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)',
+                                  [(k, np.asarray(v, dtype=np.float32).tobytes(), now) for k, v in items.items()])
+            if self._rows is not None:
+                self._rows += len(items)
+            self._evict(len(next(iter(items.values()))) * 4)
+
+    def _evict(self, vector_bytes: int):
+        # Row overhead (key, timestamp, b-tree) is roughly 100 bytes on top of the vector
+        max_rows = max(1, self.max_bytes // (vector_bytes + 100))
+        if self._rows is not None and self._rows <= max_rows:
+            return
+        # Replaced keys and other processes sharing the file make the estimate drift; recount
+        count = self._rows = self.conn.execute('SELECT COUNT(*) FROM embeddings').fetchone()[0]
+        if count > max_rows:
+            # Evict a little extra so we are not doing this on every insert
+            excess = count - int(max_rows * 0.9)
+            self.conn.execute('''
+                DELETE FROM embeddings WHERE key IN (
+                    SELECT key FROM embeddings ORDER BY last_used LIMIT ?
+                )
+            ''', (excess,))
+            self._rows = count - excess
+
+    def clear(self):
+        with self._lock, self.conn:
+            self.conn.execute('DELETE FROM embeddings')
+            self._rows = 0
+
+
+class CachedEmbedder:
+    """
+    Wraps a SentenceTransformer, serving repeated texts from the EmbeddingCache.
+    Identical texts inside one call are also only embedded once.
+    """
+    def __init__(self, model, model_name: str, cache: EmbeddingCache = None):
+        self.model = model
+        self.model_name = model_name
+        self.cache = cache or EmbeddingCache()
+        self.stats = EmbedCacheStats()
+
+    def encode(self, texts: List[str], batch_size: int = 32, show_progress_bar: bool = False,
+               use_cache: bool = True) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        if not use_cache:
+            return np.asarray(self.model.encode(texts, batch_size=batch_size, show_progress_bar=show_progress_bar),
+                              dtype=np.float32)
+
+        keys = [EmbeddingCache.key(self.model_name, t) for t in texts]
+        vectors = self.cache.get_many(list(set(keys)))
+
+        missing = {}
+        for k, t in zip(keys, texts):
+            if k not in vectors:
+                missing.setdefault(k, t)
+        self.stats.hits += len(texts) - len(missing)
+        self.stats.misses += len(missing)
+
+        if missing:
+            start = time.perf_counter()
+            encoded = self.model.encode(list(missing.values()), batch_size=batch_size,
+                                        show_progress_bar=show_progress_bar)
+            self.stats.encode_time += time.perf_counter() - start
+            new = dict(zip(missing.keys(), np.asarray(encoded, dtype=np.float32)))
+            self.cache.put_many(new)
+            vectors.update(new)
+
+        return np.stack([vectors[k] for k in keys])
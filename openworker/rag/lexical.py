@@ -0,0 +1,378 @@
+"""
+Persistent BM25 index stored in SQLite.
+Each add() batch appends one segment per term: the batch's doc_ids (int32) and term frequencies
+(float32) packed into BLOBs, so a query term is a few rows decoded with np.frombuffer. Deleted
+chunks only leave the catalog and are skipped at query time; a term's segments are merged, and
+its dead postings dropped, once it has more than MAX_SEGMENTS of them. Document lengths live in
+the catalog. doc_ids are renumbered densely once deleted ones outnumber live ones, so the catalog
+(an array indexed by doc_id) stays proportional to the index. Opening the index costs nothing and
+nothing is rebuilt after an index run.
+"""
+import logging
+import math
+import re
+import sqlite3
+import threading
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from openworker.config import LEXICAL_PATH
+from openworker.rag.catalog import ChunkCatalog
+
+logger = logging.getLogger(__name__)
+
+MAX_SEGMENTS = 32     # per term, before they are merged into one
+COMPACT_SLACK = 4096  # spent doc_ids beyond twice the live ones, before they are renumbered
+
+# CJK scripts have no spaces, index them one character at a time
+_CJK = r"\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af"
+_TOKEN_RE = re.compile(rf"[{_CJK}]|[^\W_{_CJK}]+")
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(text.lower())
+
+
+def _decode(segments: Sequence[Tuple[int, bytes, bytes]]) -> Tuple[np.ndarray, np.ndarray]:
+    """Concatenates (segment, doc_ids, tfs) rows into one doc_id and one tf array."""
+    if not segments:
+        return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32)
+    return (np.concatenate([np.frombuffer(s[1], dtype=np.int32) for s in segments]),
+            np.concatenate([np.frombuffer(s[2], dtype=np.float32) for s in segments]))
+
+
+class LexicalIndex:
+    def __init__(self, path: str = None, k1: float = 1.5, b: float = 0.75):
+        if path is None:
+            path = str(LEXICAL_PATH)
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.RLock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self._catalog = None
+        self._catalog_version = -1
+        self._init_db()
+
+    def _init_db(self):
+        with self._lock, self.conn:
+            self.conn.execute('PRAGMA journal_mode=WAL')
+            self.conn.execute('PRAGMA synchronous=NORMAL')  # rebuildable from the vector store
+            if self.conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'postings'").fetchone():
+                # One row per (term, doc) from earlier versions; RagStore rebuilds an empty index
+                logger.info("Dropping the old lexical index layout, it is rebuilt from the vector store")
+                self.conn.executescript('''
+                    DROP TABLE postings;
+                    DROP TABLE IF EXISTS docs;
+                    DROP TABLE IF EXISTS terms;
+                    DROP TABLE IF EXISTS stats;
+                ''')
+            self.conn.executescript('''
+                CREATE TABLE IF NOT EXISTS terms (
+                    term_id INTEGER PRIMARY KEY,
+                    term TEXT UNIQUE,
+                    df INTEGER,
+                    segments INTEGER DEFAULT 0
+                );
+                CREATE INDEX IF NOT EXISTS idx_terms_crowded ON terms (segments) WHERE segments > 32;
+                CREATE TABLE IF NOT EXISTS docs (
+                    doc_id INTEGER PRIMARY KEY,
+                    chunk_id TEXT UNIQUE,
+                    root_path TEXT,
+                    source TEXT,
+                    length INTEGER,
+                    term_ids BLOB
+                );
+                CREATE INDEX IF NOT EXISTS idx_docs_root ON docs (root_path);
+                CREATE TABLE IF NOT EXISTS segments (
+                    term_id INTEGER,
+                    segment INTEGER,
+                    doc_ids BLOB,
+                    tfs BLOB,
+                    PRIMARY KEY (term_id, segment)
+                ) WITHOUT ROWID;
+                CREATE TABLE IF NOT EXISTS stats (
+                    key TEXT PRIMARY KEY,
+                    value INTEGER
+                );
+                INSERT OR IGNORE INTO stats VALUES ('doc_count', 0), ('total_length', 0), ('next_doc', 1),
+                    ('next_segment', 1), ('version', 0);
+            ''')
+
+    @property
+    def catalog(self) -> ChunkCatalog:
+        """
+        Loaded on first use, then kept in sync by add/delete. Other processes (the CLI indexer)
+        write the same file, so it is reloaded when the stored version moved on without us.
+        """
+        with self._lock:
+            version = self._stat('version')
+            if self._catalog is not None and self._catalog_version != version:
+                self._catalog = None
+            if self._catalog is None:
+                catalog = ChunkCatalog()
+                for doc_id, chunk_id, root_path, source, length in self.conn.execute(
+                        'SELECT doc_id, chunk_id, root_path, source, length FROM docs'):
+                    catalog.set(doc_id, chunk_id, root_path, source, length)
+                self._catalog, self._catalog_version = catalog, version
+            return self._catalog
+
+    def _bump_version(self):
+        """Called first in every write transaction, which also takes SQLite's write lock."""
+        self.conn.execute("UPDATE stats SET value = value + 1 WHERE key = 'version'")
+        version = self._stat('version')
+        if version != self._catalog_version + 1:
+            self._catalog = None  # another process wrote since our catalog was loaded
+        self._catalog_version = version
+
+    def root_paths(self, chunk_ids: Sequence[str]) -> List[Optional[str]]:
+        """Root of each chunk, None for chunks the index does not know."""
+        with self._lock:
+            catalog = self.catalog
+            rows = [catalog.row_of.get(i) for i in chunk_ids]
+            return [catalog.root(r) if r is not None else None for r in rows]
+
+    def _stat(self, key: str) -> int:
+        return self.conn.execute('SELECT value FROM stats WHERE key = ?', (key,)).fetchone()[0]
+
+    def _stats(self) -> Tuple[int, int]:
+        rows = dict(self.conn.execute('SELECT key, value FROM stats'))
+        return rows['doc_count'], rows['total_length']
+
+    def count(self) -> int:
+        with self._lock:
+            return self._stats()[0]
+
+    def _term_ids(self, terms: Iterable[str]) -> Dict[str, int]:
+        """Looks up (and creates) term IDs."""
+        terms = list(terms)
+        ids = {}
+        for i in range(0, len(terms), 500):
+            part = terms[i:i + 500]
+            q = f"SELECT term, term_id FROM terms WHERE term IN ({','.join('?' * len(part))})"
+            ids.update(self.conn.execute(q, part))
+        new = [term for term in terms if term not in ids]
+        if new:
+            self.conn.executemany('INSERT INTO terms (term, df) VALUES (?, 0)', [(t,) for t in new])
+            for i in range(0, len(new), 500):
+                part = new[i:i + 500]
+                q = f"SELECT term, term_id FROM terms WHERE term IN ({','.join('?' * len(part))})"
+                ids.update(self.conn.execute(q, part))
+        return ids
+
+    def _delete_docs(self, rows: Sequence[Tuple[int, int, bytes]]):
+        """Their postings stay in the segments until the next merge; the catalog hides them."""
+        if not rows:
+            return
+        df = Counter()
+        for _doc_id, _length, blob in rows:
+            df.update(np.frombuffer(blob, dtype=np.int64).tolist())
+        self.conn.executemany('UPDATE terms SET df = df - ? WHERE term_id = ?', [(n, t) for t, n in df.items()])
+        self.conn.executemany('DELETE FROM docs WHERE doc_id = ?', [(r[0],) for r in rows])
+        if self._catalog is not None:
+            for r in rows:
+                self._catalog.remove(r[0])
+        self.conn.execute("UPDATE stats SET value = value - ? WHERE key = 'doc_count'", (len(rows),))
+        self.conn.execute("UPDATE stats SET value = value - ? WHERE key = 'total_length'", (sum(r[1] for r in rows),))
+
+    def _rows_for(self, chunk_ids: Sequence[str]) -> List[Tuple[int, int, bytes]]:
+        rows = []
+        for i in range(0, len(chunk_ids), 500):
+            part = list(chunk_ids[i:i + 500])
+            q = f"SELECT doc_id, length, term_ids FROM docs WHERE chunk_id IN ({','.join('?' * len(part))})"
+            rows.extend(self.conn.execute(q, part))
+        return rows
+
+    def add(self, chunk_ids: Sequence[str], texts: Sequence[str], metadatas: Sequence[dict]):
+        """Adds or replaces chunks. The whole batch becomes one segment per term."""
+        with self._lock, self.conn:
+            self._bump_version()
+            self._delete_docs(self._rows_for(chunk_ids))
+
+            counts = [Counter(tokenize(t)) for t in texts]
+            terms, tfs, sizes = [], [], []
+            for c in counts:
+                terms.extend(c.keys())
+                tfs.extend(c.values())
+                sizes.append(len(c))
+            ids = self._term_ids(set(terms))
+            term_ids = np.fromiter(map(ids.__getitem__, terms), dtype=np.int64, count=len(terms))
+            tfs = np.array(tfs, dtype=np.float32)
+            first = self._stat('next_doc')
+            doc_ids = np.repeat(np.arange(first, first + len(counts), dtype=np.int32), sizes)
+
+            lengths = [sum(c.values()) for c in counts]
+            per_doc = np.split(term_ids, np.cumsum(sizes)[:-1]) if counts else []
+            docs = [(first + i, chunk_id, meta.get("root_path"), meta.get("source"), length, doc_terms.tobytes())
+                    for i, (chunk_id, meta, length, doc_terms) in enumerate(zip(chunk_ids, metadatas, lengths, per_doc))]
+            self.conn.executemany('INSERT INTO docs (doc_id, chunk_id, root_path, source, length, term_ids) '
+                                  'VALUES (?, ?, ?, ?, ?, ?)', docs)
+
+            # Group the batch's postings by term: one segment row and one df update per term
+            order = np.argsort(term_ids, kind="stable")
+            term_ids, doc_ids, tfs = term_ids[order], doc_ids[order], tfs[order]
+            starts = np.flatnonzero(np.r_[True, term_ids[1:] != term_ids[:-1]]).tolist()
+            bounds = list(zip(starts, starts[1:] + [len(term_ids)]))
+            touched = term_ids[starts].tolist()
+            segment = self._stat('next_segment')
+            self.conn.executemany('INSERT INTO segments (term_id, segment, doc_ids, tfs) VALUES (?, ?, ?, ?)',
+                                  [(t, segment, doc_ids[a:b].tobytes(), tfs[a:b].tobytes())
+                                   for t, (a, b) in zip(touched, bounds)])
+            self.conn.executemany('UPDATE terms SET df = df + ?, segments = segments + 1 WHERE term_id = ?',
+                                  [(b - a, t) for t, (a, b) in zip(touched, bounds)])
+            self.conn.execute("UPDATE stats SET value = value + ? WHERE key = 'next_doc'", (len(docs),))
+            self.conn.execute("UPDATE stats SET value = value + 1 WHERE key = 'next_segment'")
+            self.conn.execute("UPDATE stats SET value = value + ? WHERE key = 'doc_count'", (len(docs),))
+            self.conn.execute("UPDATE stats SET value = value + ? WHERE key = 'total_length'",
+                              (sum(d[4] for d in docs),))
+            if self._catalog is not None:
+                for doc_id, chunk_id, root_path, source, length, _ in docs:
+                    self._catalog.set(doc_id, chunk_id, root_path, source, length)
+            self._merge_segments()
+            self._maybe_compact()
+
+    def _merge_segments(self):
+        """Merges the segments of every term that has more than MAX_SEGMENTS, dropping deleted docs."""
+        crowded = [t for (t,) in self.conn.execute('SELECT term_id FROM terms WHERE segments > ?', (MAX_SEGMENTS,))]
+        if not crowded:
+            return
+        catalog = self.catalog
+        merged = []
+        for i in range(0, len(crowded), 500):
+            part = crowded[i:i + 500]
+            grouped: Dict[int, list] = {}
+            for term_id, segment, doc_ids, tfs in self.conn.execute(
+                    f"SELECT term_id, segment, doc_ids, tfs FROM segments WHERE term_id IN ({','.join('?' * len(part))})",
+                    part):
+                grouped.setdefault(term_id, []).append((segment, doc_ids, tfs))
+            for term_id, segments in grouped.items():
+                doc_ids, tfs = _decode(segments)
+                keep = catalog.alive(doc_ids.astype(np.intp))
+                merged.append((term_id, max(s[0] for s in segments), doc_ids[keep].tobytes(), tfs[keep].tobytes()))
+        self.conn.executemany('DELETE FROM segments WHERE term_id = ?', [(m[0],) for m in merged])
+        self.conn.executemany('INSERT INTO segments (term_id, segment, doc_ids, tfs) VALUES (?, ?, ?, ?)', merged)
+        self.conn.executemany('UPDATE terms SET segments = 1 WHERE term_id = ?', [(m[0],) for m in merged])
+
+    def _maybe_compact(self):
+        if self._stat('next_doc') - 1 > 2 * self._stats()[0] + COMPACT_SLACK:
+            self._compact()
+
+    def _compact(self):
+        """Renumbers the live doc_ids 1..n and rewrites every term as one segment without deleted docs."""
+        old = np.array([d for (d,) in self.conn.execute('SELECT doc_id FROM docs ORDER BY doc_id')], dtype=np.int64)
+        new = np.arange(1, len(old) + 1, dtype=np.int64)
+        remap = np.full(self._stat('next_doc'), -1, dtype=np.int32)
+        remap[old] = new
+        # Ascending, so every new id is free by the time a doc moves to it
+        moved = old != new
+        self.conn.executemany('UPDATE docs SET doc_id = ? WHERE doc_id = ?',
+                              zip(new[moved].tolist(), old[moved].tolist()))
+
+        terms = [t for (t,) in self.conn.execute('SELECT term_id FROM terms WHERE segments > 0')]
+        self.conn.execute('UPDATE terms SET segments = 0')
+        for i in range(0, len(terms), 500):
+            part = terms[i:i + 500]
+            placeholders = ','.join('?' * len(part))
+            grouped: Dict[int, list] = {}
+            for term_id, segment, doc_ids, tfs in self.conn.execute(
+                    f"SELECT term_id, segment, doc_ids, tfs FROM segments WHERE term_id IN ({placeholders})", part):
+                grouped.setdefault(term_id, []).append((segment, doc_ids, tfs))
+            merged = []
+            for term_id, segments in grouped.items():
+                doc_ids, tfs = _decode(segments)
+                doc_ids = remap[doc_ids]
+                keep = doc_ids >= 0
+                if keep.any():
+                    merged.append((term_id, max(s[0] for s in segments), doc_ids[keep].tobytes(), tfs[keep].tobytes()))
+            self.conn.execute(f"DELETE FROM segments WHERE term_id IN ({placeholders})", part)
+            self.conn.executemany('INSERT INTO segments (term_id, segment, doc_ids, tfs) VALUES (?, ?, ?, ?)', merged)
+            self.conn.executemany('UPDATE terms SET segments = 1 WHERE term_id = ?', [(m[0],) for m in merged])
+        self.conn.execute("UPDATE stats SET value = ? WHERE key = 'next_doc'", (len(old) + 1,))
+        self._catalog = None
+        logger.info(f"Compacted the lexical index to {len(old)} doc_ids")
+
+    def _postings(self, term_id: int) -> Tuple[np.ndarray, np.ndarray]:
+        """All (doc_ids, tfs) of a term, deleted docs included."""
+        return _decode(self.conn.execute(
+            'SELECT segment, doc_ids, tfs FROM segments WHERE term_id = ?', (term_id,)).fetchall())
+
+    def delete(self, chunk_ids: Sequence[str]):
+        with self._lock, self.conn:
+            self._bump_version()
+            self._delete_docs(self._rows_for(chunk_ids))
+            self._maybe_compact()
+
+    def delete_root(self, root_path: str):
+        """Deletes every chunk indexed under root_path."""
+        with self._lock, self.conn:
+            self._bump_version()
+            self._delete_docs(self.conn.execute(
+                'SELECT doc_id, length, term_ids FROM docs WHERE root_path = ?', (root_path,)).fetchall())
+            self._maybe_compact()
+
+    def clear(self):
+        with self._lock, self.conn:
+            self._bump_version()
+            self.conn.execute('DELETE FROM segments')
+            self.conn.execute('DELETE FROM docs')
+            self.conn.execute('DELETE FROM terms')
+            self.conn.execute("UPDATE stats SET value = 0 WHERE key IN ('doc_count', 'total_length')")
+            self.conn.execute("UPDATE stats SET value = 1 WHERE key = 'next_doc'")
+            if self._catalog is not None:
+                self._catalog.clear()
+
+    def search(self, query: str, k: int = 10, roots: Optional[Iterable[str]] = None) -> List[Tuple[str, float]]:
+        """
+        Returns the top-k (chunk_id, score) pairs for the query.
+        If roots is given, only chunks under those root paths are scored.
+        """
+        terms = Counter(tokenize(query))
+        if not terms:
+            return []
+
+        with self._lock:
+            n_docs, total_length = self._stats()
+            if not n_docs:
+                return []
+            avgdl = total_length / n_docs
+            catalog = self.catalog
+            mask = catalog.root_mask(roots) if roots is not None else None
+            if mask is not None and not mask.any():
+                return []
+
+            q = f"SELECT term_id, df FROM terms WHERE term IN ({','.join('?' * len(terms))}) AND df > 0"
+            found = self.conn.execute(q, list(terms)).fetchall()
+            if not found:
+                return []
+
+            row_parts, score_parts = [], []
+            for term_id, df in found:
+                doc_ids, tf = self._postings(term_id)
+                rows = doc_ids.astype(np.intp)
+                # Deleted docs are not in the catalog; drop them and docs outside the authorized roots
+                keep = catalog.alive(rows)
+                if mask is not None:
+                    keep[keep] = mask[rows[keep]]
+                if not keep.all():
+                    tf, rows = tf[keep], rows[keep]
+                if not len(rows):
+                    continue
+                idf = math.log((n_docs - df + 0.5) / (df + 0.5) + 1)
+                dl = catalog.lengths[rows]
+                score_parts.append(idf * tf * (self.k1 + 1) / (tf + self.k1 * (1 - self.b + self.b * dl / avgdl)))
+                row_parts.append(rows)
+
+            if not row_parts:
+                return []
+            rows, inverse = np.unique(np.concatenate(row_parts), return_inverse=True)
+            scores = np.bincount(inverse, weights=np.concatenate(score_parts))
+
+            # Partial selection instead of sorting every matching doc
+            if len(scores) > k:
+                top = np.argpartition(-scores, k)[:k]
+            else:
+                top = np.arange(len(scores))
+            top = top[np.argsort(-scores[top])]
+
+            return [(catalog.chunk_ids[rows[i]], float(scores[i])) for i in top]
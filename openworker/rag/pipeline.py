@@ -0,0 +1,270 @@
+import hashlib
+import logging
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from openworker.utils.parse_pool import ParsePool, ParseResult, get_parse_pool
+from openworker.rag.embed_cache import EmbedCacheStats
+
+logger = logging.getLogger(__name__)
+
+# Defaults keep peak memory around (QUEUE_SIZE + UPSERT_BATCH) chunks, i.e. a few MB of text.
+EMBED_BATCH = 64
+UPSERT_BATCH = 256
+QUEUE_SIZE = 512
+
+
+@dataclass
+class IndexStats:
+    files_indexed: int = 0
+    files_skipped: int = 0
+    files_removed: int = 0
+    files_failed: int = 0
+    chunks_written: int = 0
+    chunks_deleted: int = 0
+    embed_cache: EmbedCacheStats = field(default_factory=EmbedCacheStats)
+    started_at: float = field(default_factory=time.monotonic)
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started_at
+
+
+@dataclass
+class _Chunk:
+    id: str
+    text: str
+    meta: Dict[str, Any]
+
+
+@dataclass
+class _FileDone:
+    """Marker sent after the last chunk of a file. Committed to the manifest once its chunks are upserted."""
+    entry: Dict[str, Any]
+    stale_ids: List[str]
+    indexed: bool
+
+
+_END = object()
+
+
+class IndexPipeline:
+    """
+    Streaming indexer: walk -> parse (process pool) -> split -> embed -> upsert.
+    A reader thread feeds a bounded queue (backpressure), the calling thread embeds and upserts
+    in fixed-size batches. A file is only written to the manifest after all its chunks are
+    committed, so an interrupted run resumes from where it stopped.
+    """
+    def __init__(self, store, directory: str, embed_batch: int = EMBED_BATCH, upsert_batch: int = UPSERT_BATCH,
+                 queue_size: int = QUEUE_SIZE, progress_callback: Optional[Callable[[IndexStats], None]] = None,
+                 parse_pool: Optional[ParsePool] = None, paths: Optional[Iterable[str]] = None):
+        """paths restricts the run to those files (e.g. from the folder watcher) instead of walking the tree."""
+        self.store = store
+        self.paths = sorted(set(paths)) if paths is not None else None
+        self.parse_pool = parse_pool or get_parse_pool()
+        self.path = Path(directory)
+        self.root_path = str(self.path)
+        self.embed_batch = embed_batch
+        self.upsert_batch = upsert_batch
+        self.progress_callback = progress_callback
+        self.stats = IndexStats()
+
+        self._queue: "queue.Queue" = queue.Queue(maxsize=queue_size)
+        self._stop = threading.Event()
+        self._error: Optional[BaseException] = None
+
+        self._manifest: Dict[str, Dict[str, Any]] = {}
+        self._seen = set()
+        self._pending: Dict[str, Any] = {}
+
+    def _chunk_id(self, source: str, i: int) -> str:
+        rel_path = str(Path(source).relative_to(self.path.parent))
+        return f"{rel_path}_{i}"
+
+    def _put(self, item) -> bool:
+        # Blocks while the consumer is behind, but wakes up regularly to notice a stop request
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    # --- Producer ---
+
+    def _files(self):
+        if self.paths is None:
+            yield from self.path.rglob("*")
+            return
+        for source in self.paths:
+            p = Path(source)
+            if self.path in p.parents:
+                yield p
+
+    def _candidates(self):
+        """Walks the tree and yields files that need parsing, skipping unchanged ones via the manifest."""
+        for p in self._files():
+            if self._stop.is_set():
+                return
+            if not p.is_file() or p.name.startswith("."):
+                continue
+            source = str(p)
+            self._seen.add(source)
+            try:
+                st = p.stat()
+            except OSError as e:
+                self.stats.files_failed += 1
+                logger.warning(f"Skipping {p}: {e}")
+                continue
+            entry = self._manifest.get(source)
+            if entry and entry["size"] == st.st_size and entry["mtime"] == st.st_mtime:
+                self.stats.files_skipped += 1
+                continue
+            self._pending[source] = (st, entry)
+            yield source
+
+    def _produce(self):
+        try:
+            # Results arrive in completion order, so one slow file does not hold back the rest
+            for result in self.parse_pool.imap_unordered(self._candidates()):
+                st, entry = self._pending.pop(result.path)
+                try:
+                    if not self._process_file(result, st, entry):
+                        return
+                except Exception as e:
+                    self.stats.files_failed += 1
+                    logger.warning(f"Skipping {result.path}: {e}")
+        except BaseException as e:
+            self._error = e
+        finally:
+            self._put(_END)
+
+    def _process_file(self, result: ParseResult, st, entry: Optional[Dict[str, Any]]) -> bool:
+        source = result.path
+        old_count = entry["chunk_count"] if entry else 0
+        base = {"path": source, "size": st.st_size, "mtime": st.st_mtime}
+
+        if result.error:
+            # Crashes and timeouts may be transient: keep the old entry and chunks so the next run retries
+            self.stats.files_failed += 1
+            logger.warning(f"Skipping {source} until the next run: {result.error}")
+            return True
+
+        content = result.content
+        if not content or content.startswith("Error"):
+            # Remember unreadable files too, so they are not re-parsed until they change
+            stale = [self._chunk_id(source, i) for i in range(old_count)]
+            return self._put(_FileDone({**base, "content_hash": None, "chunk_count": 0}, stale, False))
+
+        file_hash = hashlib.md5(content.encode('utf-8')).hexdigest()
+        if entry and entry["content_hash"] == file_hash:
+            # Touched but not modified, just refresh size/mtime
+            self.stats.files_skipped += 1
+            return self._put(_FileDone({**entry, **base}, [], False))
+
+        last_modified = datetime.fromtimestamp(st.st_mtime).isoformat()
+        n = 0
+        for i, chunk in enumerate(self.store.splitter.iter_chunks(content)):
+            meta = {
+                "source": source,
+                "chunk": i,
+                "root_path": self.root_path,
+                "file_hash": file_hash,
+                "updated_at": last_modified
+            }
+            if not self._put(_Chunk(self._chunk_id(source, i), chunk, meta)):
+                return False
+            n += 1
+
+        # File shrank: drop chunk IDs past the new end
+        stale = [self._chunk_id(source, i) for i in range(n, old_count)]
+        return self._put(_FileDone({**base, "content_hash": file_hash, "chunk_count": n}, stale, True))
+
+    # --- Consumer ---
+
+    def _flush(self, chunks: List[_Chunk], done: List[_FileDone]):
+        if chunks:
+            docs = [c.text for c in chunks]
+            embedder = self.store.embedder
+            before = (embedder.stats.hits, embedder.stats.misses, embedder.stats.encode_time)
+            embeddings = embedder.encode(docs, batch_size=self.embed_batch)
+            self.stats.embed_cache.hits += embedder.stats.hits - before[0]
+            self.stats.embed_cache.misses += embedder.stats.misses - before[1]
+            self.stats.embed_cache.encode_time += embedder.stats.encode_time - before[2]
+            self.store.upsert_chunks([c.id for c in chunks], docs, embeddings, [c.meta for c in chunks])
+            self.stats.chunks_written += len(chunks)
+
+        if done:
+            stale = [i for d in done for i in d.stale_ids]
+            if stale:
+                self.store.delete_chunks(stale, self.root_path)
+                self.stats.chunks_deleted += len(stale)
+            self.store.db.upsert_manifest(self.root_path, [d.entry for d in done])
+            self.stats.files_indexed += sum(1 for d in done if d.indexed)
+
+        logger.info(f"Indexing {self.root_path}: {self.stats.files_indexed} files, "
+                    f"{self.stats.chunks_written} chunks, {self.stats.elapsed:.1f}s")
+        if self.progress_callback:
+            self.progress_callback(self.stats)
+
+    def _remove_deleted(self, first_run: bool):
+        if self.paths is None:
+            removed = [src for src in self._manifest if src not in self._seen]
+        else:
+            removed = [src for src in self.paths if src in self._manifest and src not in self._seen]
+        stale = [self._chunk_id(src, i) for src in removed for i in range(self._manifest[src]["chunk_count"])]
+
+        if first_run and self.paths is None:
+            # Chunks written before the manifest existed may include leftovers from shrunken files
+            expected = {self._chunk_id(src, i) for src, e in self.store.db.get_manifest(self.root_path).items()
+                        for i in range(e["chunk_count"])}
+            stale.extend(i for i in self.store.vectors.ids_for_root(self.root_path) if i not in expected)
+
+        if stale:
+            self.store.delete_chunks(stale, self.root_path)
+            self.stats.chunks_deleted += len(stale)
+        if removed:
+            self.store.db.delete_manifest(self.root_path, removed)
+        self.stats.files_removed = len(removed)
+
+    def run(self) -> IndexStats:
+        self._manifest = self.store.db.get_manifest(self.root_path)
+        first_run = not self._manifest
+
+        producer = threading.Thread(target=self._produce, name="openworker-index-reader", daemon=True)
+        producer.start()
+
+        chunks: List[_Chunk] = []
+        done: List[_FileDone] = []
+        try:
+            while True:
+                item = self._queue.get()
+                if item is _END:
+                    break
+                if isinstance(item, _Chunk):
+                    chunks.append(item)
+                else:
+                    done.append(item)
+                if len(chunks) >= self.upsert_batch or len(done) >= self.upsert_batch:
+                    self._flush(chunks, done)
+                    chunks, done = [], []
+            self._flush(chunks, done)
+        finally:
+            self._stop.set()
+            producer.join()
+
+        if self._error is not None:
+            raise self._error
+
+        self._remove_deleted(first_run)
+        if self.parse_pool.stats.formats:
+            logger.info(f"Parse times:\n{self.parse_pool.stats.summary()}")
+        if self.parse_pool.cache is not None:
+            logger.info(f"Text cache: {self.parse_pool.cache.stats}")
+        return self.stats
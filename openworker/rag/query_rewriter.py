@@ -1,33 +1,187 @@
-from openworker.prompts.rag import RAG_SYSTEM_PROMPT
+import re
+import threading
+import time
+import logging
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError
+from dataclasses import dataclass, field
+from typing import Any, Callable, Tuple
+
+from openworker.prompts.query_rewrite import RAG_SYSTEM_PROMPT
 from openworker.core.llm import LLMClient
+from openworker.rag.result_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# Words that suggest a conversational query worth rewriting, even when it is short
+_QUESTION_WORDS = {
+    "what", "how", "why", "when", "where", "who", "which", "can", "could", "should", "would",
+    "please", "tell", "explain", "find", "show", "is", "are", "do", "does",
+}
+_WORD_RE = re.compile(r"\w+")
+
+
+@dataclass
+class RewritePolicy:
+    skip_max_words: int = 4          # keyword-style queries up to this many words are used as-is
+    timeout: float = 3.0             # seconds before falling back to the raw query
+    speculative: bool = True         # retrieve on the raw query while the rewrite is in flight
+    merge_speculative: bool = False  # keep raw-query hits after the refined ones instead of discarding them
+
+
+@dataclass
+class RewriteStats:
+    calls: int = 0
+    skipped: int = 0
+    cache_hits: int = 0
+    timeouts: int = 0
+    failures: int = 0
+    added_latency: float = 0.0  # seconds search_knowledge spent waiting because of the rewrite
+    last_added_latency: float = 0.0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def count(self, name: str):
+        # Concurrent searches share one rewriter
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
 
+    def record_wait(self, seconds: float):
+        with self._lock:
+            self.added_latency += seconds
+            self.last_added_latency = seconds
+
+
+@dataclass
+class PendingRewrite:
+    future: Future
+    started_at: float
+
+    @classmethod
+    def resolved(cls, query: str) -> "PendingRewrite":
+        future = Future()
+        future.set_result(query)
+        return cls(future, time.monotonic())
 
 
 class QueryRewriter:
-    def __init__(self):
-        self.llm = LLMClient(model="google/gemini-2.0-flash-001") 
+    def __init__(self, llm: Any = None, policy: RewritePolicy = None):
+        self.llm = llm or LLMClient(model="google/gemini-2.0-flash-001")
+        self.policy = policy or RewritePolicy()
+        self.stats = RewriteStats()
+        # Rewrites only depend on the query text, so they outlive index changes
+        self.cache = TTLCache(max_entries=512, ttl=3600)
+        self._executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="openworker-rewrite")
+
+    def should_skip(self, query: str) -> bool:
+        """Short keyword queries (no question words, no '?') gain nothing from an LLM round trip."""
+        words = _WORD_RE.findall(query.lower())
+        if not words:
+            return True
+        if "?" in query:
+            return False
+        return len(words) <= self.policy.skip_max_words and not _QUESTION_WORDS.intersection(words)
+
+    def _call_llm(self, original_query: str) -> str:
+        message = self.llm.chat(
+            messages=[
+                {"role": "system", "content": RAG_SYSTEM_PROMPT},
+                {"role": "user", "content": original_query}
+            ]
+        )
+        refined = message.content.strip() if message.content else original_query
+        # Cached even if the caller already timed out, so the next identical query benefits
+        self.cache.put(original_query, refined)
+        return refined
+
+    def submit(self, original_query: str) -> PendingRewrite:
+        """Starts the rewrite in the background. Resolve it with wait()."""
+        self.stats.count("calls")
+        if self.should_skip(original_query):
+            self.stats.count("skipped")
+            return PendingRewrite.resolved(original_query)
+        cached = self.cache.get(original_query)
+        if cached is not None:
+            self.stats.count("cache_hits")
+            return PendingRewrite.resolved(cached)
+        return PendingRewrite(self._executor.submit(self._call_llm, original_query), time.monotonic())
+
+    def wait(self, pending: PendingRewrite, original_query: str) -> str:
+        """Returns the rewrite, or the original query on failure or once the policy timeout has passed."""
+        remaining = max(0.0, self.policy.timeout - (time.monotonic() - pending.started_at))
+        try:
+            return pending.future.result(timeout=remaining)
+        except TimeoutError:
+            self.stats.count("timeouts")
+            logger.info(f"Query rewrite timed out after {self.policy.timeout}s, using the raw query")
+            return original_query
+        except Exception as e:
+            # Fallback to original if LLM fails (not cached, so the next call retries)
+            self.stats.count("failures")
+            return original_query
 
     def refine_query(self, original_query: str) -> str:
         """
         Rewrites a user query to be more suitable for retrieval.
         """
-        system_prompt = RAG_SYSTEM_PROMPT
-        
-        try:
-            message = self.llm.chat(
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": original_query}
-                ]
-            )
-            return message.content.strip() if message.content else original_query
-        except Exception as e:
-            # Fallback to original if LLM fails
-            return original_query
-            
+        start = time.monotonic()
+        refined = self.wait(self.submit(original_query), original_query)
+        self.stats.record_wait(time.monotonic() - start)
+        return refined
+
+    def rewrite_and_search(self, original_query: str, search: Callable[[str], dict],
+                           top_k: int = 5) -> Tuple[str, dict]:
+        """
+        Rewrites the query and runs `search` on the result. With a speculative policy the raw
+        query is searched while the rewrite is in flight; that result is reused when the rewrite
+        comes back unchanged (or times out), and merged or discarded otherwise.
+        """
+        pending = self.submit(original_query)
+        if pending.future.done() or not self.policy.speculative:
+            start = time.monotonic()
+            refined = self.wait(pending, original_query)
+            self.stats.record_wait(time.monotonic() - start)
+            return refined, search(refined)
+
+        raw_results = search(original_query)
+        # Only the part of the rewrite that outlasts the raw search adds latency
+        start = time.monotonic()
+        refined = self.wait(pending, original_query)
+
+        if _normalize(refined) == _normalize(original_query):
+            self.stats.record_wait(time.monotonic() - start)
+            return refined, raw_results
+        # The rewrite changed the query, so the second search is on the critical path too
+        results = search(refined)
+        self.stats.record_wait(time.monotonic() - start)
+        if self.policy.merge_speculative:
+            results = _merge(results, raw_results, top_k)
+        return refined, results
+
+
+def _normalize(query: str) -> str:
+    return " ".join(_WORD_RE.findall(query.lower()))
+
+
+def _merge(primary: dict, secondary: dict, top_k: int) -> dict:
+    """Appends hits from secondary that are not in primary, up to top_k."""
+    docs = list(primary["documents"][0]) if primary["documents"] else []
+    metas = list(primary["metadatas"][0]) if primary["metadatas"] else []
+    seen = set(docs)
+    if secondary["documents"]:
+        for doc, meta in zip(secondary["documents"][0], secondary["metadatas"][0]):
+            if len(docs) >= top_k:
+                break
+            if doc not in seen:
+                seen.add(doc)
+                docs.append(doc)
+                metas.append(meta)
+    return {"documents": [docs], "metadatas": [metas]}
+
 _rewriter = None
+_rewriter_lock = threading.Lock()
 def get_rewriter():
     global _rewriter
     if _rewriter is None:
-        _rewriter = QueryRewriter()
+        with _rewriter_lock:
+            if _rewriter is None:
+                _rewriter = QueryRewriter()
     return _rewriter
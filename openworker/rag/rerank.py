@@ -0,0 +1,134 @@
+"""
+Second-stage reranking with a cross-encoder.
+Candidates arrive fused (reciprocal rank fusion of vector and BM25 results). The stage then
+  1. cuts them to a candidate budget,
+  2. skips the cross-encoder entirely when the vector and BM25 rankings agree on the top-k
+     (fused scores only say whether the lists agree on each chunk, not how well it matches),
+  3. reuses cached (query, chunk) scores and only predicts the rest, in fixed-size batches.
+Each step is timed so its effect on latency is visible.
+"""
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+RRF_K = 60
+
+
+@dataclass
+class RerankConfig:
+    candidate_budget: int = 20      # max candidates sent to the cross-encoder
+    batch_size: int = 16
+    top_k: int = 5
+    skip_agreement: Optional[float] = 1.0  # share of the top-k every ranking has in common to skip; None disables
+    cache_size: int = 4096
+
+
+@dataclass
+class Candidate:
+    id: str
+    document: str
+    metadata: Dict[str, Any]
+    score: float = 0.0
+
+
+@dataclass
+class RerankReport:
+    candidates: int = 0
+    cache_hits: int = 0
+    predicted: int = 0
+    skipped: bool = False
+    timings: Dict[str, float] = field(default_factory=dict)  # ms per step
+
+    def __str__(self) -> str:
+        steps = ", ".join(f"{k} {v:.1f}ms" for k, v in self.timings.items())
+        mode = "skipped (rankings agree on the top-k)" if self.skipped else f"{self.predicted} predicted, {self.cache_hits} cached"
+        return f"rerank {self.candidates} candidates: {mode} | {steps}"
+
+
+def fuse(ranked_lists: List[List[Candidate]], k: int = RRF_K) -> List[Candidate]:
+    """Reciprocal rank fusion. Each list must be ordered best first."""
+    fused: Dict[str, Candidate] = {}
+    for ranked in ranked_lists:
+        for rank, c in enumerate(ranked):
+            if c.id not in fused:
+                fused[c.id] = Candidate(c.id, c.document, c.metadata, 0.0)
+            fused[c.id].score += 1.0 / (k + rank + 1)
+    return sorted(fused.values(), key=lambda c: c.score, reverse=True)
+
+
+class Reranker:
+    def __init__(self, model, config: RerankConfig = None):
+        self.model = model
+        self.config = config or RerankConfig()
+        self._cache: "OrderedDict[Tuple[str, str], float]" = OrderedDict()
+        self._cache_lock = threading.Lock()  # searches run on worker threads
+
+    def _cache_get(self, key) -> Optional[float]:
+        with self._cache_lock:
+            score = self._cache.get(key)
+            if score is not None:
+                self._cache.move_to_end(key)
+            return score
+
+    def _cache_put(self, key, score: float):
+        with self._cache_lock:
+            self._cache[key] = score
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.config.cache_size:
+                self._cache.popitem(last=False)
+
+    def _agreed(self, rankings: Optional[List[List[Candidate]]], k: int) -> bool:
+        """True when every ranking holds at least skip_agreement * k of the same top-k chunks."""
+        agreement = self.config.skip_agreement
+        if agreement is None or not rankings or len(rankings) < 2 or any(len(r) < k for r in rankings):
+            return False
+        common = set.intersection(*({c.id for c in r[:k]} for r in rankings))
+        return len(common) >= agreement * k
+
+    def rerank(self, query: str, candidates: List[Candidate], top_k: int = None,
+               rankings: List[List[Candidate]] = None) -> Tuple[List[Candidate], RerankReport]:
+        """
+        candidates must be sorted by fused score, best first. rankings are the lists that were
+        fused (e.g. vector and BM25 results); without them the cross-encoder always runs.
+        """
+        k = top_k or self.config.top_k
+        report = RerankReport()
+        start = time.perf_counter()
+
+        candidates = candidates[:self.config.candidate_budget]
+        report.candidates = len(candidates)
+        if not candidates:
+            return [], report
+
+        if self._agreed(rankings, k):
+            report.skipped = True
+            report.timings["total"] = (time.perf_counter() - start) * 1000
+            return candidates[:k], report
+
+        t = time.perf_counter()
+        keys = [(query, hashlib.sha1(c.document.encode("utf-8")).hexdigest()) for c in candidates]
+        scores = [self._cache_get(key) for key in keys]
+        todo = [i for i, s in enumerate(scores) if s is None]
+        report.cache_hits = len(candidates) - len(todo)
+        report.timings["cache"] = (time.perf_counter() - t) * 1000
+
+        if todo:
+            t = time.perf_counter()
+            pairs = [[query, candidates[i].document] for i in todo]
+            predicted = self.model.predict(pairs, batch_size=self.config.batch_size, show_progress_bar=False)
+            for i, score in zip(todo, predicted):
+                scores[i] = float(score)
+                self._cache_put(keys[i], scores[i])
+            report.predicted = len(todo)
+            report.timings["predict"] = (time.perf_counter() - t) * 1000
+
+        ranked = [Candidate(c.id, c.document, c.metadata, s) for c, s in zip(candidates, scores)]
+        ranked.sort(key=lambda c: c.score, reverse=True)
+        report.timings["total"] = (time.perf_counter() - start) * 1000
+        return ranked[:k], report
@@ -0,0 +1,74 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries also expire after ttl seconds."""
+    def __init__(self, max_entries: int = 256, ttl: float = 300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is not _MISSING and time.monotonic() - item[1] < self.ttl:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return item[0]
+            if item is not _MISSING:
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def put(self, key: Hashable, value: Any):
+        with self._lock:
+            self._data[key] = (value, time.monotonic())
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class SearchCache(TTLCache):
+    """
+    Caches search results per (refined query, authorized folders, index generation).
+    The generation comes from StateDB, so indexing, resets and folder changes made by any
+    process invalidate it. Entries from an older generation are dropped as soon as a change is seen.
+    """
+    def __init__(self, max_entries: int = 256, ttl: float = 300):
+        super().__init__(max_entries, ttl)
+        self._generation: Optional[tuple] = None
+
+    def key(self, query: str, folders, generations: dict) -> tuple:
+        generation = (generations.get("index", 0), generations.get("folders", 0))
+        with self._lock:
+            if generation != self._generation:
+                self._data.clear()
+                self._generation = generation
+        return (query, frozenset(folders), generation)
+
+
+# Singleton
+_search_cache = None
+_search_cache_lock = threading.Lock()
+def get_search_cache():
+    global _search_cache
+    if _search_cache is None:
+        with _search_cache_lock:
+            if _search_cache is None:
+                _search_cache = SearchCache()
+    return _search_cache
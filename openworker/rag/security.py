@@ -1,30 +1,71 @@
 import os
-from typing import List, Callable
+import threading
+import time
+from typing import FrozenSet, List, Callable
 from functools import wraps
 from inspect import signature
 from openworker.state import StateDB, get_db
 
+# Seconds between checks for folders added or removed by another process
+REFRESH_INTERVAL = 1.0
+
+
 class PathGuard:
-    def __init__(self, db: StateDB = None):
+    """
+    Authorizes paths against the tracked folders.
+    The allowlist is loaded once and kept in memory as a set of resolved folder paths; a path
+    is allowed when one of its ancestors is in the set. It is reloaded when StateDB's "folders"
+    generation changes, which this process sees at once and other processes' changes within
+    REFRESH_INTERVAL.
+    """
+    def __init__(self, db: StateDB = None, refresh_interval: float = REFRESH_INTERVAL):
         self.db = db or get_db()
+        self.refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        self._folders: List[str] = []
+        self._prefixes: FrozenSet[str] = frozenset()
+        self._generation = None
+        self._local_changes = None
+        self._checked_at = 0.0
+
+    def _refresh(self):
+        now = time.monotonic()
+        if (self._local_changes == self.db.local_changes and self._generation is not None
+                and now - self._checked_at < self.refresh_interval):
+            return
+        with self._lock:
+            local_changes = self.db.local_changes
+            generation = self.db.get_generations().get("folders", 0)
+            if generation != self._generation:
+                folders = self.db.list_folders()
+                self._prefixes = frozenset(os.path.realpath(os.path.abspath(f)) for f in folders)
+                self._folders = folders
+                self._generation = generation
+            self._local_changes = local_changes
+            self._checked_at = now
 
     def _get_allowed_folders(self) -> List[str]:
-        return self.db.list_folders()
+        self._refresh()
+        return list(self._folders)
 
     def validate_path(self, target_path: str) -> bool:
         """
         Checks if the target_path (resolved) is within any of the allowed folders.
         """
         try:
-            real_target = os.path.realpath(os.path.abspath(target_path))
-            allowed_folders = self._get_allowed_folders()
-            
-            for folder in allowed_folders:
-                real_folder = os.path.realpath(os.path.abspath(folder))
-                # Check if target is inside the folder (common prefix)
-                if os.path.commonpath([real_folder, real_target]) == real_folder:
+            self._refresh()
+            prefixes = self._prefixes
+            if not prefixes:
+                return False
+            # Walk up from the target: one set lookup per path component
+            current = os.path.realpath(os.path.abspath(target_path))
+            while True:
+                if current in prefixes:
                     return True
-            return False
+                parent = os.path.dirname(current)
+                if parent == current:
+                    return False
+                current = parent
         except Exception:
             return False
 
@@ -36,10 +77,14 @@ class PathGuard:
         pass
 
 _guard = None
+_guard_lock = threading.Lock()
 def get_guard():
     global _guard
     if _guard is None:
-        _guard = PathGuard()
+        # Tools run on worker threads, which must all share one guard
+        with _guard_lock:
+            if _guard is None:
+                _guard = PathGuard()
     return _guard
 
 
@@ -49,22 +94,28 @@ def secure_path(arg_name: str = "path"):
     If validation fails, returns an error string (friendly for LLM tools).
     """
     def decorator(func: Callable) -> Callable:
+        # Locate the target parameter once, instead of binding the signature on every call
+        params = signature(func).parameters
+        names = list(params)
+        position = names.index(arg_name)
+        default = params[arg_name].default
+
         @wraps(func)
         def wrapper(*args, **kwargs):
-            # Inspect arguments to find the target parameter
-            sig = signature(func)
-            bound_args = sig.bind(*args, **kwargs)
-            bound_args.apply_defaults()
-            
-            path_val = bound_args.arguments.get(arg_name)
-            
+            if arg_name in kwargs:
+                path_val = kwargs[arg_name]
+            elif len(args) > position:
+                path_val = args[position]
+            else:
+                path_val = default
+
             if path_val:
-                # If path_val is a list (e.g. for some future tool), check all? 
+                # If path_val is a list (e.g. for some future tool), check all?
                 # For now assuming string.
                 if isinstance(path_val, str):
                     if not get_guard().validate_path(path_val):
                         return f"Error: Access denied. Path '{path_val}' is not in an authorized folder."
-            
+
             return func(*args, **kwargs)
         return wrapper
-    return decorator
\ No newline at end of file
+    return decorator
@@ -1,61 +1,95 @@
 import re
-from typing import List
+from bisect import bisect_left, bisect_right
+from typing import Callable, Iterator, List, Optional, Sequence, Tuple
+
+Span = Tuple[int, int]
+
+_NON_SPACE = re.compile(r"\S")
+_WORD = re.compile(r"\S+")
+
+
+def regex_token_spans(text: str) -> List[Span]:
+    """Whitespace-delimited words as (start, end) offsets. Pass a model tokenizer's offsets for exact counts."""
+    return [m.span() for m in _WORD.finditer(text)]
+
 
 class RecursiveTextSplitter:
-    def __init__(self, chunk_size: int = 1000, chunk_overlap: int = 200, separators: List[str] = None):
-        self.chunk_size = chunk_size
-        self.chunk_overlap = chunk_overlap
-        self.separators = separators or ["\n\n", "\n", ".", " ", ""]
+    """
+    Splits text into overlapping chunks of at most chunk_size, working on offsets only.
+    Each chunk ends at the highest-priority separator found in the second half of its window
+    (paragraph, line, sentence, word, else a hard cut), and the next chunk starts up to
+    chunk_overlap back from there, on a word boundary. One pass, no intermediate strings.
+
+    By default sizes are in characters. With tokenizer (text -> list of (start, end) token
+    offsets), chunk_size and chunk_overlap are counted in tokens instead.
+    """
+    def __init__(self, chunk_size: int = 1000, chunk_overlap: int = 200, separators: List[str] = None,
+                 tokenizer: Optional[Callable[[str], Sequence[Span]]] = None):
+        self.chunk_size = max(1, chunk_size)
+        self.chunk_overlap = min(max(0, chunk_overlap), self.chunk_size // 2)
+        self.separators = [s for s in (separators or ["\n\n", "\n", ".", " ", ""]) if s]
+        self.tokenizer = tokenizer
 
     def split_text(self, text: str) -> List[str]:
         """Split text into chunks aiming for chunk_size."""
-        final_chunks = []
-        good_splits = self._split_text_recursive(text, self.separators)
-        
-        # Merge splits into chunks of correct size
-        current_chunk = ""
-        for split in good_splits:
-            if len(current_chunk) + len(split) < self.chunk_size:
-                current_chunk += split
-            else:
-                if current_chunk:
-                    final_chunks.append(current_chunk)
-                # Apply overlap involves keeping tail of prev chunk - simplified here for brevity
-                # Real implementation would use a deque or sliding window.
-                # Here we just start fresh or use current split if it fits.
-                current_chunk = split
-        
-        if current_chunk:
-            final_chunks.append(current_chunk)
-            
-        return final_chunks
-
-    def _split_text_recursive(self, text: str, separators: List[str]) -> List[str]:
-        """
-        Recursively split text using the first valid separator.
-        """
-        if not separators:
-            return [text] # Base case: no more separators, return as is (might be too long, but can't split further)
-
-        separator = separators[0]
-        new_separators = separators[1:]
-
-        # If separator is empty string, every char is a split
-        if separator == "":
-            return list(text)
-
-        if separator in text:
-            splits = text.split(separator)
-            # Re-attach separator to the end of each split (except the last one if you want) or keep it loose.
-            # To reconstruct sentences, usually you want keeping it. 
-            # Simple approach: split and process.
-            final_splits = []
-            for s in splits:
-                if not s: continue 
-                if len(s) > self.chunk_size: # If this piece is still too big, recurse
-                     final_splits.extend(self._split_text_recursive(s, new_separators))
-                else:
-                    final_splits.append(s + separator) # Add separator back approximation
-            return final_splits
+        return list(self.iter_chunks(text))
+
+    def iter_chunks(self, text: str) -> Iterator[str]:
+        for start, end in self.iter_spans(text):
+            yield text[start:end]
+
+    def iter_spans(self, text: str) -> Iterator[Span]:
+        """Yields (start, end) offsets of each chunk, lazily."""
+        if self.tokenizer is None:
+            limit = lambda start: start + self.chunk_size
+            back = lambda end: end - self.chunk_overlap
         else:
-            return self._split_text_recursive(text, new_separators)
+            tokens = self.tokenizer(text)
+            if not tokens:
+                return
+            starts = [t[0] for t in tokens]
+            ends = [t[1] for t in tokens]
+
+            def limit(start: int) -> int:
+                i = bisect_left(ends, start + 1)
+                j = i + self.chunk_size
+                return ends[j - 1] if j <= len(ends) else len(text)
+
+            def back(end: int) -> int:
+                k = bisect_right(starts, end - 1)  # tokens starting before end
+                return starts[k - self.chunk_overlap] if self.chunk_overlap and k > self.chunk_overlap else end
+
+        n = len(text)
+        start = 0
+        while start < n:
+            hard_end = min(limit(start), n)
+            end = hard_end if hard_end == n else self._break(text, start, hard_end)
+            if _NON_SPACE.search(text, start, end):
+                yield start, end
+            if end >= n:
+                return
+            if self.tokenizer is None and self.chunk_overlap:
+                next_start = self._overlap_start(text, back(end), end)
+            else:
+                next_start = back(end)
+            # Always move forward, even if the overlap reaches back to this chunk's start
+            start = max(next_start, start + 1)
+
+    def _break(self, text: str, start: int, hard_end: int) -> int:
+        """Best split point in the second half of [start, hard_end): just after the strongest separator."""
+        lo = start + (hard_end - start) // 2
+        for sep in self.separators:
+            pos = text.rfind(sep, lo, hard_end)
+            if pos != -1 and pos + len(sep) > start:
+                return min(pos + len(sep), hard_end)
+        return hard_end
+
+    def _overlap_start(self, text: str, lo: int, end: int) -> int:
+        """Earliest word boundary in [lo, end), so the overlap does not start mid-word."""
+        best = end
+        for sep in (" ", "\n"):
+            pos = text.find(sep, lo, best)
+            if pos != -1:
+                best = pos + 1
+        # No boundary: the overlap is part of a single long word, start mid-word
+        return best if best < end else lo
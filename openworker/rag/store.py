@@ -1,184 +1,530 @@
 import os
+import hashlib
+import heapq
+import logging
+import threading
+import time
 import chromadb
+from concurrent.futures import ThreadPoolExecutor
 from sentence_transformers import SentenceTransformer, CrossEncoder
-from rank_bm25 import BM25Okapi
+from abc import ABC, abstractmethod
 from pathlib import Path
-from openworker.utils.readers import read_file_content
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
 from openworker.rag.splitters import RecursiveTextSplitter
+from openworker.rag.pipeline import IndexPipeline
+from openworker.rag.lexical import LexicalIndex
+from openworker.rag.embed_cache import CachedEmbedder
+from openworker.rag.rerank import Candidate, Reranker, RerankConfig, fuse
 from openworker.rag.security import get_guard
-from openworker.config import CHROMA_PATH
+from openworker.config import CHROMA_PATH, SHARD_WORKERS, VECTORS_PATH, VECTOR_BACKEND
+from openworker.state import get_db
 import numpy as np
 
+logger = logging.getLogger(__name__)
+
+EMBED_MODEL = 'all-MiniLM-L6-v2'
+RERANK_MODEL = 'cross-encoder/ms-marco-MiniLM-L-6-v2'
+
+
+class VectorBackend(ABC):
+    """
+    Stores chunk embeddings with their text and metadata, and answers nearest-neighbour queries.
+    Scores are similarities: higher is better.
+    """
+    @abstractmethod
+    def upsert(self, ids: Sequence[str], documents: Sequence[str], embeddings, metadatas: Sequence[dict]):
+        ...
+
+    @abstractmethod
+    def delete(self, ids: Sequence[str], root_path: Optional[str] = None):
+        """root_path, when known, is the root all the ids belong to."""
+
+    @abstractmethod
+    def get(self, ids: Sequence[str], root_paths: Optional[Sequence[Optional[str]]] = None) -> List[Candidate]:
+        """
+        Chunks by ID, in the given order; unknown IDs are left out.
+        root_paths, when known, holds the root of each ID (None where unknown).
+        """
+
+    @abstractmethod
+    def ids_for_root(self, root_path: str) -> List[str]:
+        ...
+
+    @abstractmethod
+    def iter_chunks(self, page_size: int = 1000) -> Iterator[Tuple[List[str], List[str], List[dict]]]:
+        """Pages of (ids, documents, metadatas) over every stored chunk."""
+
+    @abstractmethod
+    def query(self, embedding, n_results: int, roots: Optional[Sequence[str]] = None) -> List[Candidate]:
+        """Best n_results chunks for embedding, restricted to the given root_paths (None = all)."""
+
+    @abstractmethod
+    def count(self) -> int:
+        ...
+
+    @abstractmethod
+    def clear(self):
+        ...
+
+    @abstractmethod
+    def drop(self):
+        """Deletes the backend's storage; the instance cannot be used afterwards."""
+
+    def drop_root(self, root_path: str):
+        self.delete(self.ids_for_root(root_path), root_path)
+
+
+class ChromaBackend(VectorBackend):
+    """float32 vectors in a persistent Chroma collection."""
+    def __init__(self, persist_path: str = None, name: str = "documents", client=None):
+        if client is None:
+            client = chromadb.PersistentClient(path=persist_path or str(CHROMA_PATH))
+        self.name = name
+        self.client = client
+        self.collection = self.client.get_or_create_collection(name=name)
+
+    def upsert(self, ids, documents, embeddings, metadatas):
+        self.collection.upsert(ids=list(ids), documents=list(documents),
+                               embeddings=np.asarray(embeddings, dtype=np.float32).tolist(),
+                               metadatas=list(metadatas))
+
+    def delete(self, ids, root_path=None):
+        self.collection.delete(ids=list(ids))
+
+    def get(self, ids, root_paths=None) -> List[Candidate]:
+        res = self.collection.get(ids=list(ids), include=["documents", "metadatas"])
+        found = {i: Candidate(i, d, m) for i, d, m in zip(res['ids'], res['documents'], res['metadatas'])}
+        return [found[i] for i in ids if i in found]
+
+    def ids_for_root(self, root_path: str) -> List[str]:
+        return self.collection.get(where={"root_path": root_path}, include=[])["ids"]
+
+    def iter_chunks(self, page_size: int = 1000, include_embeddings: bool = False):
+        offset = 0
+        include = ["documents", "metadatas"] + (["embeddings"] if include_embeddings else [])
+        while True:
+            page = self.collection.get(limit=page_size, offset=offset, include=include)
+            if not page['ids']:
+                return
+            if include_embeddings:
+                yield page['ids'], page['documents'], page['embeddings'], page['metadatas']
+            else:
+                yield page['ids'], page['documents'], page['metadatas']
+            offset += len(page['ids'])
+
+    def query(self, embedding, n_results: int, roots: Optional[Sequence[str]] = None) -> List[Candidate]:
+        where_filter = None
+        if roots is not None:
+            roots = list(roots)
+            if not roots:
+                return []
+            # ChromaDB requires at least 2 items for $or
+            if len(roots) == 1:
+                where_filter = {"root_path": roots[0]}
+            else:
+                where_filter = {"$or": [{"root_path": p} for p in roots]}
+        res = self.collection.query(
+            query_embeddings=[np.asarray(embedding, dtype=np.float32).tolist()],
+            n_results=n_results,
+            where=where_filter
+        )
+        ids = res['ids'][0] if res['ids'] else []
+        docs = res['documents'][0] if res['documents'] else []
+        metas = res['metadatas'][0] if res['metadatas'] else []
+        distances = res['distances'][0] if res.get('distances') else [0.0] * len(ids)
+        return [Candidate(i, d, m, -dist) for i, d, m, dist in zip(ids, docs, metas, distances)]
+
+    def count(self) -> int:
+        return self.collection.count()
+
+    def clear(self):
+        self.client.delete_collection(self.name)
+        self.collection = self.client.get_or_create_collection(name=self.name)
+
+    def drop(self):
+        self.client.delete_collection(self.name)
+
+
+def shard_name(root_path: str) -> str:
+    """Name of a root's shard, valid both as a Chroma collection and as a directory name."""
+    return "root-" + hashlib.sha1(root_path.encode("utf-8", "surrogateescape")).hexdigest()[:16]
+
+
+class ShardedBackend(VectorBackend):
+    """
+    One backend per indexed root. Chunks are written to the shard of their root_path, queries
+    go out to the requested shards in parallel and the results are merged by score. Indexing
+    or dropping a root only touches that root's shard.
+    """
+    def __init__(self, open_shard: Callable[[str], VectorBackend], known_roots: Callable[[], Iterable[str]],
+                 max_workers: int = SHARD_WORKERS):
+        self.open_shard = open_shard      # shard name -> backend, created if missing
+        self.known_roots = known_roots    # roots that may have a shard on disk
+        self._shards: Dict[str, VectorBackend] = {}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="openworker-shard")
+
+    def shard(self, root_path: str) -> VectorBackend:
+        with self._lock:
+            shard = self._shards.get(root_path)
+            if shard is None:
+                shard = self._shards[root_path] = self.open_shard(shard_name(root_path))
+            return shard
+
+    def roots(self) -> List[str]:
+        with self._lock:
+            opened = set(self._shards)
+        return sorted(opened.union(self.known_roots()))
+
+    def _run(self, fn, roots: Sequence[str]) -> list:
+        """fn(root) for each root, in parallel, results in the order of roots."""
+        if len(roots) <= 1:
+            return [fn(r) for r in roots]
+        return list(self._pool.map(fn, roots))
+
+    def _map(self, fn, roots: Sequence[str]) -> list:
+        """fn(shard) for each root's shard."""
+        return self._run(lambda r: fn(self.shard(r)), roots)
+
+    def upsert(self, ids, documents, embeddings, metadatas):
+        groups: Dict[str, List[int]] = {}
+        for i, meta in enumerate(metadatas):
+            groups.setdefault(meta.get("root_path", ""), []).append(i)
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        for root, rows in groups.items():
+            self.shard(root).upsert([ids[i] for i in rows], [documents[i] for i in rows],
+                                    embeddings[rows], [metadatas[i] for i in rows])
+
+    def delete(self, ids, root_path=None):
+        ids = list(ids)
+        if ids:
+            self._map(lambda s: s.delete(ids), [root_path] if root_path is not None else self.roots())
+
+    def get(self, ids, root_paths=None) -> List[Candidate]:
+        ids = list(ids)
+        # IDs go to the shard of their root; only those of unknown root are looked up everywhere
+        groups: Dict[str, List[str]] = {}
+        unrouted = []
+        for chunk_id, root in zip(ids, root_paths or [None] * len(ids)):
+            if root is None:
+                unrouted.append(chunk_id)
+            else:
+                groups.setdefault(root, []).append(chunk_id)
+        if unrouted:
+            for root in self.roots():
+                groups.setdefault(root, []).extend(unrouted)
+        found = {}
+        for part in self._run(lambda r: self.shard(r).get(groups[r]), list(groups)):
+            found.update((c.id, c) for c in part)
+        return [found[i] for i in ids if i in found]
+
+    def ids_for_root(self, root_path: str) -> List[str]:
+        return self.shard(root_path).ids_for_root(root_path)
+
+    def iter_chunks(self, page_size: int = 1000, include_embeddings: bool = False):
+        for root in self.roots():
+            shard = self.shard(root)
+            yield from (shard.iter_chunks(page_size, include_embeddings=True) if include_embeddings
+                        else shard.iter_chunks(page_size))
+
+    def query(self, embedding, n_results: int, roots: Optional[Sequence[str]] = None) -> List[Candidate]:
+        roots = self.roots() if roots is None else list(roots)
+        results = self._map(lambda s: s.query(embedding, n_results), roots)
+        return heapq.nlargest(n_results, (c for part in results for c in part), key=lambda c: c.score)
+
+    def count(self) -> int:
+        return sum(self._map(lambda s: s.count(), self.roots()))
+
+    def clear(self):
+        for root in self.roots():
+            self.drop_root(root)
+
+    def drop(self):
+        self.clear()
+        self._pool.shutdown(wait=False)
+
+    def drop_root(self, root_path: str):
+        shard = self.shard(root_path)
+        with self._lock:
+            self._shards.pop(root_path, None)
+        shard.drop()
+
+
+def _collection_names(client) -> List[str]:
+    # Older Chroma versions return Collection objects, newer ones names
+    return [getattr(c, "name", c) for c in client.list_collections()]
+
+
+def _outermost(roots: List[str]) -> List[str]:
+    """The roots that are not nested inside another of the given roots."""
+    kept = []
+    for root in sorted(roots, key=len):
+        if not any(root == k or root.startswith(k.rstrip(os.sep) + os.sep) for k in kept):
+            kept.append(root)
+    return kept
+
+
+def make_vector_backend(kind: str = VECTOR_BACKEND) -> VectorBackend:
+    """
+    "chroma" (default) or "local" (quantized memory-mapped index, see vector_index.py), sharded
+    by root. Vectors stored by earlier versions in a single collection are moved into shards.
+    """
+    roots = get_db().list_indexed_roots
+    if kind == "chroma":
+        client = chromadb.PersistentClient(path=str(CHROMA_PATH))
+        backend = ShardedBackend(lambda name: ChromaBackend(name=name, client=client), roots)
+        if "documents" in _collection_names(client):
+            _backfill_manifest(_migrate(ChromaBackend(name="documents", client=client), backend, drop=True))
+        return backend
+    if kind == "local":
+        from openworker.rag.vector_index import LocalVectorIndex
+        backend = ShardedBackend(lambda name: LocalVectorIndex(VECTORS_PATH / name), roots)
+        if (VECTORS_PATH / "chunks.db").exists():
+            _backfill_manifest(_migrate(LocalVectorIndex(VECTORS_PATH), backend, drop=True))
+        elif backend.count() == 0 and CHROMA_PATH.exists():
+            client = chromadb.PersistentClient(path=str(CHROMA_PATH))
+            for name in _collection_names(client):
+                if name == "documents" or name.startswith("root-"):
+                    _backfill_manifest(_migrate(ChromaBackend(name=name, client=client), backend))
+        return backend
+    raise ValueError(f"Unknown vector backend {kind!r}, expected 'chroma' or 'local'")
+
+
+def _migrate(source: VectorBackend, target: VectorBackend, page_size: int = 1000,
+             drop: bool = False) -> Dict[str, Dict[str, Tuple[int, str]]]:
+    """
+    Copies stored vectors over, so switching backends or layouts does not require re-embedding.
+    Returns {root_path: {source: (chunk_count, file_hash)}} of the copied chunks. The source is
+    only dropped once every chunk has been copied.
+    """
+    files: Dict[str, Dict[str, Tuple[int, str]]] = {}
+    total, copied = source.count(), 0
+    if total:
+        logger.info(f"Copying {total} vectors from {type(source).__name__} to {type(target).__name__}")
+        for ids, docs, embeddings, metas in source.iter_chunks(page_size, include_embeddings=True):
+            target.upsert(ids, docs, embeddings, metas)
+            copied += len(ids)
+            for meta in metas:
+                if not meta.get("root_path") or not meta.get("source"):
+                    continue
+                by_source = files.setdefault(meta["root_path"], {})
+                count, file_hash = by_source.get(meta["source"], (0, ""))
+                by_source[meta["source"]] = (max(count, int(meta.get("chunk", 0)) + 1),
+                                             file_hash or meta.get("file_hash") or "")
+    if drop:
+        if copied < total:
+            logger.warning(f"Copied {copied} of {total} vectors, keeping the old {type(source).__name__}")
+        else:
+            source.drop()
+    return files
+
+
+def _backfill_manifest(files: Dict[str, Dict[str, Tuple[int, str]]]):
+    """
+    Adds manifest entries for migrated roots that were indexed before the manifest existed, so
+    they are searched right away. Size and mtime are unknown: the next index run of such a root
+    re-reads its files, but only re-embeds the ones whose content hash changed.
+    """
+    db = get_db()
+    known = set(db.list_indexed_roots())
+    missing = {root: by_source for root, by_source in files.items() if root not in known}
+    if not missing:
+        return
+    with db.transaction():
+        for root, by_source in missing.items():
+            db.upsert_manifest(root, [
+                {"path": src, "size": -1, "mtime": -1, "content_hash": file_hash, "chunk_count": count}
+                for src, (count, file_hash) in by_source.items()])
+        db.bump_generation("index")
+    logger.info(f"Added {len(missing)} migrated root(s) to the index manifest: {sorted(missing)}")
+
+
 class RagStore:
-    def __init__(self, persist_path: str = None):
-        if persist_path is None:
-            persist_path = str(CHROMA_PATH)
-        self.client = chromadb.PersistentClient(path=persist_path)
-        self.collection = self.client.get_or_create_collection(name="documents")
-        
-        # Models
-        self.embedder = SentenceTransformer('all-MiniLM-L6-v2') 
-        self.reranker = CrossEncoder('cross-encoder/ms-marco-MiniLM-L-6-v2')
+    def __init__(self, vectors: VectorBackend = None, rerank_config: RerankConfig = None):
+        self.vectors = vectors or make_vector_backend()
+
+        # Models, loaded on first use (see embedder/reranker below)
+        self.rerank_config = rerank_config
+        self._embedder = None
+        self._reranker = None
+        self._model_lock = threading.Lock()
+        self.load_timings: Dict[str, float] = {}
+        self.last_rerank_report = None
         self.splitter = RecursiveTextSplitter(chunk_size=1000, chunk_overlap=100)
-        
-        # In-memory BM25
-        self.bm25 = None
-        self.bm25_corpus = []  # List of document texts
-        self.bm25_ids = []     # List of corresponding IDs
-        
-        # Try to load existing data for BM25
-        self._load_bm25()
-
-    def _load_bm25(self):
-        """Reloads corpus from ChromaDB to build BM25 index."""
-        # Warning: This scales poorly for millions of docs. Fine for thousands.
-        existing = self.collection.get()
-        if existing['documents']:
-            self.bm25_corpus = existing['documents']
-            self.bm25_ids = existing['ids']
-            tokenized_corpus = [doc.split(" ") for doc in self.bm25_corpus]
-            self.bm25 = BM25Okapi(tokenized_corpus)
-
-    def index_directory(self, directory: str):
-        import hashlib
-        from datetime import datetime
-        
+        self.db = get_db()
+        # Indexed roots, cached per "index" generation, and the "folders" generation last synced
+        self._roots_cache: Optional[Tuple[int, List[str]]] = None
+        self._folders_generation = None
+
+        # Persistent BM25, updated per chunk by upsert_chunks/delete_chunks
+        self.lexical = LexicalIndex()
+        if self.lexical.count() == 0 and self.vectors.count() > 0:
+            self._rebuild_lexical()
+
+    def _load(self, name: str, factory):
+        start = time.perf_counter()
+        model = factory()
+        self.load_timings[name] = time.perf_counter() - start
+        logger.info(f"Loaded {name} in {self.load_timings[name]:.2f}s")
+        return model
+
+    @property
+    def embedder(self) -> CachedEmbedder:
+        if self._embedder is None:
+            with self._model_lock:
+                if self._embedder is None:
+                    self._embedder = self._load("embedder", lambda: CachedEmbedder(
+                        SentenceTransformer(EMBED_MODEL), EMBED_MODEL))
+        return self._embedder
+
+    @property
+    def reranker(self) -> Reranker:
+        if self._reranker is None:
+            with self._model_lock:
+                if self._reranker is None:
+                    self._reranker = self._load("reranker", lambda: Reranker(
+                        CrossEncoder(RERANK_MODEL), self.rerank_config))
+        return self._reranker
+
+    def warm_up(self, components=("embedder", "reranker")):
+        """Loads the given models ahead of the first query."""
+        for name in components:
+            getattr(self, name)
+
+    def _rebuild_lexical(self, page_size: int = 1000):
+        """One-off migration for collections indexed before the lexical index existed."""
+        for ids, documents, metadatas in self.vectors.iter_chunks(page_size):
+            self.lexical.add(ids, documents, metadatas)
+
+    def upsert_chunks(self, ids, documents, embeddings, metadatas):
+        self.vectors.upsert(ids, documents, embeddings, metadatas)
+        self.lexical.add(ids, documents, metadatas)
+
+    def delete_chunks(self, ids, root_path: str = None):
+        self.vectors.delete(ids, root_path)
+        self.lexical.delete(ids)
+
+    def drop_root(self, root_path: str):
+        """Removes everything indexed under root_path."""
+        self.vectors.drop_root(root_path)
+        self.lexical.delete_root(root_path)
+        with self.db.transaction():
+            self.db.delete_manifest(root_path)
+            self.db.bump_generation("index")
+        logger.info(f"Dropped the index of {root_path}")
+
+    def sync_roots(self):
+        """
+        Drops indexed roots that are no longer inside a tracked folder, e.g. after \\rm. The CLI
+        and the store live in different processes, so this runs before each search or index run.
+        """
+        generations = self.db.get_generations()
+        if generations.get("folders", 0) == self._folders_generation:
+            return
+        self._folders_generation = generations.get("folders", 0)
+        folders = [os.path.realpath(f) for f in self.db.list_folders()]
+        for root in self.db.list_indexed_roots():
+            real = os.path.realpath(root)
+            if not any(real == f or real.startswith(f.rstrip(os.sep) + os.sep) for f in folders):
+                self.drop_root(root)
+
+    def _indexed_roots(self) -> List[str]:
+        generation = self.db.get_generations().get("index", 0)
+        if self._roots_cache is None or self._roots_cache[0] != generation:
+            self._roots_cache = (generation, self.db.list_indexed_roots())
+        return self._roots_cache[1]
+
+    def index_directory(self, directory: str, progress_callback=None):
+        """
+        Incrementally indexes a directory through the streaming pipeline.
+        Files whose size and mtime match the manifest are skipped without parsing,
+        changed files get their chunks replaced and deleted files are dropped.
+        """
         path = Path(directory)
         if not path.exists():
             return "Directory not found."
+        self.sync_roots()
 
-        ids_batch, docs_batch, metas_batch = [], [], []
-        count = 0
+        stats = self._run_pipeline(IndexPipeline(self, str(path), progress_callback=progress_callback))
         
-        for p in path.rglob("*"):
-            if p.is_file() and not p.name.startswith("."):
-                try:
-                    content = read_file_content(str(p))
-                    if not content or content.startswith("Error"):
-                        continue
-                        
-                    # Compute Hash
-                    file_hash = hashlib.md5(content.encode('utf-8')).hexdigest()
-                    last_modified = datetime.fromtimestamp(p.stat().st_mtime).isoformat()
-                    
-                    # Compute relative path for cleaner metadata
-                    rel_path = str(p.relative_to(path.parent))
-                    
-                    # Splitting
-                    chunks = self.splitter.split_text(content)
-                    
-                    for i, chunk in enumerate(chunks):
-                        # Unique ID: Hash + Index (ensures if file content changes, ID changes)
-                        # Actually, keeping ID deterministic based on path + index is better for updates,
-                        # BUT we want to detect content changes. 
-                        # Let's use path+index as ID, and simple overwrite.
-                        doc_id = f"{rel_path}_{i}"
-                        
-                        ids_batch.append(doc_id)
-                        docs_batch.append(chunk)
-                        metas_batch.append({
-                            "source": str(p),
-                            "chunk": i,
-                            "root_path": str(path),
-                            "file_hash": file_hash,
-                            "updated_at": last_modified
-                        })
-                    
-                    count += 1
-                except Exception as e:
-                    print(f"Skipping {p}: {e}")
-
-        if ids_batch:
-            # Update Vector DB
-            embeddings = self.embedder.encode(docs_batch, show_progress_bar=False).tolist()
-            # Upsert (overwrite if ID exists)
-            self.collection.upsert(ids=ids_batch, documents=docs_batch, embeddings=embeddings, metadatas=metas_batch)
-            
-            # Update BM25
-            self._load_bm25()
-        
-        return f"Indexed {count} files. Total chunks: {len(self.bm25_ids)}"
+        return (f"Indexed {stats.files_indexed} files ({stats.files_skipped} unchanged, "
+                f"{stats.files_removed} removed) in {stats.elapsed:.1f}s. Total chunks: {self.lexical.count()}. "
+                f"Embedding cache: {stats.embed_cache}")
+
+    def index_files(self, directory: str, paths: List[str]):
+        """Re-indexes only the given files under directory; paths that no longer exist are dropped."""
+        return self._run_pipeline(IndexPipeline(self, directory, paths=paths))
 
-    def query(self, query_text: str, n_results: int = 10):
-        # Security: Get allowed paths
-        allowed_paths = get_guard()._get_allowed_folders()
-        if not allowed_paths:
+    def _run_pipeline(self, pipeline: IndexPipeline):
+        try:
+            stats = pipeline.run()
+        except Exception:
+            # A failed run may still have committed batches
+            self.db.bump_generation("index")
+            raise
+        if stats.chunks_written or stats.chunks_deleted:
+            # Invalidates cached searches in every process
+            self.db.bump_generation("index")
+        return stats
+
+    def query(self, query_text: str, n_results: int = 10, top_k: int = None):
+        # Security: only search the indexed roots inside authorized folders
+        self.sync_roots()
+        guard = get_guard()
+        # A folder indexed inside an indexed parent holds the same chunks under other ids
+        roots = _outermost([r for r in self._indexed_roots() if guard.validate_path(r)])
+        if not roots:
              return {"documents": [], "metadatas": []}
              
-        # Create filter for authorized roots
-        # ChromaDB requires at least 2 items for $or
-        if len(allowed_paths) == 1:
-            where_filter = {"root_path": allowed_paths[0]}
-        else:
-            where_filter = {"$or": [{"root_path": p} for p in allowed_paths]}
-
-        # 1. Vector Search
-        query_embedding = self.embedder.encode([query_text], show_progress_bar=False).tolist()
-        vector_res = self.collection.query(
-            query_embeddings=query_embedding, 
-            n_results=n_results,
-            where=where_filter
-        )
-        
-        vec_ids = vector_res['ids'][0] if vector_res['ids'] else []
-        vec_docs = vector_res['documents'][0] if vector_res['documents'] else []
-        vec_metas = vector_res['metadatas'][0] if vector_res['metadatas'] else []
+        # 1. Vector Search, fanned out to the shards of those roots
+        query_embedding = self.embedder.encode([query_text], use_cache=False)[0]
+        vec_ranked = self.vectors.query(query_embedding, n_results, roots=roots)
         
-        # 2. BM25 Search
-        bm25_docs = []
-        if self.bm25:
-            tokenized_query = query_text.split(" ")
-            # Get top N BM25
-            bm25_top = self.bm25.get_top_n(tokenized_query, self.bm25_corpus, n=n_results)
-            # We need the metadata/IDs for these. Inefficient lookup map here:
-            for doc in bm25_top:
-                try:
-                    idx = self.bm25_corpus.index(doc)
-                    if self.bm25_ids[idx] not in vec_ids:
-                        vec_ids.append(self.bm25_ids[idx])
-                        vec_docs.append(self.bm25_corpus[idx])
-                        # Fetch metadata from collection is slow, so maybe skipping or implementing a cache?
-                        # For now, let's just use what we have in mem or query by ID
-                        meta = self.collection.get(ids=[self.bm25_ids[idx]])['metadatas'][0]
-                        vec_metas.append(meta)
-                except:
-                    continue
+        # 2. BM25 Search, restricted to the same roots before scoring
+        bm25_ids = [chunk_id for chunk_id, _ in self.lexical.search(query_text, k=n_results, roots=roots)]
+        known = {c.id: c for c in vec_ranked}
+        missing = [i for i in bm25_ids if i not in known]
+        if missing:
+            # One batched lookup for all lexical hits, each in the shard of its root
+            for c in self.vectors.get(missing, self.lexical.root_paths(missing)):
+                known[c.id] = Candidate(c.id, c.document, c.metadata)
+        bm25_ranked = [known[i] for i in bm25_ids if i in known]
 
-        # 3. Reranking
-        if not vec_docs:
+        # 3. Fusion + Reranking
+        candidates = fuse([vec_ranked, bm25_ranked])
+        if not candidates:
             return {"documents": [], "metadatas": []}
 
-        pairs = [[query_text, doc] for doc in vec_docs]
-        scores = self.reranker.predict(pairs)
-        
-        # Sort by score
-        scored_results = sorted(zip(vec_docs, vec_metas, scores), key=lambda x: x[2], reverse=True)
-        
-        # Return top 5
-        top_k = scored_results[:5]
+        top, report = self.reranker.rerank(query_text, candidates, top_k=top_k, rankings=[vec_ranked, bm25_ranked])
+        self.last_rerank_report = report
+        logger.info(str(report))
         
         # Format to match previous structure
         return {
-            "documents": [[x[0] for x in top_k]],
-            "metadatas": [[x[1] for x in top_k]]
+            "documents": [[c.document for c in top]],
+            "metadatas": [[c.metadata for c in top]]
         }
 
     def clear_index(self):
         """Clears the entire knowledge base."""
         try:
-            self.client.delete_collection("documents")
-            self.collection = self.client.get_or_create_collection(name="documents")
-            self.bm25 = None
-            self.bm25_corpus = []
-            self.bm25_ids = []
+            self.vectors.clear()
+            self.lexical.clear()
+            with self.db.transaction():
+                self.db.clear_manifest()
+                self.db.bump_generation("index")
             return "Knowledge base cleared successfully."
         except Exception as e:
             return f"Error clearing knowledge base: {str(e)}"
 
 # Singleton
 _store = None
+_store_lock = threading.Lock()
 def get_store():
     global _store
     if _store is None:
-        _store = RagStore()
+        # The server may be warming up the store in the background
+        with _store_lock:
+            if _store is None:
+                _store = RagStore()
     return _store
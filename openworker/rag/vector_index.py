@@ -0,0 +1,393 @@
+"""
+Compact on-disk vector index.
+Embeddings are quantized to int8 (one float32 scale per vector) or float16 and kept in
+memory-mapped files, so the page cache holds 4x (2x) fewer bytes than float32 vectors.
+Vectors are normalized and scored by cosine similarity. Search is a brute-force scan over
+the authorized rows or, once the index is large, over the nearest IVF lists only. The best
+candidates can be rescored against float32 copies, which are read from disk for those few
+rows alone. Chunk text and metadata live in SQLite.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from openworker.config import VECTORS_PATH, VECTOR_DTYPE, VECTOR_RESCORE
+from openworker.rag.rerank import Candidate
+from openworker.rag.store import VectorBackend
+
+logger = logging.getLogger(__name__)
+
+SCAN_BLOCK = 32768       # rows dequantized at a time during a scan
+IVF_MIN_ROWS = 50_000    # below this a full scan is fast enough
+RESCORE_FACTOR = 4       # candidates rescored in float32 per requested result
+_DTYPES = {"int8": np.int8, "float16": np.float16}
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    """Unit length rows: dot products are cosine similarities."""
+    return vectors / (np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-12)
+
+
+class LocalVectorIndex(VectorBackend):
+    def __init__(self, path: str = None, dtype: str = VECTOR_DTYPE, rescore: bool = bool(VECTOR_RESCORE),
+                 nprobe: int = 16, ivf_min_rows: int = IVF_MIN_ROWS):
+        if dtype not in _DTYPES:
+            raise ValueError(f"Unsupported vector dtype {dtype!r}, expected one of {sorted(_DTYPES)}")
+        self.dir = Path(path) if path is not None else VECTORS_PATH
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.nprobe = nprobe
+        self.ivf_min_rows = ivf_min_rows
+        self._lock = threading.RLock()
+        # IVF training runs outside the lock; rows written meanwhile are reassigned at the swap
+        self._training = False
+        self._dirty: set = set()
+        self._epoch = 0  # bumped by clear/drop, so a training pass started before is discarded
+
+        self._meta_path = self.dir / "meta.json"
+        meta = json.loads(self._meta_path.read_text()) if self._meta_path.exists() else {}
+        # The on-disk layout wins over the arguments, switching needs clear()
+        self.dtype = meta.get("dtype", dtype)
+        self.rescore = meta.get("rescore", rescore)
+        self.dim = meta.get("dim")
+        self.capacity = meta.get("capacity", 0)
+        self.rows = meta.get("rows", 0)          # high-water mark, rows below it are alive or free
+        self.ivf_trained_rows = meta.get("ivf_trained_rows", 0)
+
+        self.conn = sqlite3.connect(str(self.dir / "chunks.db"), check_same_thread=False)
+        with self.conn:
+            self.conn.execute('PRAGMA journal_mode=WAL')
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS chunks (
+                    id TEXT PRIMARY KEY,
+                    row INTEGER UNIQUE,
+                    root_path TEXT,
+                    document TEXT,
+                    metadata TEXT
+                )
+            ''')
+            self.conn.execute('CREATE INDEX IF NOT EXISTS idx_chunks_root ON chunks (root_path)')
+
+        self._vectors = self._scales = self._full = self._lists = None
+        self.centroids: Optional[np.ndarray] = None
+        self.alive = np.zeros(self.capacity, dtype=bool)
+        self.root_ids = np.full(self.capacity, -1, dtype=np.int32)
+        self._roots: Dict[str, int] = {}
+        if self.dim is not None:
+            self._map_files()
+            if (self.dir / "centroids.npy").exists():
+                self.centroids = np.load(self.dir / "centroids.npy")
+            for row, root in self.conn.execute('SELECT row, root_path FROM chunks'):
+                self.alive[row] = True
+                self.root_ids[row] = self._root_id(root)
+
+    # Storage
+
+    def _map_files(self):
+        def mapped(name: str, dtype, shape):
+            path = self.dir / name
+            size = int(np.prod(shape)) * np.dtype(dtype).itemsize
+            with open(path, "ab") as f:
+                if f.tell() < size:
+                    f.truncate(size)
+            return np.memmap(path, dtype=dtype, mode="r+", shape=shape)
+
+        self._vectors = mapped("vectors.bin", _DTYPES[self.dtype], (self.capacity, self.dim))
+        self._scales = mapped("scales.bin", np.float32, (self.capacity,))
+        self._lists = mapped("lists.bin", np.int32, (self.capacity,))
+        self._full = mapped("full.bin", np.float32, (self.capacity, self.dim)) if self.rescore else None
+
+    def _save_meta(self):
+        meta = {"dtype": self.dtype, "rescore": self.rescore, "dim": self.dim, "capacity": self.capacity,
+                "rows": self.rows, "ivf_trained_rows": self.ivf_trained_rows}
+        tmp = self._meta_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(meta))
+        os.replace(tmp, self._meta_path)
+
+    def _grow(self, needed: int):
+        if needed <= self.capacity:
+            return
+        self._flush()
+        self.capacity = max(needed, self.capacity * 2, 1024)
+        self._vectors = self._scales = self._full = self._lists = None
+        self._map_files()
+        self.alive = np.concatenate([self.alive, np.zeros(self.capacity - len(self.alive), dtype=bool)])
+        self.root_ids = np.concatenate([self.root_ids, np.full(self.capacity - len(self.root_ids), -1, np.int32)])
+        self._save_meta()
+
+    def _flush(self):
+        for arr in (self._vectors, self._scales, self._full, self._lists):
+            if arr is not None:
+                arr.flush()
+
+    def _root_id(self, root: str) -> int:
+        if root not in self._roots:
+            self._roots[root] = len(self._roots)
+        return self._roots[root]
+
+    def _quantize(self, vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        if self.dtype == "float16":
+            return vectors.astype(np.float16), np.ones(len(vectors), dtype=np.float32)
+        # Symmetric per-vector int8: x ~ scale * q, q in [-127, 127]
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        return np.round(vectors / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+
+    def _dequantize(self, rows) -> np.ndarray:
+        return self._vectors[rows].astype(np.float32) * self._scales[rows][:, None]
+
+    # VectorBackend
+
+    def upsert(self, ids, documents, embeddings, metadatas):
+        if not ids:
+            return
+        vectors = _normalize(np.asarray(embeddings, dtype=np.float32))
+        with self._lock:
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+            existing = self._rows_for(ids)
+            free = iter(np.flatnonzero(~self.alive[:self.rows]).tolist())
+            rows = []
+            for chunk_id in ids:
+                row = existing.get(chunk_id)
+                if row is None:
+                    row = next(free, None)
+                    if row is None:
+                        row = self.rows
+                        self.rows += 1
+                rows.append(row)
+            self._grow(self.rows)
+
+            rows_arr = np.asarray(rows)
+            quantized, scales = self._quantize(vectors)
+            self._vectors[rows_arr] = quantized
+            self._scales[rows_arr] = scales
+            if self._full is not None:
+                self._full[rows_arr] = vectors
+            self._lists[rows_arr] = self._assign(vectors) if self.centroids is not None else -1
+            self.alive[rows_arr] = True
+            self.root_ids[rows_arr] = [self._root_id(m.get("root_path", "")) for m in metadatas]
+            self._flush()
+            with self.conn:
+                self.conn.executemany(
+                    'INSERT OR REPLACE INTO chunks (id, row, root_path, document, metadata) VALUES (?, ?, ?, ?, ?)',
+                    [(i, r, m.get("root_path", ""), d, json.dumps(m))
+                     for i, r, d, m in zip(ids, rows, documents, metadatas)])
+            self._save_meta()
+
+            alive = int(self.alive.sum())
+            train = not self._training and alive >= self.ivf_min_rows and alive >= 2 * self.ivf_trained_rows
+            if train:
+                self._training = True
+            elif self._training:
+                self._dirty.update(rows)
+        if train:
+            self._train_ivf()
+
+    def _rows_for(self, ids: Sequence[str]) -> Dict[str, int]:
+        found = {}
+        for i in range(0, len(ids), 500):
+            part = list(ids[i:i + 500])
+            q = f"SELECT id, row FROM chunks WHERE id IN ({','.join('?' * len(part))})"
+            found.update(self.conn.execute(q, part))
+        return found
+
+    def delete(self, ids, root_path=None):
+        with self._lock:
+            rows = list(self._rows_for(ids).values())
+            if not rows:
+                return
+            self.alive[rows] = False
+            self.root_ids[rows] = -1
+            with self.conn:
+                self.conn.executemany('DELETE FROM chunks WHERE id = ?', [(i,) for i in ids])
+
+    def get(self, ids, root_paths=None) -> List[Candidate]:
+        found = {}
+        with self._lock:
+            for i in range(0, len(ids), 500):
+                part = list(ids[i:i + 500])
+                q = f"SELECT id, document, metadata FROM chunks WHERE id IN ({','.join('?' * len(part))})"
+                for chunk_id, doc, meta in self.conn.execute(q, part):
+                    found[chunk_id] = Candidate(chunk_id, doc, json.loads(meta))
+        return [found[i] for i in ids if i in found]
+
+    def ids_for_root(self, root_path: str) -> List[str]:
+        with self._lock:
+            return [r[0] for r in self.conn.execute('SELECT id FROM chunks WHERE root_path = ?', (root_path,))]
+
+    def iter_chunks(self, page_size: int = 1000, include_embeddings: bool = False):
+        last = -1
+        while True:
+            with self._lock:
+                page = self.conn.execute('SELECT row, id, document, metadata FROM chunks WHERE row > ? '
+                                         'ORDER BY row LIMIT ?', (last, page_size)).fetchall()
+                if include_embeddings and page:
+                    rows = np.asarray([p[0] for p in page])
+                    embeddings = self._full[rows] if self._full is not None else self._dequantize(rows)
+            if not page:
+                return
+            last = page[-1][0]
+            ids, documents, metadatas = [p[1] for p in page], [p[2] for p in page], [json.loads(p[3]) for p in page]
+            if include_embeddings:
+                yield ids, documents, np.array(embeddings, dtype=np.float32), metadatas
+            else:
+                yield ids, documents, metadatas
+
+    def count(self) -> int:
+        with self._lock:
+            return int(self.alive.sum())
+
+    def clear(self):
+        with self._lock:
+            self._epoch += 1
+            with self.conn:
+                self.conn.execute('DELETE FROM chunks')
+            self._vectors = self._scales = self._full = self._lists = None
+            for name in ("vectors.bin", "scales.bin", "full.bin", "lists.bin", "centroids.npy", "meta.json"):
+                (self.dir / name).unlink(missing_ok=True)
+            self.dim = None
+            self.capacity = self.rows = self.ivf_trained_rows = 0
+            self.centroids = None
+            self.alive = np.zeros(0, dtype=bool)
+            self.root_ids = np.zeros(0, dtype=np.int32)
+            self._roots = {}
+
+    def drop(self):
+        with self._lock:
+            self._epoch += 1
+            self.conn.close()
+            self._vectors = self._scales = self._full = self._lists = None
+            for path in self.dir.iterdir():
+                if path.is_file() and (path.name.startswith("chunks.db") or path.suffix in (".bin", ".npy", ".json", ".tmp")):
+                    path.unlink(missing_ok=True)
+            try:
+                self.dir.rmdir()
+            except OSError:
+                pass  # not empty, e.g. the legacy index next to the shards
+
+    def query(self, embedding, n_results: int, roots: Optional[Sequence[str]] = None) -> List[Candidate]:
+        q = _normalize(np.asarray(embedding, dtype=np.float32).reshape(1, -1))[0]
+        with self._lock:
+            if self.dim is None or n_results <= 0:
+                return []
+            mask = self.alive[:self.rows].copy()
+            if roots is not None:
+                wanted = [self._roots[r] for r in roots if r in self._roots]
+                mask &= np.isin(self.root_ids[:self.rows], wanted)
+            if self.centroids is not None:
+                probe = np.argsort(-(self.centroids @ q))[:self.nprobe]
+                # Rows added since training may not be assigned yet (-1), always scan them
+                lists = self._lists[:self.rows]
+                mask &= np.isin(lists, probe) | (lists < 0)
+
+            k = n_results * RESCORE_FACTOR if self._full is not None else n_results
+            rows, scores = self._scan(q, mask, k)
+            if self._full is not None and len(rows):
+                order = np.sort(rows)
+                exact = self._full[order] @ q
+                rows, scores = order, exact
+                best = np.argsort(-scores)[:n_results]
+                rows, scores = rows[best], scores[best]
+            rows, scores = rows[:n_results], scores[:n_results]
+
+            by_row = {}
+            row_list = [int(r) for r in rows]
+            for i in range(0, len(row_list), 500):
+                part = row_list[i:i + 500]
+                q_sql = f"SELECT row, id, document, metadata FROM chunks WHERE row IN ({','.join('?' * len(part))})"
+                for row, chunk_id, doc, meta in self.conn.execute(q_sql, part):
+                    by_row[row] = (chunk_id, doc, meta)
+        return [Candidate(by_row[r][0], by_row[r][1], json.loads(by_row[r][2]), float(s))
+                for r, s in zip(row_list, scores) if r in by_row]
+
+    def _scan(self, q: np.ndarray, mask: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-k rows by approximate dot product among the masked ones."""
+        selected = np.flatnonzero(mask)
+        if not len(selected):
+            return selected, np.zeros(0, dtype=np.float32)
+        best_rows, best_scores = [], []
+        if len(selected) * 8 < len(mask):
+            # Sparse selection (few roots or IVF lists): gather just those rows
+            for i in range(0, len(selected), SCAN_BLOCK):
+                part = selected[i:i + SCAN_BLOCK]
+                best_rows.append(part)
+                best_scores.append(self._dequantize(part) @ q)
+        else:
+            for start in range(0, len(mask), SCAN_BLOCK):
+                block_mask = mask[start:start + SCAN_BLOCK]
+                if not block_mask.any():
+                    continue
+                end = start + len(block_mask)
+                scores = (self._vectors[start:end].astype(np.float32) @ q) * self._scales[start:end]
+                part = np.flatnonzero(block_mask)
+                best_rows.append(part + start)
+                best_scores.append(scores[part])
+        rows = np.concatenate(best_rows)
+        scores = np.concatenate(best_scores)
+        if len(rows) > k:
+            top = np.argpartition(-scores, k)[:k]
+            rows, scores = rows[top], scores[top]
+        order = np.argsort(-scores)
+        return rows[order], scores[order]
+
+    # IVF
+
+    def _assign(self, vectors: np.ndarray) -> np.ndarray:
+        return np.argmax(vectors @ self.centroids.T, axis=1).astype(np.int32)
+
+    def _train_ivf(self, iterations: int = 10, seed: int = 0):
+        """
+        Spherical k-means over a sample of the live vectors, then assigns every row to a list.
+        Only the sampling and the final swap hold the lock, so queries are not blocked meanwhile.
+        """
+        try:
+            with self._lock:
+                epoch, rows = self._epoch, self.rows
+                live = np.flatnonzero(self.alive[:rows])
+                nlist = int(min(4096, max(16, np.sqrt(len(live)))))
+                rng = np.random.default_rng(seed)
+                sample = np.sort(rng.choice(live, size=min(len(live), nlist * 64), replace=False))
+                data = _normalize(self._dequantize(sample))
+                # Growing remaps the files, but these maps stay valid for the first `rows` rows
+                vectors, scales = self._vectors, self._scales
+
+            centroids = data[rng.choice(len(data), size=nlist, replace=False)]
+            for _ in range(iterations):
+                labels = np.argmax(data @ centroids.T, axis=1)
+                sums = np.zeros_like(centroids)
+                np.add.at(sums, labels, data)
+                counts = np.bincount(labels, minlength=nlist)
+                empty = counts == 0
+                sums[empty] = data[rng.choice(len(data), size=int(empty.sum()))]
+                centroids = sums / (np.linalg.norm(sums, axis=1, keepdims=True) + 1e-12)
+            centroids = centroids.astype(np.float32)
+            lists = np.empty(rows, dtype=np.int32)
+            for start in range(0, rows, SCAN_BLOCK):
+                end = min(rows, start + SCAN_BLOCK)
+                block = vectors[start:end].astype(np.float32) * scales[start:end][:, None]
+                lists[start:end] = np.argmax(block @ centroids.T, axis=1)
+
+            with self._lock:
+                if epoch != self._epoch:
+                    return  # cleared or dropped meanwhile
+                self.centroids = centroids
+                self._lists[:rows] = lists
+                # Rows written during training were assigned to the old lists (or none)
+                dirty = np.asarray(sorted(r for r in self._dirty if r < self.rows), dtype=np.int64)
+                if len(dirty):
+                    self._lists[dirty] = self._assign(self._dequantize(dirty))
+                self._lists.flush()
+                np.save(self.dir / "centroids.npy", self.centroids)
+                self.ivf_trained_rows = len(live)
+                self._save_meta()
+            logger.info(f"Trained IVF index: {nlist} lists over {len(live)} vectors")
+        finally:
+            with self._lock:
+                self._training = False
+                self._dirty = set()
@@ -0,0 +1,337 @@
+"""
+Keeps the knowledge base in sync with the tracked folders.
+Only roots that have been indexed (and are inside a tracked folder) are watched: adding a
+folder does not index it, index_folder does. Change events come from inotify on Linux and from
+periodic snapshots elsewhere (or when inotify is unavailable). Events are debounced and
+coalesced per root, then only the affected files are fed to incremental re-indexing, at a
+capped rate in files and bytes per second so interactive queries keep the CPU and disk.
+"""
+import ctypes
+import ctypes.util
+import errno
+import logging
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from openworker.state import StateDB, get_db
+
+logger = logging.getLogger(__name__)
+
+# inotify(7) event masks
+IN_CLOSE_WRITE = 0x8
+IN_MOVED_FROM = 0x40
+IN_MOVED_TO = 0x80
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_DELETE_SELF = 0x400
+IN_MOVE_SELF = 0x800
+IN_Q_OVERFLOW = 0x4000
+IN_IGNORED = 0x8000
+IN_ISDIR = 0x40000000
+_WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF
+_EVENT = struct.Struct("iIII")
+
+# A callback receiving (root, path); path None means "rescan the whole root"
+ChangeSink = Callable[[str, Optional[str]], None]
+
+
+def _hidden(name: str) -> bool:
+    return name.startswith(".")
+
+
+class PollingBackend:
+    """Portable fallback: diffs (size, mtime) snapshots of each root every `interval` seconds."""
+    def __init__(self, sink: ChangeSink, interval: float = 10.0):
+        self.sink = sink
+        self.interval = interval
+        self._snapshots: Dict[str, Dict[str, Tuple[int, float]]] = {}
+        self._last_poll = 0.0
+
+    @staticmethod
+    def _snapshot(root: str) -> Dict[str, Tuple[int, float]]:
+        snap = {}
+        for dirpath, _dirs, files in os.walk(root):
+            for name in files:
+                if _hidden(name):
+                    continue
+                path = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                snap[path] = (st.st_size, st.st_mtime)
+        return snap
+
+    def set_roots(self, roots: List[str]):
+        for root in list(self._snapshots):
+            if root not in roots:
+                del self._snapshots[root]
+        for root in roots:
+            if root not in self._snapshots:
+                self._snapshots[root] = self._snapshot(root)
+
+    def poll(self, timeout: float):
+        wait = self._last_poll + self.interval - time.monotonic()
+        if wait > 0:
+            time.sleep(min(wait, timeout))
+            return
+        self._last_poll = time.monotonic()
+        for root, old in list(self._snapshots.items()):
+            new = self._snapshot(root)
+            for path in old.keys() | new.keys():
+                if old.get(path) != new.get(path):
+                    self.sink(root, path)
+            self._snapshots[root] = new
+
+    def close(self):
+        self._snapshots.clear()
+
+
+class InotifyBackend:
+    """Linux inotify through libc, one watch per directory."""
+    def __init__(self, sink: ChangeSink):
+        self.sink = sink
+        libc_name = ctypes.util.find_library("c") or "libc.so.6"
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        self._libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self.fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._dirs: Dict[int, Tuple[str, str]] = {}  # wd -> (root, directory)
+        self._roots: Set[str] = set()
+
+    def _watch_tree(self, root: str, top: str, emit: bool = False):
+        for dirpath, dirs, files in os.walk(top):
+            dirs[:] = [d for d in dirs if not _hidden(d)]
+            wd = self._libc.inotify_add_watch(self.fd, os.fsencode(dirpath), _WATCH_MASK)
+            if wd < 0:
+                err = ctypes.get_errno()
+                if err == errno.ENOSPC:
+                    raise OSError(err, "inotify watch limit reached (fs.inotify.max_user_watches)")
+                continue
+            self._dirs[wd] = (root, dirpath)
+            if emit:
+                # Directory moved or created: its files never produced events of their own
+                for name in files:
+                    if not _hidden(name):
+                        self.sink(root, os.path.join(dirpath, name))
+
+    def set_roots(self, roots: List[str]):
+        for wd, (root, _) in list(self._dirs.items()):
+            if root not in roots:
+                self._libc.inotify_rm_watch(self.fd, wd)
+                del self._dirs[wd]
+        for root in roots:
+            if root not in self._roots:
+                self._watch_tree(root, root)
+        self._roots = set(roots)
+
+    def poll(self, timeout: float):
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return
+        offset = 0
+        while offset < len(data):
+            wd, mask, _cookie, length = _EVENT.unpack_from(data, offset)
+            name = data[offset + _EVENT.size: offset + _EVENT.size + length].rstrip(b"\0")
+            offset += _EVENT.size + length
+            self._handle(wd, mask, os.fsdecode(name))
+
+    def _handle(self, wd: int, mask: int, name: str):
+        if mask & IN_Q_OVERFLOW:
+            # Events were dropped, fall back to a manifest-driven rescan of every root
+            for root in self._roots:
+                self.sink(root, None)
+            return
+        if mask & IN_IGNORED:
+            self._dirs.pop(wd, None)
+            return
+        if wd not in self._dirs or not name or _hidden(name):
+            return
+        root, directory = self._dirs[wd]
+        path = os.path.join(directory, name)
+        if mask & IN_ISDIR:
+            if mask & (IN_CREATE | IN_MOVED_TO):
+                self._watch_tree(root, path, emit=True)
+            elif mask & (IN_DELETE | IN_MOVED_FROM):
+                # Files of a removed subtree are found through the manifest
+                self.sink(root, None)
+            return
+        self.sink(root, path)
+
+    def close(self):
+        os.close(self.fd)
+
+
+def _inside(path: str, root: str) -> bool:
+    return path == root or path.startswith(root.rstrip(os.sep) + os.sep)
+
+
+class FolderWatcher:
+    """
+    Watches the indexed roots inside the folders of StateDB's `folders` table and re-indexes
+    changed files. Changes are collected for `debounce` seconds after the last event of a root,
+    then re-indexed in batches paced to at most `max_files_per_sec` files and `max_mb_per_sec`
+    MB of source files per second. A batch is paced after it ran, so one file that is larger
+    than the byte budget still goes through, followed by a proportionally longer pause.
+    """
+    def __init__(self, store_getter: Callable, db: StateDB = None, debounce: float = 2.0,
+                 max_files_per_sec: float = 20.0, max_mb_per_sec: float = 8.0, poll_interval: float = 10.0,
+                 use_inotify: bool = True):
+        self.store_getter = store_getter
+        self.db = db or get_db()
+        self.debounce = debounce
+        self.max_files_per_sec = max_files_per_sec
+        self.max_bytes_per_sec = max_mb_per_sec * 1024 * 1024
+
+        self._pending: Dict[str, Set[str]] = {}
+        self._rescan: Set[str] = set()
+        self._last_event: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._generations = None
+        self._roots: List[str] = []
+
+        self.backend = None
+        if use_inotify and sys.platform.startswith("linux"):
+            try:
+                self.backend = InotifyBackend(self._on_change)
+            except (OSError, AttributeError) as e:
+                logger.info(f"inotify unavailable ({e}), polling instead")
+        if self.backend is None:
+            self.backend = PollingBackend(self._on_change, poll_interval)
+
+    def _on_change(self, root: str, path: Optional[str]):
+        with self._lock:
+            if path is None:
+                self._rescan.add(root)
+                self._last_event[root] = time.monotonic()
+                return
+            # A root indexed on its own inside another one is kept up to date too
+            for indexed in self._roots:
+                if _inside(path, indexed):
+                    self._pending.setdefault(indexed, set()).add(path)
+                    self._last_event[indexed] = time.monotonic()
+
+    def _watched_roots(self) -> List[str]:
+        """Indexed roots inside a tracked folder."""
+        folders = [os.path.realpath(f) for f in self.db.list_folders()]
+        return sorted(r for r in self.db.list_indexed_roots()
+                      if os.path.isdir(r) and any(_inside(os.path.realpath(r), f) for f in folders))
+
+    def _sync_roots(self):
+        generations = self.db.get_generations()
+        generations = (generations.get("folders", 0), generations.get("index", 0))
+        if generations == self._generations:
+            return
+        self._generations = generations
+        roots = self._watched_roots()
+        if roots == self._roots:
+            return
+        with self._lock:
+            self._roots = roots
+        try:
+            self.backend.set_roots(roots)
+        except OSError as e:
+            if isinstance(self.backend, PollingBackend):
+                raise
+            logger.warning(f"{e}; switching to polling")
+            self.backend.close()
+            self.backend = PollingBackend(self._on_change)
+            self.backend.set_roots(roots)
+        logger.info(f"Watching {len(roots)} indexed roots ({type(self.backend).__name__})")
+
+    def _take_ready(self) -> Tuple[Dict[str, List[str]], Set[str]]:
+        now = time.monotonic()
+        ready, rescan = {}, set()
+        with self._lock:
+            for root, last in list(self._last_event.items()):
+                if now - last < self.debounce:
+                    continue
+                del self._last_event[root]
+                if root in self._rescan:
+                    self._rescan.discard(root)
+                    self._pending.pop(root, None)
+                    rescan.add(root)
+                elif root in self._pending:
+                    ready[root] = sorted(self._pending.pop(root))
+        return ready, rescan
+
+    def _batches(self, paths: List[str]):
+        """Splits paths into batches of about one second's worth of files and bytes each."""
+        max_files = max(1, int(self.max_files_per_sec))
+        batch, size = [], 0
+        for path in paths:
+            try:
+                file_size = os.path.getsize(path)
+            except OSError:
+                file_size = 0  # deleted, only its manifest entry goes
+            if batch and (len(batch) >= max_files or size + file_size > self.max_bytes_per_sec):
+                yield batch, size
+                batch, size = [], 0
+            batch.append(path)
+            size += file_size
+        if batch:
+            yield batch, size
+
+    def _reindex(self, ready: Dict[str, List[str]], rescan: Set[str]):
+        store = self.store_getter()
+        indexed = set(self.db.list_indexed_roots())
+        for root in rescan:
+            if self._stop.is_set():
+                return
+            if root not in indexed:
+                continue  # dropped meanwhile
+            logger.info(f"Rescanning {root}")
+            store.index_directory(root)
+        for root, paths in ready.items():
+            if root not in indexed:
+                continue
+            for batch, size in self._batches(paths):
+                if self._stop.is_set():
+                    return
+                start = time.monotonic()
+                stats = store.index_files(root, batch)
+                logger.info(f"Watcher re-indexed {root}: {stats.files_indexed} updated, {stats.files_removed} removed")
+                # Rate limit: a batch takes at least as long as its files and bytes allow
+                budget = max(len(batch) / self.max_files_per_sec, size / self.max_bytes_per_sec)
+                self._stop.wait(max(0.0, budget - (time.monotonic() - start)))
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self._sync_roots()
+                self.backend.poll(timeout=1.0)
+                ready, rescan = self._take_ready()
+                if ready or rescan:
+                    self._reindex(ready, rescan)
+            except Exception as e:
+                logger.warning(f"Watcher error: {e}")
+                self._stop.wait(5.0)
+
+    def start(self, catch_up: bool = True):
+        """
+        Starts watching in a daemon thread. With catch_up, folders that were indexed before
+        are rescanned first, picking up changes made while nothing was watching.
+        """
+        if catch_up:
+            for root in self._watched_roots():
+                self._on_change(root, None)
+        self._thread = threading.Thread(target=self._run, name="openworker-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        self.backend.close()
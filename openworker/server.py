@@ -1,11 +1,17 @@
 from mcp.server.fastmcp import FastMCP
-from openworker.utils.readers import read_file_content
-from openworker.rag.security import secure_path
+from mcp.types import ToolAnnotations
+from openworker.utils.pager import read_range
+from openworker.utils.walker import ListOptions, get_walker
+from openworker.rag.security import get_guard, secure_path
 import os
 from pathlib import Path
+from functools import wraps
 
+import asyncio
 import logging
 import sys
+import threading
+import time
 
 # Configure logging to stderr to avoid breaking MCP stdout protocol
 logging.basicConfig(level=logging.INFO, stream=sys.stderr)
@@ -17,33 +23,69 @@ logging.getLogger("mcp").setLevel(logging.WARNING)
 # Initialize FastMCP Server
 mcp = FastMCP("macopenworker")
 
-@mcp.tool()
+# Tools that only read: clients may call several of them at once
+READ_ONLY = ToolAnnotations(readOnlyHint=True)
+
+def run_in_thread(func):
+    """Runs a blocking tool on a worker thread, so concurrent calls do not queue on the event loop."""
+    @wraps(func)
+    async def wrapper(*args, **kwargs):
+        return await asyncio.to_thread(func, *args, **kwargs)
+    return wrapper
+
+@mcp.tool(annotations=READ_ONLY)
+@run_in_thread
 @secure_path(arg_name="path")
-def read_file(path: str) -> str:
+def read_file(path: str, pages: str = "", lines: str = "", byte_range: str = "", cursor: str = "") -> str:
     """
     Read the content of a local file. Supports PDF, Docx, Excel, Text, Code.
+    Long files are returned one slice at a time: the header gives the file size (and page
+    count for PDFs), the footer a cursor to continue from. Give at most one range.
     Args:
         path: Absolute path to the file.
+        pages: PDF pages to read, e.g. "3" or "10-20" (1-based).
+        lines: Lines to read, e.g. "100-200" or "500-" (1-based).
+        byte_range: Byte offsets to read from a text file, e.g. "0-65535" (0-based).
+        cursor: Continuation cursor from a previous read_file call.
     """
-    return read_file_content(path)
+    return read_range(path, pages=pages, lines=lines, byte_range=byte_range, cursor=cursor)
 
-@mcp.tool()
+@mcp.tool(annotations=READ_ONLY)
+@run_in_thread
 @secure_path(arg_name="directory")
-def list_files(directory: str) -> str:
+def list_files(directory: str, pattern: str = "", extensions: str = "", max_depth: int = 0,
+               exclude: str = "", cursor: str = "", limit: int = 1000) -> str:
     """
-    List files in a directory recursively.
+    List files in a directory recursively, in sorted order. Hidden files and paths matched
+    by .gitignore files are skipped. Long listings end with a cursor to continue from.
     Args:
         directory: Absolute path to the directory.
+        pattern: Glob on file names (e.g. "*.py") or, with a "/", on relative paths (e.g. "src/**/*.ts").
+        extensions: Comma-separated extensions to keep, e.g. "pdf,docx".
+        max_depth: 1 lists only the directory itself, 0 means no limit.
+        exclude: Comma-separated .gitignore-style patterns to skip, e.g. "build/,*.log".
+        cursor: Continuation cursor from a previous list_files call with the same filters.
+        limit: Maximum number of paths to return (at most 1000).
     """
     path = Path(directory)
     if not path.exists() or not path.is_dir():
         return f"Error: Directory not found {directory}"
-    
-    files = []
-    for p in path.rglob("*"):
-        if p.is_file() and not p.name.startswith("."):
-            files.append(str(p))
-    return "\n".join(files[:1000]) # hard limit to avoid context blowup
+
+    options = ListOptions(
+        pattern=pattern.strip(),
+        extensions=tuple(e.strip() for e in extensions.split(",") if e.strip()),
+        max_depth=max(0, max_depth),
+        exclude=tuple(e.strip() for e in exclude.split(",") if e.strip()),
+    )
+    try:
+        # hard limit to avoid context blowup
+        paths, next_cursor = get_walker().list(str(path), options, limit=min(max(1, limit), 1000), cursor=cursor)
+    except ValueError as e:
+        return f"Error: {e}"
+    lines = [str(path / rel) for rel in paths]
+    if next_cursor:
+        lines.append(f'[More files: call list_files again with cursor="{next_cursor}"]')
+    return "\n".join(lines)
 
 @mcp.tool()
 @secure_path(arg_name="path")
@@ -78,7 +120,8 @@ def index_folder(directory: str) -> str:
     except Exception as e:
         return f"Error indexing: {str(e)}"
 
-@mcp.tool()
+@mcp.tool(annotations=READ_ONLY)
+@run_in_thread
 def search_knowledge(query: str) -> str:
     """
     Search the indexed knowledge base (RAG).
@@ -88,16 +131,26 @@ def search_knowledge(query: str) -> str:
     """
     from openworker.rag.store import get_store
     from openworker.rag.query_rewriter import get_rewriter
+    from openworker.rag.result_cache import get_search_cache
+    from openworker.state import get_db
     
     try:
-        # 1. Refine Query
+        db = get_db()
+        cache = get_search_cache()
+
+        def search(q: str) -> dict:
+            # Hybrid + Rerank, unless the same search already ran against this index state
+            key = cache.key(q, get_guard()._get_allowed_folders(), db.get_generations())
+            results = cache.get(key)
+            if results is None:
+                results = get_store().query(q)
+                cache.put(key, results)
+            return results
+
+        # Refine the query; retrieval on the raw query may start while the rewrite is in flight
         rewriter = get_rewriter()
-        refined_query = rewriter.refine_query(query)
-        # logging.info(f"Refined query: '{query}' -> '{refined_query}'")
-        
-        # 2. Search (Hybrid + Rerank)
-        store = get_store()
-        results = store.query(refined_query)
+        refined_query, results = rewriter.rewrite_and_search(query, search)
+        logging.info(f"Query rewrite added {rewriter.stats.last_added_latency * 1000:.0f}ms")
         
         # Format results
         output = [f"Original Query: {query}", f"Refined Query: {refined_query}", "---"]
@@ -123,5 +176,24 @@ def reset_knowledge_base() -> str:
     except Exception as e:
         return f"Error resetting: {str(e)}"
 
+def _warm_up():
+    """Loads the RAG store and its models so the first search does not pay for it."""
+    from openworker.rag.store import get_store
+    try:
+        start = time.perf_counter()
+        store = get_store()
+        store.warm_up()
+        timings = ", ".join(f"{k} {v:.2f}s" for k, v in store.load_timings.items())
+        logging.info(f"RAG warm-up done in {time.perf_counter() - start:.2f}s ({timings})")
+    except Exception as e:
+        logging.warning(f"RAG warm-up failed: {e}")
+
 if __name__ == "__main__":
+    if os.environ.get("OPENWORKER_WARMUP", "1") != "0":
+        # Daemon thread: the MCP handshake does not wait for model loading
+        threading.Thread(target=_warm_up, name="openworker-warmup", daemon=True).start()
+    if os.environ.get("OPENWORKER_WATCH", "0") == "1":
+        from openworker.rag.store import get_store
+        from openworker.rag.watcher import FolderWatcher
+        FolderWatcher(get_store).start()
     mcp.run()
@@ -1,58 +1,173 @@
 import sqlite3
 import os
+import threading
+from contextlib import contextmanager
 from datetime import datetime
-from typing import List
+from typing import Iterator, List, Dict, Any
 from openworker.config import DB_PATH
 
 class StateDB:
-    def __init__(self, db_path: str = None):
+    """
+    Shared state of the CLI and the MCP server.
+    Each thread keeps one persistent connection (WAL mode, so readers never block the writer
+    of the other process, with a busy timeout instead of immediate "database is locked"
+    errors). Statements are prepared once per connection through sqlite3's statement cache.
+    """
+    def __init__(self, db_path: str = None, busy_timeout: float = 5.0):
         if db_path is None:
             db_path = str(DB_PATH)
         self.db_path = db_path
+        self.busy_timeout = busy_timeout
+        # Generation bumps made through this instance, lets in-process caches skip a DB read
+        self.local_changes = 0
+        self._local = threading.local()
         self._init_db()
 
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # isolation_level=None: autocommit, transactions are opened explicitly by transaction()
+            conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout, isolation_level=None,
+                                   cached_statements=128)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute(f'PRAGMA busy_timeout={int(self.busy_timeout * 1000)}')
+            self._local.conn = conn
+            self._local.depth = 0
+        return conn
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Cursor]:
+        """
+        Runs the block as one write transaction on this thread's connection and yields its cursor.
+        Nested calls become savepoints, so an inner failure only undoes the inner block.
+        """
+        conn = self._conn()
+        depth = self._local.depth
+        conn.execute('BEGIN IMMEDIATE' if depth == 0 else f'SAVEPOINT sp{depth}')
+        self._local.depth = depth + 1
+        try:
+            yield conn.cursor()
+        except BaseException:
+            conn.execute('ROLLBACK' if depth == 0 else f'ROLLBACK TO sp{depth}')
+            if depth:
+                conn.execute(f'RELEASE sp{depth}')
+            raise
+        else:
+            conn.execute('COMMIT' if depth == 0 else f'RELEASE sp{depth}')
+        finally:
+            self._local.depth = depth
+
+    def close(self):
+        """Closes the calling thread's connection (it is reopened on next use)."""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
     def _init_db(self):
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS folders (
-                path TEXT PRIMARY KEY,
-                added_at TIMESTAMP
-            )
-        ''')
-        conn.commit()
-        conn.close()
+        with self.transaction() as cursor:
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS folders (
+                    path TEXT PRIMARY KEY,
+                    added_at TIMESTAMP
+                )
+            ''')
+            # One row per indexed file, used to skip unchanged files on re-index
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS index_manifest (
+                    root_path TEXT,
+                    path TEXT,
+                    size INTEGER,
+                    mtime REAL,
+                    content_hash TEXT,
+                    chunk_count INTEGER,
+                    indexed_at TIMESTAMP,
+                    PRIMARY KEY (root_path, path)
+                )
+            ''')
+            # Monotonic counters other processes poll to notice index/folder changes
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS generations (
+                    name TEXT PRIMARY KEY,
+                    value INTEGER
+                )
+            ''')
 
     def add_folder(self, path: str):
         path = os.path.abspath(path)
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        try:
-            cursor.execute('INSERT OR IGNORE INTO folders (path, added_at) VALUES (?, ?)', 
+        with self.transaction() as cursor:
+            cursor.execute('INSERT OR IGNORE INTO folders (path, added_at) VALUES (?, ?)',
                            (path, datetime.now()))
-            conn.commit()
-        finally:
-            conn.close()
+            if cursor.rowcount:
+                self._bump(cursor, "folders")
 
     def remove_folder(self, path: str):
         path = os.path.abspath(path)
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        try:
+        with self.transaction() as cursor:
             cursor.execute('DELETE FROM folders WHERE path = ?', (path,))
-            conn.commit()
-        finally:
-            conn.close()
+            if cursor.rowcount:
+                self._bump(cursor, "folders")
 
     def list_folders(self) -> List[str]:
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        try:
-            cursor.execute('SELECT path FROM folders')
-            rows = cursor.fetchall()
-            return [r[0] for r in rows]
-        finally:
-            conn.close()
+        rows = self._conn().execute('SELECT path FROM folders').fetchall()
+        return [r[0] for r in rows]
+
+    def get_manifest(self, root_path: str) -> Dict[str, Dict[str, Any]]:
+        """Returns {path: entry} for every file indexed under root_path."""
+        rows = self._conn().execute('''
+            SELECT path, size, mtime, content_hash, chunk_count
+            FROM index_manifest WHERE root_path = ?
+        ''', (root_path,))
+        return {
+            r[0]: {"size": r[1], "mtime": r[2], "content_hash": r[3], "chunk_count": r[4]}
+            for r in rows
+        }
+
+    def list_indexed_roots(self) -> List[str]:
+        rows = self._conn().execute('SELECT DISTINCT root_path FROM index_manifest').fetchall()
+        return [r[0] for r in rows]
+
+    def upsert_manifest(self, root_path: str, entries: List[Dict[str, Any]]):
+        """Entries are dicts with path, size, mtime, content_hash and chunk_count."""
+        if not entries:
+            return
+        now = datetime.now()
+        with self.transaction() as cursor:
+            cursor.executemany('''
+                INSERT OR REPLACE INTO index_manifest
+                    (root_path, path, size, mtime, content_hash, chunk_count, indexed_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', [(root_path, e["path"], e["size"], e["mtime"], e["content_hash"], e["chunk_count"], now)
+                  for e in entries])
+
+    def delete_manifest(self, root_path: str, paths: List[str] = None):
+        """Deletes the given paths under root_path, or the whole root if paths is None."""
+        with self.transaction() as cursor:
+            if paths is None:
+                cursor.execute('DELETE FROM index_manifest WHERE root_path = ?', (root_path,))
+            else:
+                cursor.executemany('DELETE FROM index_manifest WHERE root_path = ? AND path = ?',
+                                   [(root_path, p) for p in paths])
+
+    def clear_manifest(self):
+        with self.transaction() as cursor:
+            cursor.execute('DELETE FROM index_manifest')
+
+    def _bump(self, cursor, name: str):
+        self.local_changes += 1
+        cursor.execute('''
+            INSERT INTO generations (name, value) VALUES (?, 1)
+            ON CONFLICT(name) DO UPDATE SET value = value + 1
+        ''', (name,))
+
+    def bump_generation(self, name: str):
+        """Signals a change of `name` ("folders" or "index") to every process sharing this DB."""
+        with self.transaction() as cursor:
+            self._bump(cursor, name)
+
+    def get_generations(self) -> Dict[str, int]:
+        return dict(self._conn().execute('SELECT name, value FROM generations').fetchall())
 
 # Singleton
 _db = None
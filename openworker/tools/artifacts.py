@@ -0,0 +1,138 @@
+"""
+Spill-to-disk store for oversized tool results.
+A result over the threshold is written to OPENWORKER_HOME/artifacts and the conversation gets
+a preview and a handle instead; the read_artifact tool returns further slices on demand.
+Tools whose results are already bounded and end in their own continuation cursor are never
+spilled. Handles are content hashes, so repeating a call does not store the result twice. The least
+recently read artifacts are deleted once the store grows past its size budget.
+"""
+import hashlib
+import os
+import re
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from openworker.config import ARTIFACTS_PATH, ARTIFACT_MAX_MB, ARTIFACT_THRESHOLD
+
+PREVIEW_CHARS = 2000     # of a spilled result, shown in the conversation
+SLICE_CHARS = 8000       # default and largest read_artifact slice
+# Results bounded by the tool itself (read_file caps, list_files pages), with a cursor footer
+PAGED_TOOLS = frozenset({"read_file", "list_files", "read_artifact"})
+_HANDLE_RE = re.compile(r"art_[0-9a-f]{16}")
+_FOOTER_RE = re.compile(r'stored as artifact "(art_[0-9a-f]{16})"')
+
+# Served by ToolExecutor itself, not by an MCP server
+READ_ARTIFACT_TOOL: Dict[str, Any] = {
+    "type": "function",
+    "function": {
+        "name": "read_artifact",
+        "description": ("Read a slice of a stored tool result. Results too long for the conversation are "
+                        "replaced by a preview and an artifact handle; use this to read the rest."),
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "handle": {"type": "string", "description": "Artifact handle, e.g. art_0123456789abcdef."},
+                "offset": {"type": "integer", "description": "Character offset to start from (default 0)."},
+                "length": {"type": "integer", "description": f"Characters to return (default and max {SLICE_CHARS})."},
+            },
+            "required": ["handle"],
+        },
+    },
+}
+
+
+class ArtifactStore:
+    def __init__(self, path: str = None, threshold: int = ARTIFACT_THRESHOLD, max_mb: int = ARTIFACT_MAX_MB):
+        self.dir = Path(path) if path is not None else ARTIFACTS_PATH
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.threshold = threshold
+        self.max_bytes = max_mb * 1024 * 1024
+        self._lock = threading.Lock()
+
+    def _file(self, handle: str) -> Path:
+        return self.dir / f"{handle}.txt"
+
+    def put(self, text: str) -> str:
+        """Stores text and returns its handle."""
+        handle = "art_" + hashlib.sha1(text.encode("utf-8", "surrogatepass")).hexdigest()[:16]
+        path = self._file(handle)
+        with self._lock:
+            if not path.exists():
+                # Write then rename, so a reader never sees a partial artifact
+                tmp = self.dir / f"{handle}.{os.getpid()}.{threading.get_ident()}.tmp"
+                tmp.write_text(text, encoding="utf-8", errors="surrogatepass")
+                os.replace(tmp, path)
+                self._evict(keep=path)
+            else:
+                os.utime(path)
+        return handle
+
+    def _evict(self, keep: Path):
+        files = []
+        for f in self.dir.glob("art_*.txt"):
+            try:
+                st = f.stat()
+            except OSError:
+                continue
+            files.append((st.st_mtime, st.st_size, f))
+        total = sum(size for _, size, _ in files)
+        for _, size, f in sorted(files, key=lambda x: x[0]):
+            if total <= self.max_bytes:
+                break
+            if f != keep:
+                f.unlink(missing_ok=True)
+                total -= size
+
+    def get(self, handle: str) -> Optional[str]:
+        if not _HANDLE_RE.fullmatch(handle or ""):
+            return None
+        path = self._file(handle)
+        try:
+            text = path.read_text(encoding="utf-8", errors="surrogatepass")
+        except OSError:
+            return None
+        os.utime(path)  # recently read artifacts are evicted last
+        return text
+
+    def spill(self, tool_name: str, text: str) -> str:
+        """Returns text itself when it is short enough, else a preview and the handle of the stored text."""
+        if not self.threshold or len(text) <= self.threshold or tool_name in PAGED_TOOLS:
+            return text
+        handle = self.put(text)
+        lines = text.count("\n") + 1
+        # Keep a trailing "[...]" footer (e.g. a continuation cursor) visible below the preview
+        last = text.rstrip().rsplit("\n", 1)[-1]
+        footer = f"{last}\n" if last.startswith("[") and len(last) <= 500 else ""
+        return (f"{text[:PREVIEW_CHARS]}\n"
+                f"[{tool_name} returned {len(text)} characters ({lines} lines); this is the first {PREVIEW_CHARS}. "
+                f'The full result is stored as artifact "{handle}": call read_artifact with handle="{handle}" '
+                f"and offset={PREVIEW_CHARS} to continue, or any other offset to jump ahead]\n{footer}").rstrip("\n")
+
+    def read(self, handle: str, offset: int = 0, length: int = SLICE_CHARS) -> str:
+        """The read_artifact tool: one slice of an artifact, with a footer pointing at the next one."""
+        text = self.get(handle)
+        if text is None:
+            return f"Error: Artifact '{handle}' not found. It may have been evicted; call the original tool again."
+        offset, length = max(0, int(offset or 0)), min(SLICE_CHARS, max(1, int(length or SLICE_CHARS)))
+        if offset >= len(text) and text:
+            return f"Error: offset {offset} is out of range, the artifact has {len(text)} characters."
+        end = min(len(text), offset + length)
+        footer = (f"[End of artifact, {len(text)} characters]" if end >= len(text) else
+                  f"[Characters {offset}-{end} of {len(text)}; continue with offset={end}]")
+        return f"{text[offset:end]}\n{footer}"
+
+
+def spilled_handle(text: str) -> Optional[str]:
+    """Handle named by the footer of a spilled result, None for results that were not spilled."""
+    match = _FOOTER_RE.search(text[-1200:])
+    return match.group(1) if match else None
+
+
+# Singleton
+_store = None
+def get_artifact_store():
+    global _store
+    if _store is None:
+        _store = ArtifactStore()
+    return _store
@@ -1,29 +1,64 @@
-from typing import Dict, Any, List, Optional, Callable
+from typing import Dict, Any, List, Optional, Callable, Set
 import json
 from mcp.client.session import ClientSession
+from openworker.tools.artifacts import ArtifactStore, READ_ARTIFACT_TOOL, get_artifact_store
+
+# Tools that need the user's confirmation; they always run on their own
+SENSITIVE_TOOLS = {"write_file", "index_folder", "reset_knowledge_base"}
+
+
+def result_to_text(result: Any) -> str:
+    """Plain text of an MCP tool result: text blocks as is, other blocks as a short description."""
+    parts = []
+    for block in result.content or []:
+        kind = getattr(block, "type", None)
+        if kind == "text":
+            parts.append(block.text)
+        elif kind == "resource":
+            resource = block.resource
+            text = getattr(resource, "text", None)
+            parts.append(text if text is not None else
+                         f"[Binary resource {resource.uri} ({getattr(resource, 'mimeType', None) or 'unknown type'})]")
+        elif kind == "resource_link":
+            parts.append(f"[Resource {block.uri}]")
+        elif kind in ("image", "audio"):
+            parts.append(f"[{kind.capitalize()} ({block.mimeType}), {len(block.data) * 3 // 4} bytes]")
+        else:
+            parts.append(str(block))
+    text = "\n".join(parts)
+    return f"Error: {text}" if getattr(result, "isError", False) and not text.startswith("Error") else text
+
 
 class ToolExecutor:
-    def __init__(self, clients: Dict[str, ClientSession], confirmation_callback: Optional[Callable[[str], Any]] = None):
+    def __init__(self, clients: Dict[str, ClientSession], confirmation_callback: Optional[Callable[[str], Any]] = None,
+                 artifacts: ArtifactStore = None):
         """
         Args:
             clients: Dict mapping server_name -> initialized MCP ClientSession.
             confirmation_callback: Async function to ask user for permission.
+            artifacts: Where oversized results are spilled (served back by the read_artifact tool).
         """
         self.clients = clients
         self.confirmation_callback = confirmation_callback
+        self.artifacts = artifacts or get_artifact_store()
         self.available_tools: List[Dict[str, Any]] = []
         self.tool_map: Dict[str, str] = {}  # Maps tool_name -> client_name
+        self.read_only_tools: Set[str] = set()  # Tools whose server marked them readOnlyHint
+        self._summarizer = None  # SummarizerAgent, created on the first sensitive call
 
     async def initialize(self):
         """Fetch available tools from ALL MCP servers."""
         self.available_tools = []
         self.tool_map = {}
+        self.read_only_tools = set()
         
         for name, session in self.clients.items():
             try:
                 result = await session.list_tools()
                 for tool in result.tools:
                     self.tool_map[tool.name] = name
+                    if getattr(tool.annotations, "readOnlyHint", False):
+                        self.read_only_tools.add(tool.name)
                     self.available_tools.append({
                         "type": "function",
                         "function": {
@@ -35,23 +70,29 @@ class ToolExecutor:
             except Exception as e:
                 print(f"Error fetching tools from {name}: {e}")
 
+        # Local tools
+        self.available_tools.append(READ_ARTIFACT_TOOL)
+        self.read_only_tools.add("read_artifact")
+
     def get_tools_definitions(self) -> List[Dict[str, Any]]:
         return self.available_tools
 
+    def is_concurrent_safe(self, tool_call: Any) -> bool:
+        """Read-only tools that need no confirmation may run alongside other calls."""
+        name = tool_call.function.name
+        return name in self.read_only_tools and name not in SENSITIVE_TOOLS
+
     async def execute_tool(self, tool_call: Any) -> str:
         fn_name = tool_call.function.name
         fn_args = json.loads(tool_call.function.arguments)
         
         # Intercept Sensitive Tools
-        # Intercept Sensitive Tools
-        SENSITIVE_TOOLS = {"write_file", "index_folder", "reset_knowledge_base"}
         if fn_name in SENSITIVE_TOOLS and self.confirmation_callback:
             # Generate Summary
-            from openworker.agents.summarizer import SummarizerAgent
-            action_summary_agent = SummarizerAgent()
-            # Do this in executor to avoid blocking if sync
-            import asyncio
-            summary = await asyncio.get_event_loop().run_in_executor(None, lambda: action_summary_agent.summarize_plan(fn_name, fn_args))
+            if self._summarizer is None:
+                from openworker.agents.summarizer import SummarizerAgent
+                self._summarizer = SummarizerAgent()
+            summary = await self._summarizer.summarize_plan(fn_name, fn_args)
             
             prompt = f"\n[bold yellow]ACTION REQUIRED[/bold yellow]\n{summary}\n\nExecute this action?"
             
@@ -59,14 +100,23 @@ class ToolExecutor:
             if not approved:
                 return "User denied permission."
 
+        # Local Tools
+        if fn_name == "read_artifact":
+            try:
+                return self.artifacts.read(fn_args.get("handle", ""), fn_args.get("offset", 0),
+                                           fn_args.get("length", 0))
+            except (TypeError, ValueError) as e:
+                return f"Error: invalid read_artifact arguments: {e}"
+
         # MCP Tools
         if fn_name in self.tool_map:
             client_name = self.tool_map[fn_name]
             session: ClientSession = self.clients[client_name]
             try:
                 tool_result = await session.call_tool(fn_name, fn_args)
-                return str(tool_result.content) 
             except Exception as e:
                 return f"Error executing tool {fn_name} on {client_name}: {str(e)}"
+            # Long results stay on disk, the conversation gets a preview and a handle
+            return self.artifacts.spill(fn_name, result_to_text(tool_result))
         else:
             return f"Error: Tool {fn_name} not found."
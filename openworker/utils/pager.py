@@ -0,0 +1,218 @@
+"""
+Ranged reads for the read_file tool.
+A read returns one bounded slice of a file, by PDF pages, lines or bytes, with a header giving
+the file's size (and page count for PDFs) and an opaque cursor for the next slice. Only what
+the slice needs is extracted: PDF pages outside the range are never parsed, text files are
+read from the requested offset, and line ranges stop streaming once they are complete.
+"""
+import base64
+import json
+import os
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+
+from openworker.config import INDEX_MAX_CHARS, READ_MAX_CHARS, READ_MAX_PAGES
+from openworker.utils.readers import DOCUMENT_SUFFIXES, PdfPages, detect_encoding, iter_file_content
+from openworker.utils.text_cache import PAGE_COUNT, get_text_cache
+
+Range = Tuple[int, Optional[int]]  # [start, stop), 0-based, stop None = to the end
+
+
+def parse_range(spec: str, one_based: bool = True) -> Range:
+    """'3' -> one item, '3-5' -> inclusive range, '3-' -> to the end. Pages and lines count from 1, bytes from 0."""
+    first, sep, last = spec.strip().partition("-")
+    base = 1 if one_based else 0
+    start = int(first) - base if first.strip() else 0
+    if not sep:
+        stop = start + 1
+    else:
+        stop = int(last) - base + 1 if last.strip() else None
+    if start < 0 or (stop is not None and stop <= start):
+        raise ValueError(f"invalid range '{spec}'")
+    return start, stop
+
+
+def _fingerprint(file_path: str) -> List[int]:
+    st = os.stat(file_path)
+    return [st.st_size, st.st_mtime_ns]
+
+
+def encode_cursor(file_path: str, mode: str, start: int, stop: Optional[int]) -> str:
+    raw = json.dumps([mode, start, stop] + _fingerprint(file_path), separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(file_path: str, cursor: str) -> Tuple[str, Range]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        mode, start, stop, size, mtime = json.loads(raw)
+    except (ValueError, TypeError):
+        raise ValueError("invalid cursor")
+    if [size, mtime] != _fingerprint(file_path):
+        raise ValueError("the file changed since this cursor was issued, read it again without a cursor")
+    return mode, (start, stop)
+
+
+def _human_size(size: int) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+def _clip(text: str, max_chars: int) -> str:
+    if len(text) <= max_chars:
+        return text
+    return text[:max_chars] + f"\n[Truncated: {len(text) - max_chars} more characters in this section]"
+
+
+def _read_pages(file_path: str, rng: Range, max_chars: int, max_pages: int) -> Tuple[str, str, Optional[Range]]:
+    cache = get_text_cache()
+    with PdfPages(file_path) as pdf:
+        total = len(pdf)
+        # Lets indexing assemble the document from cached pages once all of them have been read
+        count_key = cache.key(file_path, part=PAGE_COUNT)
+        if not cache.contains(count_key):
+            cache.put(count_key, str(total))
+        start, stop = rng[0], min(rng[1] or total, total)
+        if start >= total:
+            raise ValueError(f"page {start + 1} is out of range, the document has {total} pages")
+        parts, used, i = [], 0, start
+        while i < stop and (not max_pages or i - start < max_pages):
+            key = cache.key(file_path, part=f"page {i}")
+            text = cache.get(key)
+            if text is None:
+                text = pdf.text(i)
+                cache.put(key, text)
+            # Always return at least one page, clipped if it alone is over the budget
+            if parts and used + len(text) > max_chars:
+                break
+            parts.append(f"--- Page {i + 1} ---\n{_clip(text, max_chars)}")
+            used += len(text)
+            i += 1
+    header = f"pages {start + 1}-{i} of {total}"
+    return "\n".join(parts), header, (i, stop) if i < stop else None
+
+
+def _iter_lines(file_path: str) -> Iterator[str]:
+    if Path(file_path).suffix.lower() in (".docx", ".xlsx"):
+        # These parsers load the whole document anyway, so page through the cached full text
+        text = get_text_cache().read(file_path, INDEX_MAX_CHARS)
+        if text.startswith("Error"):
+            raise ValueError(text)
+        yield from text.splitlines()
+        return
+    pending = ""
+    for segment in iter_file_content(file_path, max_chars=0, max_pages=0):
+        lines = (pending + segment).split("\n")
+        pending = lines.pop()
+        yield from lines
+    if pending:
+        yield pending
+
+
+def _read_lines(file_path: str, rng: Range, max_chars: int) -> Tuple[str, str, Optional[Range]]:
+    start, stop = rng
+    parts, used, count, eof = [], 0, 0, True
+    lines = _iter_lines(file_path)
+    try:
+        for line in lines:
+            if count >= start:
+                if (stop is not None and count >= stop) or (parts and used + len(line) + 1 > max_chars):
+                    eof = False
+                    break
+                parts.append(_clip(line, max_chars))
+                used += len(line) + 1
+            count += 1
+    finally:
+        lines.close()
+    if eof:
+        if count and start >= count:
+            raise ValueError(f"line {start + 1} is out of range, the file has {count} lines")
+        stop = count
+    end = start + len(parts)
+    header = f"lines {start + 1}-{end}" if parts else "no lines"
+    if eof:
+        header += f" of {count}"
+    return "\n".join(parts), header, (end, stop) if stop is None or end < stop else None
+
+
+def _utf8_boundary(data: bytes) -> int:
+    """Length of data without a trailing, incomplete UTF-8 sequence."""
+    for back in range(1, min(4, len(data)) + 1):
+        b = data[-back]
+        if b & 0xC0 != 0x80:  # ASCII or a lead byte
+            need = 1 if b < 0x80 else 2 if b < 0xE0 else 3 if b < 0xF0 else 4
+            return len(data) - back if need > back else len(data)
+    return len(data)
+
+
+def _read_bytes(file_path: str, rng: Range, max_chars: int) -> Tuple[str, str, Optional[Range]]:
+    size = os.path.getsize(file_path)
+    start, stop = rng[0], min(rng[1] or size, size)
+    if start >= size and size:
+        raise ValueError(f"offset {start} is out of range, the file has {size} bytes")
+    with open(file_path, "rb") as f:
+        f.seek(start)
+        data = f.read(min(stop - start, max_chars))
+    encoding = detect_encoding(file_path)
+    if start + len(data) < stop:
+        # End on a line break when there is one, so the next slice starts on a fresh line
+        cut = data.rfind(b"\n", len(data) // 2)
+        if cut != -1:
+            data = data[:cut + 1]
+        elif encoding == "utf-8":
+            data = data[:_utf8_boundary(data)]
+    end = start + len(data)
+    text = data.decode(encoding, errors="replace")
+    header = f"bytes {start}-{max(start, end - 1)} of {size}"
+    return text, header, (end, stop) if end < stop else None
+
+
+def read_range(file_path: str, pages: str = "", lines: str = "", byte_range: str = "", cursor: str = "",
+               max_chars: int = READ_MAX_CHARS, max_pages: int = READ_MAX_PAGES) -> str:
+    """
+    Reads one slice of a file: the given pages, lines or byte range, the slice a cursor points
+    to, or else the start of the file. At most max_chars characters (max_pages PDF pages) are
+    returned; the footer carries the cursor for the rest. Errors come back as "Error..." strings.
+    """
+    path = Path(file_path)
+    if not path.is_file():
+        return f"Error: File not found at {file_path}"
+    suffix = path.suffix.lower()
+    max_chars = max_chars or INDEX_MAX_CHARS
+
+    try:
+        if cursor:
+            mode, rng = decode_cursor(file_path, cursor)
+        elif pages:
+            mode, rng = "pages", parse_range(pages)
+        elif lines:
+            mode, rng = "lines", parse_range(lines)
+        elif byte_range:
+            mode, rng = "bytes", parse_range(byte_range, one_based=False)
+        else:
+            # Natural unit of the format
+            mode = "pages" if suffix == ".pdf" else "lines" if suffix in DOCUMENT_SUFFIXES else "bytes"
+            rng = (0, None)
+
+        if mode == "pages":
+            if suffix != ".pdf":
+                raise ValueError("page ranges are only supported for PDF files, use lines instead")
+            text, header, rest = _read_pages(file_path, rng, max_chars, max_pages)
+        elif mode == "bytes":
+            if suffix in DOCUMENT_SUFFIXES:
+                raise ValueError("byte ranges are only supported for text files, use lines instead")
+            text, header, rest = _read_bytes(file_path, rng, max_chars)
+        else:
+            text, header, rest = _read_lines(file_path, rng, max_chars)
+    except Exception as e:
+        return f"Error reading file {file_path}: {str(e)}"
+
+    size = path.stat().st_size
+    out = [f"[{path.name} | {_human_size(size)} | {header}]", text]
+    if rest:
+        out.append(f'[More content: call read_file again with cursor="{encode_cursor(file_path, mode, *rest)}"]')
+    else:
+        out.append("[End of file]" if rng[1] is None else "[End of requested range]")
+    return "\n".join(out)
@@ -0,0 +1,269 @@
+"""
+Process pool for document extraction.
+Parsing PDF/DOCX/XLSX is CPU-bound and occasionally pathological, so every file is parsed
+in a worker process with a per-file timeout and an address-space cap. A worker that hangs
+or dies is killed and replaced, the file is reported as failed and the job goes on.
+"""
+import atexit
+import logging
+import multiprocessing
+import threading
+import time
+from dataclasses import dataclass, field
+from multiprocessing.connection import wait
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List, Optional
+
+from openworker.config import PARSE_WORKERS, PARSE_TIMEOUT, PARSE_MEMORY_MB, INDEX_MAX_CHARS
+
+if TYPE_CHECKING:
+    from openworker.utils.text_cache import TextCache
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ParseResult:
+    path: str
+    content: Optional[str]
+    error: Optional[str] = None
+    elapsed: float = 0.0
+
+
+@dataclass
+class FormatStats:
+    files: int = 0
+    failures: int = 0
+    timeouts: int = 0
+    total_time: float = 0.0
+    max_time: float = 0.0
+
+    @property
+    def avg_time(self) -> float:
+        return self.total_time / self.files if self.files else 0.0
+
+
+@dataclass
+class ParseStats:
+    formats: Dict[str, FormatStats] = field(default_factory=dict)
+
+    def record(self, path: str, result: ParseResult, timed_out: bool = False):
+        fmt = self.formats.setdefault(Path(path).suffix.lower() or "<none>", FormatStats())
+        fmt.files += 1
+        fmt.total_time += result.elapsed
+        fmt.max_time = max(fmt.max_time, result.elapsed)
+        if result.error:
+            fmt.failures += 1
+        if timed_out:
+            fmt.timeouts += 1
+
+    def summary(self) -> str:
+        lines = []
+        for suffix, s in sorted(self.formats.items(), key=lambda x: -x[1].total_time):
+            lines.append(f"{suffix}: {s.files} files, avg {s.avg_time * 1000:.0f}ms, max {s.max_time * 1000:.0f}ms, "
+                         f"{s.failures} failed ({s.timeouts} timeouts)")
+        return "\n".join(lines)
+
+
+def _worker_main(conn, memory_limit_mb: int, max_chars: int):
+    if memory_limit_mb:
+        try:
+            import resource
+            limit = memory_limit_mb * 1024 * 1024
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+        except (ImportError, ValueError, OSError):
+            pass  # Not supported on this platform
+
+    from openworker.utils.readers import read_file_content
+
+    while True:
+        try:
+            path = conn.recv()
+        except EOFError:
+            return
+        if path is None:
+            return
+        start = time.perf_counter()
+        try:
+            # Streams the file and stops at max_chars, so huge files stay within the memory cap
+            content = read_file_content(path, max_chars=max_chars, max_pages=0)
+            conn.send(ParseResult(path, content, elapsed=time.perf_counter() - start))
+        except MemoryError:
+            conn.send(ParseResult(path, None, "Error: memory limit exceeded", time.perf_counter() - start))
+        except Exception as e:
+            conn.send(ParseResult(path, None, f"Error: {e}", time.perf_counter() - start))
+
+
+class _Worker:
+    def __init__(self, ctx, memory_limit_mb: int, max_chars: int):
+        self.conn, child = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main, args=(child, memory_limit_mb, max_chars),
+                                   name="openworker-parser", daemon=True)
+        self.process.start()
+        child.close()
+        self.path: Optional[str] = None
+        self.started = 0.0
+
+    def submit(self, path: str):
+        self.path = path
+        self.started = time.perf_counter()
+        self.conn.send(path)
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self.process.join(timeout=1)
+        if self.process.is_alive():
+            self.process.kill()
+        self.conn.close()
+
+
+class ParsePool:
+    """
+    Parses files in worker processes and yields results in completion order.
+    Workers are spawned lazily on first use and kept alive between jobs.
+    workers=0 parses in the calling process (no timeout or memory cap).
+    With a text cache, unchanged files are served from it without reaching a worker.
+    """
+    def __init__(self, workers: int = PARSE_WORKERS, timeout: float = PARSE_TIMEOUT,
+                 memory_limit_mb: int = PARSE_MEMORY_MB, max_chars: int = INDEX_MAX_CHARS,
+                 cache: Optional["TextCache"] = None):
+        self.workers = workers
+        self.max_chars = max_chars
+        self.cache = cache
+        self.timeout = timeout
+        self.memory_limit_mb = memory_limit_mb
+        self.stats = ParseStats()
+        self._ctx = multiprocessing.get_context("spawn")
+        self._idle: List[_Worker] = []
+        self._lock = threading.Lock()
+
+    def _acquire(self) -> _Worker:
+        if self._idle:
+            return self._idle.pop()
+        return _Worker(self._ctx, self.memory_limit_mb, self.max_chars)
+
+    def _cache_key(self, path: str) -> Optional[str]:
+        return self.cache.key(path) if self.cache is not None else None
+
+    def _cached(self, key: Optional[str], path: str) -> Optional[ParseResult]:
+        content = self.cache.document(path, self.max_chars) if key is not None else None
+        return ParseResult(path, content) if content is not None else None
+
+    def _store(self, key: Optional[str], result: ParseResult):
+        # Key taken before parsing: a file modified meanwhile is stored under its old key, never its new one
+        if key is None or result.error or not result.content or result.content.startswith("Error"):
+            return
+        # Entries are whole-file extractions, a smaller cap would truncate later reads
+        if not self.max_chars or self.max_chars >= self.cache.max_chars:
+            self.cache.put(key, result.content)
+
+    def _imap_inline(self, paths: Iterable[str]) -> Iterator[ParseResult]:
+        from openworker.utils.readers import read_file_content
+        for path in paths:
+            key = self._cache_key(path)
+            cached = self._cached(key, path)
+            if cached is not None:
+                yield cached
+                continue
+            start = time.perf_counter()
+            try:
+                result = ParseResult(path, read_file_content(path, max_chars=self.max_chars, max_pages=0))
+            except Exception as e:
+                result = ParseResult(path, None, f"Error: {e}")
+            result.elapsed = time.perf_counter() - start
+            self.stats.record(path, result)
+            self._store(key, result)
+            yield result
+
+    def imap_unordered(self, paths: Iterable[str]) -> Iterator[ParseResult]:
+        """
+        Parses paths with at most `workers` files in flight. Paths are pulled lazily,
+        so a slow consumer also slows down the walk feeding this pool.
+        """
+        if self.workers <= 0:
+            yield from self._imap_inline(paths)
+            return
+
+        with self._lock:
+            source = iter(paths)
+            busy: Dict[object, _Worker] = {}
+            keys: Dict[str, Optional[str]] = {}
+            exhausted = False
+            try:
+                while True:
+                    while not exhausted and len(busy) < self.workers:
+                        path = next(source, None)
+                        if path is None:
+                            exhausted = True
+                            break
+                        key = self._cache_key(path)
+                        cached = self._cached(key, path)
+                        if cached is not None:
+                            yield cached
+                            continue
+                        keys[path] = key
+                        worker = self._acquire()
+                        worker.submit(path)
+                        busy[worker.conn] = worker
+                    if not busy:
+                        return
+
+                    now = time.perf_counter()
+                    deadline = min(w.started for w in busy.values()) + self.timeout if self.timeout else None
+                    ready = wait(list(busy), timeout=max(0.0, deadline - now) if deadline else None)
+
+                    for conn in ready:
+                        worker = busy.pop(conn)
+                        try:
+                            result = conn.recv()
+                            self._idle.append(worker)
+                        except (EOFError, OSError):
+                            # Worker died, most likely killed by the memory cap
+                            worker.kill()
+                            result = ParseResult(worker.path, None, "Error: parser process crashed",
+                                                 time.perf_counter() - worker.started)
+                        self.stats.record(worker.path, result)
+                        self._store(keys.pop(worker.path, None), result)
+                        yield result
+
+                    if self.timeout:
+                        now = time.perf_counter()
+                        for conn, worker in list(busy.items()):
+                            if now - worker.started >= self.timeout:
+                                busy.pop(conn)
+                                worker.kill()
+                                logger.warning(f"Parsing {worker.path} timed out after {self.timeout}s")
+                                result = ParseResult(worker.path, None, f"Error: parsing timed out after {self.timeout}s",
+                                                     now - worker.started)
+                                self.stats.record(worker.path, result, timed_out=True)
+                                keys.pop(worker.path, None)
+                                yield result
+            finally:
+                # Consumer stopped early: abandon whatever is still in flight
+                for worker in busy.values():
+                    worker.kill()
+
+    def close(self):
+        with self._lock:
+            for worker in self._idle:
+                worker.stop()
+            self._idle = []
+
+
+# Singleton
+_pool = None
+def get_parse_pool():
+    global _pool
+    if _pool is None:
+        from openworker.utils.text_cache import get_text_cache
+        _pool = ParsePool(cache=get_text_cache())
+        atexit.register(_pool.close)
+    return _pool
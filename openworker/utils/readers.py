@@ -1,65 +1,148 @@
 import os
 from pathlib import Path
-from typing import Optional
+from typing import Iterator, Optional
 import pypdf
 import docx
 import openpyxl
 
-def read_file_content(file_path: str) -> str:
+
+TEXT_BLOCK = 1024 * 1024  # chars per segment when streaming plain text
+DOCUMENT_SUFFIXES = (".pdf", ".docx", ".xlsx")  # everything else is read as text
+READER_VERSION = 1  # bump whenever extracted text changes, invalidates the text cache
+
+def read_file_content(file_path: str, max_chars: Optional[int] = None, max_pages: Optional[int] = None) -> str:
     """
     Reads the content of various file types and returns a string.
     Supported types: .pdf, .docx, .xlsx, various text formats.
+    Uncapped unless max_chars / max_pages are given.
     """
     path = Path(file_path)
     if not path.exists():
         return f"Error: File not found at {file_path}"
-    
-    suffix = path.suffix.lower()
-    
+
     try:
-        if suffix == ".pdf":
-            return _read_pdf(path)
-        elif suffix == ".docx":
-            return _read_docx(path)
-        elif suffix == ".xlsx":
-            return _read_excel(path)
-        else:
-            # specialized handling or fallback to text
-            return _read_text(path)
+        return "".join(iter_file_content(file_path, max_chars, max_pages))
     except Exception as e:
         return f"Error reading file {file_path}: {str(e)}"
 
-def _read_pdf(path: Path) -> str:
-    text = []
-    with open(path, "rb") as f:
-        reader = pypdf.PdfReader(f)
-        for page in reader.pages:
-            text.append(page.extract_text() or "")
-    return "\n".join(text)
+def iter_file_content(file_path: str, max_chars: Optional[int] = None,
+                      max_pages: Optional[int] = None) -> Iterator[str]:
+    """
+    Streams the content of a file as text segments (pages, paragraphs, rows or blocks),
+    so large documents are never fully materialized. "".join() of the segments gives the
+    same text as a full read. Stops after max_chars characters / max_pages PDF pages
+    (None or 0 = unlimited) and then yields a truncation notice. Raises on read errors.
+    """
+    path = Path(file_path)
+    suffix = path.suffix.lower()
 
-def _read_docx(path: Path) -> str:
-    doc = docx.Document(path)
-    return "\n".join([para.text for para in doc.paragraphs])
-
-def _read_excel(path: Path) -> str:
-    wb = openpyxl.load_workbook(path, data_only=True)
-    text = []
-    for sheet in wb.sheetnames:
-        text.append(f"--- Sheet: {sheet} ---")
-        ws = wb[sheet]
-        for row in ws.iter_rows(values_only=True):
-            # Convert row values to string and join
-            row_text = "\t".join([str(cell) if cell is not None else "" for cell in row])
-            text.append(row_text)
-    return "\n".join(text)
-
-def _read_text(path: Path) -> str:
-    # Try common encodings
-    encodings = ["utf-8", "latin-1", "ascii"]
-    for enc in encodings:
+    if suffix == ".pdf":
+        segments = _iter_pdf(path, max_pages)
+    elif suffix == ".docx":
+        segments = _iter_docx(path)
+    elif suffix == ".xlsx":
+        segments = _iter_excel(path)
+    else:
+        # specialized handling or fallback to text
+        segments = _iter_text(path)
+
+    emitted = 0
+    for segment in segments:
+        if max_chars and emitted + len(segment) > max_chars:
+            yield segment[:max_chars - emitted]
+            yield f"\n[Truncated: output capped at {max_chars} characters]"
+            segments.close()
+            return
+        emitted += len(segment)
+        yield segment
+
+def cap_text(text: str, max_chars: Optional[int]) -> str:
+    """Applies max_chars to an already extracted text, with the same notice iter_file_content() adds."""
+    if not max_chars or len(text) <= max_chars:
+        return text
+    return text[:max_chars] + f"\n[Truncated: output capped at {max_chars} characters]"
+
+def _joined(items: Iterator[str]) -> Iterator[str]:
+    """Re-inserts the newlines a "\\n".join() would put between items."""
+    first = True
+    for item in items:
+        yield item if first else "\n" + item
+        first = False
+
+class PdfPages:
+    """Page-level access to a PDF: only the pages asked for are extracted."""
+    def __init__(self, file_path):
+        self._file = open(file_path, "rb")
         try:
-            with open(path, "r", encoding=enc) as f:
-                return f.read()
-        except UnicodeDecodeError:
-            continue
-    return "Error: Could not decode file with supported encodings."
+            self.reader = pypdf.PdfReader(self._file)
+        except Exception:
+            self._file.close()
+            raise
+
+    def __len__(self) -> int:
+        return len(self.reader.pages)
+
+    def text(self, index: int) -> str:
+        return self.reader.pages[index].extract_text() or ""
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def _iter_pdf(path: Path, max_pages: Optional[int] = None) -> Iterator[str]:
+    with PdfPages(path) as pdf:
+        total = len(pdf)
+
+        def pages():
+            for i in range(total):
+                if max_pages and i >= max_pages:
+                    yield f"[Truncated: {total - max_pages} more pages]"
+                    return
+                yield pdf.text(i)
+
+        yield from _joined(pages())
+
+def _iter_docx(path: Path) -> Iterator[str]:
+    doc = docx.Document(path)
+    yield from _joined(para.text for para in doc.paragraphs)
+
+def _iter_excel(path: Path) -> Iterator[str]:
+    # read_only streams rows from the XML instead of loading every cell into memory
+    wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        def lines():
+            for sheet in wb.sheetnames:
+                yield f"--- Sheet: {sheet} ---"
+                ws = wb[sheet]
+                for row in ws.iter_rows(values_only=True):
+                    # Convert row values to string and join
+                    yield "\t".join([str(cell) if cell is not None else "" for cell in row])
+
+        yield from _joined(lines())
+    finally:
+        wb.close()
+
+def detect_encoding(file_path) -> str:
+    """utf-8 if a sample of the file decodes as such, else latin-1 (which decodes any byte sequence)."""
+    with open(file_path, "rb") as f:
+        sample = f.read(TEXT_BLOCK)
+    try:
+        sample.decode("utf-8")
+        return "utf-8"
+    except UnicodeDecodeError as e:
+        # A multi-byte character cut at the end of the sample is still valid UTF-8
+        return "utf-8" if e.start >= len(sample) - 3 else "latin-1"
+
+def _iter_text(path: Path) -> Iterator[str]:
+    # Decide the encoding on a sample, then stream
+    with open(path, "r", encoding=detect_encoding(path), errors="replace") as f:
+        while True:
+            block = f.read(TEXT_BLOCK)
+            if not block:
+                return
+            yield block
@@ -0,0 +1,187 @@
+"""
+On-disk cache of extracted document text.
+Entries are keyed by (realpath, size, mtime, reader version): editing a file or changing the
+readers makes its old entry unreachable. A file's entry holds its text up to INDEX_MAX_CHARS,
+and callers apply their own, smaller caps after a hit, so the read_file tool and indexing
+share entries. PDF pages read by read_file are cached one by one, and a PDF whose pages are
+all cached is assembled from them instead of being parsed again. Text is stored
+zlib-compressed, one file per entry under OPENWORKER_HOME/text_cache, and least recently used
+entries are evicted once the cache grows past its size budget.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+from openworker.config import TEXT_CACHE_PATH, TEXT_CACHE_MAX_MB, INDEX_MAX_CHARS, READ_MAX_CHARS
+from openworker.utils.readers import READER_VERSION, cap_text, read_file_content
+
+PAGE_COUNT = "page count"  # part holding a PDF's number of pages, next to its "page <i>" parts
+
+
+@dataclass
+class TextCacheStats:
+    hits: int = 0
+    misses: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def __str__(self) -> str:
+        return f"{self.hit_rate:.0%} hit rate ({self.hits} hits, {self.misses} misses)"
+
+
+class TextCache:
+    def __init__(self, path: str = None, max_mb: int = TEXT_CACHE_MAX_MB, max_chars: int = INDEX_MAX_CHARS):
+        self.dir = Path(path) if path is not None else TEXT_CACHE_PATH
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_mb * 1024 * 1024
+        self.max_chars = max_chars  # cap of the whole-file extractions stored here
+        self.stats = TextCacheStats()
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(str(self.dir / "index.db"), check_same_thread=False)
+        with self.conn:
+            self.conn.execute('PRAGMA journal_mode=WAL')
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS entries (
+                    key TEXT PRIMARY KEY,
+                    bytes INTEGER,
+                    last_used REAL
+                )
+            ''')
+            self.conn.execute('CREATE INDEX IF NOT EXISTS idx_entries_last_used ON entries (last_used)')
+
+    @staticmethod
+    def key(file_path: str, part: str = "") -> Optional[str]:
+        """
+        Cache key for the file as it is now, None if it cannot be stat'ed.
+        part names a piece of the file cached on its own (e.g. one PDF page).
+        """
+        try:
+            real = os.path.realpath(file_path)
+            st = os.stat(real)
+        except OSError:
+            return None
+        raw = f"{real}\0{st.st_size}\0{st.st_mtime_ns}\0{READER_VERSION}\0{part}"
+        return hashlib.sha1(raw.encode("utf-8", "surrogateescape")).hexdigest()
+
+    def _file(self, key: str) -> Path:
+        return self.dir / f"{key}.z"
+
+    def _load(self, key: Optional[str]) -> Optional[str]:
+        if key is None:
+            return None
+        try:
+            data = self._file(key).read_bytes()
+        except OSError:
+            return None
+        with self._lock, self.conn:
+            self.conn.execute('UPDATE entries SET last_used = ? WHERE key = ?', (time.time(), key))
+        return zlib.decompress(data).decode("utf-8", "surrogatepass")
+
+    def get(self, key: Optional[str]) -> Optional[str]:
+        content = self._load(key)
+        if key is not None:
+            if content is None:
+                self.stats.misses += 1
+            else:
+                self.stats.hits += 1
+        return content
+
+    def contains(self, key: Optional[str]) -> bool:
+        return key is not None and self._file(key).exists()
+
+    def put(self, key: Optional[str], content: str):
+        if key is None:
+            return
+        data = zlib.compress(content.encode("utf-8", "surrogatepass"), 1)
+        if len(data) > self.max_bytes:
+            return
+        # Write then rename, so a reader never sees a partial entry
+        tmp = self.dir / f"{key}.{os.getpid()}.{threading.get_ident()}.tmp"
+        tmp.write_bytes(data)
+        os.replace(tmp, self._file(key))
+        with self._lock, self.conn:
+            self.conn.execute('INSERT OR REPLACE INTO entries (key, bytes, last_used) VALUES (?, ?, ?)',
+                              (key, len(data), time.time()))
+            self._evict()
+
+    def _evict(self):
+        total = self.conn.execute('SELECT COALESCE(SUM(bytes), 0) FROM entries').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Evict a little extra so we are not doing this on every insert
+        target = total - int(self.max_bytes * 0.9)
+        evicted = []
+        for key, size in self.conn.execute('SELECT key, bytes FROM entries ORDER BY last_used'):
+            if target <= 0:
+                break
+            evicted.append(key)
+            target -= size
+        self.conn.executemany('DELETE FROM entries WHERE key = ?', [(k,) for k in evicted])
+        for key in evicted:
+            self._file(key).unlink(missing_ok=True)
+
+    def _assemble_pdf(self, file_path: str) -> Optional[str]:
+        """A PDF's text joined from its cached pages, None unless every page is cached."""
+        count = self._load(self.key(file_path, part=PAGE_COUNT))
+        if count is None:
+            return None
+        pages = []
+        for i in range(int(count)):
+            page = self._load(self.key(file_path, part=f"page {i}"))
+            if page is None:
+                return None
+            pages.append(page)
+        return cap_text("\n".join(pages), self.max_chars)  # what read_file_content(path, max_pages=0) gives
+
+    def document(self, file_path: str, max_chars: Optional[int] = None) -> Optional[str]:
+        """The file's cached text, capped at max_chars, or None on a miss."""
+        key = self.key(file_path)
+        content = self._load(key)
+        if content is None and file_path.lower().endswith(".pdf"):
+            content = self._assemble_pdf(file_path)
+            if content is not None:
+                self.put(key, content)
+        if content is None:
+            if key is not None:
+                self.stats.misses += 1
+            return None
+        self.stats.hits += 1
+        return cap_text(content, max_chars)
+
+    def read(self, file_path: str, max_chars: Optional[int] = READ_MAX_CHARS) -> str:
+        """read_file_content() without a page cap, served from the cache when the file has not changed."""
+        content = self.document(file_path, max_chars)
+        if content is None:
+            key = self.key(file_path)
+            content = read_file_content(file_path, self.max_chars, 0)
+            if not content.startswith("Error"):
+                self.put(key, content)
+            content = cap_text(content, max_chars)
+        return content
+
+    def clear(self):
+        with self._lock, self.conn:
+            self.conn.execute('DELETE FROM entries')
+            for entry in self.dir.glob("*.z"):
+                entry.unlink(missing_ok=True)
+
+
+# Singleton
+_cache = None
+_cache_lock = threading.Lock()
+def get_text_cache():
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = TextCache()
+    return _cache
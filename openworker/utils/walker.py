@@ -0,0 +1,237 @@
+"""
+Directory walking for the list_files tool.
+The tree is walked lazily with os.scandir, one directory at a time in sorted order, so a
+listing stops as soon as it has enough entries and a cursor (the last path returned) can
+resume it without walking what came before. Ignored directories are never entered.
+Directory scans can be kept in a short-lived snapshot, revalidated against the directory's
+mtime, so paging through a listing or repeating it costs one stat per directory.
+"""
+import base64
+import hashlib
+import json
+import os
+import re
+import threading
+from dataclasses import dataclass, field
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+from openworker.config import LIST_SNAPSHOT_TTL
+from openworker.rag.result_cache import TTLCache
+
+# (name, is_dir) of every entry of a directory, sorted by name
+DirEntries = List[Tuple[str, bool]]
+
+
+def glob_to_regex(pattern: str) -> str:
+    """Translates a glob where * and ? stay within a path component and ** spans directories."""
+    out, i, n = [], 0, len(pattern)
+    while i < n:
+        c = pattern[i]
+        if pattern.startswith("**/", i):
+            out.append("(?:.*/)?")
+            i += 3
+        elif pattern.startswith("**", i):
+            out.append(".*")
+            i += 2
+        elif c == "*":
+            out.append("[^/]*")
+            i += 1
+        elif c == "?":
+            out.append("[^/]")
+            i += 1
+        elif c == "[" and pattern.find("]", i + 2) != -1:
+            end = pattern.find("]", i + 2)
+            body = pattern[i + 1:end].replace("\\", "\\\\")
+            out.append("[" + ("^" + body[1:] if body.startswith("!") else body) + "]")
+            i = end + 1
+        else:
+            out.append(re.escape(c))
+            i += 1
+    return "".join(out)
+
+
+@dataclass
+class _Rule:
+    base: str  # directory of the ignore file, relative to the root ("" for the root)
+    regex: "re.Pattern"
+    negate: bool
+    dir_only: bool
+
+
+@dataclass
+class IgnoreRules:
+    """.gitignore semantics: last matching rule wins, "!" re-includes, "/" anchors, trailing "/" matches directories only."""
+    rules: List[_Rule] = field(default_factory=list)
+
+    def extended(self, lines: Sequence[str], base: str = "") -> "IgnoreRules":
+        rules = list(self.rules)
+        for line in lines:
+            line = line.rstrip("\n").rstrip()
+            if not line or line.startswith("#"):
+                continue
+            negate = line.startswith("!")
+            if negate:
+                line = line[1:]
+            dir_only = line.endswith("/")
+            line = line.rstrip("/")
+            # A slash anywhere but the end anchors the pattern to the ignore file's directory
+            anchored = "/" in line
+            line = line.lstrip("/")
+            if not line:
+                continue
+            regex = glob_to_regex(line) if anchored else "(?:.*/)?" + glob_to_regex(line)
+            rules.append(_Rule(base, re.compile(regex), negate, dir_only))
+        return IgnoreRules(rules)
+
+    def ignored(self, rel_path: str, is_dir: bool) -> bool:
+        result = False
+        for rule in self.rules:
+            if rule.dir_only and not is_dir:
+                continue
+            if rule.base:
+                if not rel_path.startswith(rule.base + "/"):
+                    continue
+                path = rel_path[len(rule.base) + 1:]
+            else:
+                path = rel_path
+            if rule.regex.fullmatch(path):
+                result = not rule.negate
+        return result
+
+
+@dataclass(frozen=True)
+class ListOptions:
+    pattern: str = ""                    # glob on the relative path if it has a "/", else on the file name
+    extensions: Tuple[str, ...] = ()     # e.g. (".py", ".md"), case-insensitive
+    max_depth: int = 0                   # 1 = only the directory itself, 0 = unlimited
+    exclude: Tuple[str, ...] = ()        # extra .gitignore-style patterns
+    use_gitignore: bool = True
+    include_hidden: bool = False
+
+    def signature(self) -> str:
+        return hashlib.sha1(repr(self).encode()).hexdigest()[:12]
+
+
+class DirectoryWalker:
+    def __init__(self, snapshot_ttl: float = LIST_SNAPSHOT_TTL, max_snapshot_dirs: int = 4096):
+        # Per-directory scans, shared by every listing while they are fresh
+        self.snapshot = TTLCache(max_entries=max_snapshot_dirs, ttl=snapshot_ttl) if snapshot_ttl > 0 else None
+
+    def _scan(self, directory: str) -> DirEntries:
+        mtime = None
+        if self.snapshot is not None:
+            try:
+                mtime = os.stat(directory).st_mtime_ns
+            except OSError:
+                return []
+            cached = self.snapshot.get(directory)
+            # Creating, deleting or renaming an entry updates the directory's mtime
+            if cached is not None and cached[0] == mtime:
+                return cached[1]
+        entries = []
+        try:
+            with os.scandir(directory) as it:
+                for entry in it:
+                    try:
+                        # Symlinked directories are listed but not followed, like os.walk
+                        is_dir = entry.is_dir(follow_symlinks=False)
+                    except OSError:
+                        continue
+                    entries.append((entry.name, is_dir))
+        except OSError:
+            pass  # unreadable or vanished
+        entries.sort()
+        if self.snapshot is not None:
+            self.snapshot.put(directory, (mtime, entries))
+        return entries
+
+    def walk(self, root: str, options: ListOptions = ListOptions(), after: Optional[str] = None) -> Iterator[str]:
+        """
+        Yields matching file paths relative to root, in sorted depth-first order.
+        With after (a path yielded earlier), resumes right after it, skipping subtrees that come before.
+        """
+        name_re = path_re = None
+        if options.pattern:
+            regex = re.compile(glob_to_regex(options.pattern.lstrip("/")))
+            path_re, name_re = (regex, None) if "/" in options.pattern else (None, regex)
+        extensions = tuple(e.lower() if e.startswith(".") else "." + e.lower() for e in options.extensions)
+        rules = IgnoreRules().extended(options.exclude)
+        after_parts = tuple(after.split("/")) if after else None
+        yield from self._walk(root, (), rules, options, name_re, path_re, extensions, after_parts)
+
+    def _walk(self, directory: str, prefix: Tuple[str, ...], rules: IgnoreRules, options: ListOptions,
+              name_re, path_re, extensions: Tuple[str, ...], after: Optional[Tuple[str, ...]]) -> Iterator[str]:
+        entries = self._scan(directory)
+        if options.use_gitignore and (".gitignore", False) in entries:
+            try:
+                with open(os.path.join(directory, ".gitignore"), encoding="utf-8", errors="replace") as f:
+                    rules = rules.extended(f.readlines(), "/".join(prefix))
+            except OSError:
+                pass
+
+        for name, is_dir in entries:
+            if name.startswith(".") and not options.include_hidden:
+                continue
+            parts = prefix + (name,)
+            if after is not None:
+                if is_dir:
+                    # Skip subtrees entirely before the cursor; descend into the one that contains it
+                    if parts < after and after[:len(parts)] != parts:
+                        continue
+                elif parts <= after:
+                    continue
+            rel = "/".join(parts)
+            if rules.ignored(rel, is_dir):
+                continue
+            if is_dir:
+                if not options.max_depth or len(parts) < options.max_depth:
+                    sub_after = after if after is not None and after[:len(parts)] == parts else None
+                    yield from self._walk(os.path.join(directory, name), parts, rules, options,
+                                          name_re, path_re, extensions, sub_after)
+                continue
+            if extensions and not name.lower().endswith(extensions):
+                continue
+            if name_re is not None and not name_re.fullmatch(name):
+                continue
+            if path_re is not None and not path_re.fullmatch(rel):
+                continue
+            yield rel
+
+    def list(self, root: str, options: ListOptions = ListOptions(), limit: int = 1000,
+             cursor: str = "") -> Tuple[List[str], Optional[str]]:
+        """Returns up to limit paths relative to root, and a cursor for the next page (None at the end)."""
+        after = decode_cursor(cursor, root, options) if cursor else None
+        paths = []
+        for rel in self.walk(root, options, after):
+            if len(paths) == limit:
+                return paths, encode_cursor(paths[-1], root, options)
+            paths.append(rel)
+        return paths, None
+
+
+def encode_cursor(last: str, root: str, options: ListOptions) -> str:
+    raw = json.dumps([last, os.path.realpath(root), options.signature()], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8", "surrogateescape")).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, root: str, options: ListOptions) -> str:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        last, cursor_root, signature = json.loads(raw.decode("utf-8", "surrogateescape"))
+    except (ValueError, TypeError):
+        raise ValueError("invalid cursor")
+    if cursor_root != os.path.realpath(root) or signature != options.signature():
+        raise ValueError("the cursor belongs to a different listing, repeat the same directory and filters")
+    return last
+
+
+# Singleton
+_walker = None
+_walker_lock = threading.Lock()
+def get_walker():
+    global _walker
+    if _walker is None:
+        with _walker_lock:
+            if _walker is None:
+                _walker = DirectoryWalker()
+    return _walker